@@ -1,232 +1,254 @@
-import pygame
-import random
-import math
-
-# Initialize Pygame and Mixer
-pygame.init()
-pygame.mixer.init()
-
-# Screen settings
-WIDTH, HEIGHT = 1000, 700
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("2D Fighter Jet Dogfight")
-
-# Colors
-WHITE = (255, 255, 255)
-RED = (255, 0, 0)
-BLUE = (30, 144, 255)
-GREEN = (0, 255, 0)
-SKY_BLUE = (135, 206, 235)
-
-# Game settings
-FPS = 60
-JET_SIZE = (50, 40)
-MAX_HEALTH = 100
-BULLET_SPEED = 12
-MISSILE_SPEED = 8
-MAX_MISSILES = 3
-MISSILE_LOCK_RANGE = 300
-
-# Clock
-clock = pygame.time.Clock()
-
-# Fonts
-font = pygame.font.SysFont(None, 30)
-
-# Load sounds (place .wav files in project directory)
-try:
-    bg_music = pygame.mixer.Sound("bgmusic.wav")
-    gunfire_sound = pygame.mixer.Sound("gunfire.wav")
-    missile_sound = pygame.mixer.Sound("missile_launch.wav")
-    jet_move_sound = pygame.mixer.Sound("jet_move.wav")
-    jet_destroyed_sound = pygame.mixer.Sound("jet_destroyed.wav")
-
-    bg_music.set_volume(0.3)
-    bg_music.play(-1)
-except:
-    print("Sound files not found. Continuing without sound.")
-
-def draw_text(text, x, y, color=WHITE):
-    img = font.render(text, True, color)
-    screen.blit(img, (x, y))
-
-def draw_health_bar(x, y, health, color):
-    pygame.draw.rect(screen, RED, (x, y, 100, 10))
-    pygame.draw.rect(screen, color, (x, y, max(0, health), 10))
-
-class Cloud:
-    def __init__(self, x, y, speed):
-        self.x = x
-        self.y = y
-        self.speed = speed
-
-    def move(self):
-        self.x -= self.speed
-        if self.x < -100:
-            self.x = WIDTH + random.randint(0, 300)
-            self.y = random.randint(50, HEIGHT - 100)
-
-    def draw(self):
-        pygame.draw.ellipse(screen, WHITE, (self.x, self.y, 60, 40))
-        pygame.draw.ellipse(screen, WHITE, (self.x + 30, self.y - 10, 50, 50))
-        pygame.draw.ellipse(screen, WHITE, (self.x + 50, self.y, 60, 40))
-
-class Jet:
-    def __init__(self, x, y, color, is_player=True):
-        self.rect = pygame.Rect(x, y, *JET_SIZE)
-        self.color = color
-        self.speed = 5
-        self.health = MAX_HEALTH
-        self.missiles = MAX_MISSILES
-        self.bullets = []
-        self.missiles_list = []
-        self.is_player = is_player
-
-    def draw(self):
-        pygame.draw.rect(screen, self.color, self.rect)
-        for bullet in self.bullets:
-            pygame.draw.circle(screen, WHITE, (bullet.x, bullet.y), 4)
-        for missile in self.missiles_list:
-            pygame.draw.circle(screen, RED, (missile["rect"].x, missile["rect"].y), 6)
-
-    def move(self, keys=None, target=None):
-        if self.is_player:
-            if keys[pygame.K_LEFT]: self.rect.x -= self.speed
-            if keys[pygame.K_RIGHT]: self.rect.x += self.speed
-            if keys[pygame.K_UP]: self.rect.y -= self.speed
-            if keys[pygame.K_DOWN]: self.rect.y += self.speed
-            if keys[pygame.K_LEFT] or keys[pygame.K_RIGHT] or keys[pygame.K_UP] or keys[pygame.K_DOWN]:
-                try: jet_move_sound.play(maxtime=100)
-                except: pass
-        else:
-            if target:
-                dx = target.rect.centerx - self.rect.centerx
-                dy = target.rect.centery - self.rect.centery
-                dist = math.hypot(dx, dy)
-                if dist != 0:
-                    self.rect.x += int(dx / dist * self.speed * 0.6)
-                    self.rect.y += int(dy / dist * self.speed * 0.6)
-                if random.randint(0, 80) == 0:
-                    self.fire_bullet()
-
-    def fire_bullet(self):
-        bullet = pygame.Rect(self.rect.centerx, self.rect.centery, 5, 5)
-        self.bullets.append(bullet)
-        try: gunfire_sound.play()
-        except: pass
-
-    def fire_missile(self, target):
-        dx = target.rect.centerx - self.rect.centerx
-        dy = target.rect.centery - self.rect.centery
-        dist = math.hypot(dx, dy)
-        if self.missiles > 0 and dist <= MISSILE_LOCK_RANGE:
-            missile = pygame.Rect(self.rect.centerx, self.rect.centery, 6, 6)
-            self.missiles_list.append({"rect": missile, "target": target})
-            self.missiles -= 1
-            try: missile_sound.play()
-            except: pass
-
-    def update_projectiles(self):
-        for bullet in self.bullets[:]:
-            bullet.x += BULLET_SPEED if self.is_player else -BULLET_SPEED
-            if not screen.get_rect().contains(bullet):
-                self.bullets.remove(bullet)
-
-        for m in self.missiles_list[:]:
-            target = m["target"]
-            dx = target.rect.centerx - m["rect"].centerx
-            dy = target.rect.centery - m["rect"].centery
-            dist = math.hypot(dx, dy)
-            if dist != 0:
-                m["rect"].x += int(dx / dist * MISSILE_SPEED)
-                m["rect"].y += int(dy / dist * MISSILE_SPEED)
-            if not screen.get_rect().contains(m["rect"]):
-                self.missiles_list.remove(m)
-
-    def is_behind(self, enemy):
-        return self.rect.centerx < enemy.rect.centerx - 20
-
-    def check_hits(self, enemy):
-        for bullet in self.bullets[:]:
-            if enemy.rect.colliderect(bullet):
-                if self.is_player and self.is_behind(enemy):
-                    enemy.health -= 5
-                    self.bullets.remove(bullet)
-                elif not self.is_player:
-                    enemy.health -= 5
-                    self.bullets.remove(bullet)
-
-        for m in self.missiles_list[:]:
-            if enemy.rect.colliderect(m["rect"]):
-                enemy.health -= 20
-                self.missiles_list.remove(m)
-
-# Game Setup
-player = Jet(100, HEIGHT//2, BLUE, is_player=True)
-enemy = Jet(WIDTH-150, HEIGHT//2, GREEN, is_player=False)
-clouds = [Cloud(random.randint(0, WIDTH), random.randint(50, HEIGHT - 150), random.uniform(0.5, 1.5)) for _ in range(6)]
-
-# Main Game Loop
-running = True
-while running:
-    clock.tick(FPS)
-    screen.fill(SKY_BLUE)
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    keys = pygame.key.get_pressed()
-
-    # Move + Draw Clouds
-    for cloud in clouds:
-        cloud.move()
-        cloud.draw()
-
-    # Player actions
-    player.move(keys)
-    if keys[pygame.K_SPACE]:
-        player.fire_bullet()
-    if keys[pygame.K_m]:
-        player.fire_missile(enemy)
-
-    # Enemy AI
-    enemy.move(target=player)
-
-    # Update + Collision
-    player.update_projectiles()
-    enemy.update_projectiles()
-    player.check_hits(enemy)
-    enemy.check_hits(player)
-
-    # Draw
-    player.draw()
-    enemy.draw()
-    draw_health_bar(10, 10, player.health, BLUE)
-    draw_health_bar(WIDTH - 110, 10, enemy.health, GREEN)
-    draw_text(f"Missiles: {player.missiles}", 10, 30)
-
-    # Lock-on UI
-    dist = math.hypot(enemy.rect.centerx - player.rect.centerx, enemy.rect.centery - player.rect.centery)
-    if dist <= MISSILE_LOCK_RANGE:
-        draw_text("MISSILE LOCK!", WIDTH // 2 - 70, 30, RED)
-
-    # Game over
-    if player.health <= 0:
-        try: jet_destroyed_sound.play()
-        except: pass
-        draw_text("YOU LOSE!", WIDTH // 2 - 100, HEIGHT // 2, RED)
-        pygame.display.update()
-        pygame.time.delay(2000)
-        break
-    elif enemy.health <= 0:
-        try: jet_destroyed_sound.play()
-        except: pass
-        draw_text("YOU WIN!", WIDTH // 2 - 100, HEIGHT // 2, GREEN)
-        pygame.display.update()
-        pygame.time.delay(2000)
-        break
-
-    pygame.display.update()
-
-pygame.quit()
+import pygame
+import random
+import argparse
+import numpy as np
+from frame_profiler import FrameProfiler
+from game_loop import FixedTimestep, PositionHistory, MAX_INTERPOLATION_JUMP
+from dogfight_arena import Arena, WIDTH, HEIGHT, SIM_HZ, JET_SIZE, MAX_HEALTH, MISSILE_LOCK_RANGE, BULLET, MISSILE
+
+parser = argparse.ArgumentParser(description="2D fighter jet dogfight")
+parser.add_argument("--squadron", type=int, default=1, metavar="N",
+                    help="jets per side: you and N-1 AI wingmen against N AI jets (default 1, a one-on-one duel)")
+ARGS = parser.parse_args()
+
+# Initialize Pygame and Mixer
+pygame.init()
+pygame.mixer.init()
+
+# Screen settings (the field size comes from dogfight_arena)
+screen = pygame.display.set_mode((WIDTH, HEIGHT))
+pygame.display.set_caption("2D Fighter Jet Dogfight")
+
+# Colors
+WHITE = (255, 255, 255)
+RED = (255, 0, 0)
+BLUE = (30, 144, 255)
+GREEN = (0, 255, 0)
+LIGHT_BLUE = (120, 190, 255) # AI wingmen
+SKY_BLUE = (135, 206, 235)
+SKY_TOP = (70, 130, 210) # The sky fades from this at the top to SKY_BLUE at the bottom
+CLOUD_COLORKEY = (255, 0, 255)
+
+# Scenery
+CLOUD_LAYERS = [(5, 0.6, 0.4, 150), (4, 0.8, 0.8, 200), (3, 1.0, 1.4, 255)] # count, scale, speed, alpha; far to near
+
+# Sound throttling: repeated triggers within the interval are coalesced into the sound already playing
+GUNFIRE_SOUND_INTERVAL_MS = 80
+MISSILE_SOUND_INTERVAL_MS = 200
+JET_MOVE_SOUND_INTERVAL_MS = 100 # Same as the engine sound's maxtime, so it never overlaps itself
+MAX_SOUND_VOICES = 3 # Mixer channels any one sound may hold at once
+
+# Fonts
+font = pygame.font.SysFont(None, 30)
+
+# Load sounds (place .wav files in project directory)
+bg_music = gunfire_sound = missile_sound = jet_move_sound = jet_destroyed_sound = None
+try:
+    bg_music = pygame.mixer.Sound("bgmusic.wav")
+    gunfire_sound = pygame.mixer.Sound("gunfire.wav")
+    missile_sound = pygame.mixer.Sound("missile_launch.wav")
+    jet_move_sound = pygame.mixer.Sound("jet_move.wav")
+    jet_destroyed_sound = pygame.mixer.Sound("jet_destroyed.wav")
+
+    bg_music.set_volume(0.3)
+    bg_music.play(-1)
+except:
+    print("Sound files not found. Continuing without sound.")
+
+class SoundThrottle:
+    """Plays a sound at most once per interval and on at most max_voices channels at a time, so holding
+    a key doesn't queue a new sound every step. A sound that failed to load plays as silence."""
+    def __init__(self, sound, interval_ms, max_voices=MAX_SOUND_VOICES):
+        self.sound = sound
+        self.interval = interval_ms
+        self.max_voices = max_voices
+        self.last_played = -interval_ms
+
+    def play(self, **kwargs):
+        if self.sound is None:
+            return
+        now = pygame.time.get_ticks()
+        if now - self.last_played < self.interval or self.sound.get_num_channels() >= self.max_voices:
+            return
+        self.last_played = now
+        self.sound.play(**kwargs)
+
+gunfire_audio = SoundThrottle(gunfire_sound, GUNFIRE_SOUND_INTERVAL_MS)
+missile_audio = SoundThrottle(missile_sound, MISSILE_SOUND_INTERVAL_MS)
+jet_move_audio = SoundThrottle(jet_move_sound, JET_MOVE_SOUND_INTERVAL_MS, max_voices=1)
+
+def draw_text(text, x, y, color=WHITE):
+    img = font.render(text, True, color)
+    screen.blit(img, (x, y))
+
+def draw_health_bar(x, y, health, color, width=100, height=10):
+    pygame.draw.rect(screen, RED, (x, y, width, height))
+    pygame.draw.rect(screen, color, (x, y, max(0, health) * width // MAX_HEALTH, height))
+
+def make_sky(top, bottom):
+    """Renders the vertical sky gradient once: one column of colors, stretched to the screen."""
+    column = pygame.Surface((1, HEIGHT))
+    for y in range(HEIGHT):
+        t = y / (HEIGHT - 1)
+        column.set_at((0, y), [round(a + (b - a) * t) for a, b in zip(top, bottom)])
+    return pygame.transform.scale(column, (WIDTH, HEIGHT)).convert()
+
+cloud_sprites = {} # scale -> pre-rendered cloud
+
+def cloud_sprite(scale):
+    """The three-ellipse cloud at the given scale, drawn once per size."""
+    sprite = cloud_sprites.get(scale)
+    if sprite is None:
+        sprite = pygame.Surface((round(110 * scale), round(50 * scale)), pygame.SRCALPHA)
+        for x, y, w, h in ((0, 10, 60, 40), (30, 0, 50, 50), (50, 10, 60, 40)):
+            pygame.draw.ellipse(sprite, WHITE, [round(v * scale) for v in (x, y, w, h)])
+        cloud_sprites[scale] = sprite
+    return sprite
+
+class CloudLayer:
+    """One parallax layer. Its clouds are composited once into a screen-wide tile that scrolls left
+    by blit offset, so a layer costs two blits however many clouds it holds."""
+    def __init__(self, count, scale, speed, alpha, rng, sky):
+        self.speed = speed
+        self.offset = 0.0
+        sprite = cloud_sprite(scale)
+        # Translucent clouds are blended over the sky here, once. The gradient only changes with y,
+        # so the blend stays right wherever the tile scrolls, and drawing needs no alpha at all.
+        self.tile = sky.copy()
+        cutout = pygame.Surface((WIDTH, HEIGHT)).convert()
+        cutout.fill(CLOUD_COLORKEY)
+        sprite.set_alpha(alpha)
+        for _ in range(count):
+            x, y = rng.randint(0, WIDTH), rng.randint(40, HEIGHT - 160)
+            for pos in ((x, y), (x - WIDTH, y)): # Clouds crossing the right edge continue on the left
+                self.tile.blit(sprite, pos)
+                cutout.blit(sprite, pos, special_flags=pygame.BLEND_RGB_MAX)
+        sprite.set_alpha(255)
+        # Everything outside the clouds becomes colorkey; with RLE the empty sky is skipped in long runs
+        cutout.set_colorkey(WHITE)
+        self.tile.blit(cutout, (0, 0))
+        self.tile.set_colorkey(CLOUD_COLORKEY, pygame.RLEACCEL)
+
+    def move(self):
+        self.offset = (self.offset + self.speed) % WIDTH
+
+    def draw(self, surface, alpha=0.0):
+        x = -int((self.offset + self.speed * alpha) % WIDTH)
+        surface.blit(self.tile, (x, 0))
+        surface.blit(self.tile, (x + WIDTH, 0))
+
+def make_dot(color, radius):
+    image = pygame.Surface((radius * 2 + 1, radius * 2 + 1), pygame.SRCALPHA)
+    pygame.draw.circle(image, color, (radius, radius), radius)
+    return image
+
+projectile_images = {BULLET: make_dot(WHITE, 4), MISSILE: make_dot(RED, 6)}
+
+def draw_projectiles(surface, projectiles, alpha=None):
+    """Draws every projectile; with alpha, that fraction of a step past its position before the step,
+    blending like PositionHistory does for the jets."""
+    n = projectiles.count
+    if n == 0:
+        return
+    x, y = projectiles.x[:n], projectiles.y[:n]
+    if alpha is not None:
+        prev_x, prev_y = projectiles.prev_x[:n], projectiles.prev_y[:n]
+        blend = np.abs(x - prev_x) + np.abs(y - prev_y) <= MAX_INTERPOLATION_JUMP
+        x = np.where(blend, np.rint(prev_x + (x - prev_x) * alpha), x).astype(int)
+        y = np.where(blend, np.rint(prev_y + (y - prev_y) * alpha), y).astype(int)
+    # The dots are centered on the hit box's top-left corner, as they always were
+    kinds, xs, ys = projectiles.kind[:n].tolist(), x.tolist(), y.tolist()
+    surface.blits([(projectile_images[k], (px - projectile_images[k].get_width() // 2,
+                                           py - projectile_images[k].get_height() // 2))
+                   for k, px, py in zip(kinds, xs, ys)], False)
+
+def play_weapon_sound(jet, kind):
+    (missile_audio if kind == MISSILE else gunfire_audio).play()
+
+# Game Setup
+squadron = max(1, ARGS.squadron)
+arena = Arena() # The jets, projectiles and AI; this file only draws them and plays the sounds
+arena.on_fire = play_weapon_sound
+blue, enemies = arena.add_squadrons(squadron, with_player=True)
+player, wingmen = blue[0], blue[1:]
+player.color = BLUE
+for jet in wingmen:
+    jet.color = LIGHT_BLUE
+for jet in enemies:
+    jet.color = GREEN
+sky = make_sky(SKY_TOP, SKY_BLUE)
+cloud_rng = random.Random() # Scenery has its own generator so it never shifts the AI's random numbers
+cloud_layers = [CloudLayer(*layer, cloud_rng, sky) for layer in CLOUD_LAYERS]
+
+profiler = FrameProfiler("DogFight") # F3 shows frame timings
+loop = FixedTimestep(SIM_HZ)
+positions = PositionHistory() # Jets are drawn between their last two simulated positions
+
+# Main Game Loop
+running = True
+while running:
+    profiler.begin_frame()
+
+    with profiler.section("events"):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            profiler.handle_event(event)
+
+        keys = pygame.key.get_pressed()
+
+    for _ in loop.steps():
+        positions.snapshot(arena.live_jets())
+        with profiler.section("update"):
+            for layer in cloud_layers:
+                layer.move()
+            if keys[pygame.K_LEFT] or keys[pygame.K_RIGHT] or keys[pygame.K_UP] or keys[pygame.K_DOWN]:
+                jet_move_audio.play(maxtime=JET_MOVE_SOUND_INTERVAL_MS)
+        arena.step(keys, profiler.section)
+
+    with profiler.section("draw"):
+        screen.blit(sky, (0, 0))
+        for layer in cloud_layers:
+            layer.draw(screen, loop.alpha)
+        for jet in arena.jets:
+            if jet.alive:
+                pos = positions.position(jet, loop.alpha)
+                pygame.draw.rect(screen, jet.color, (pos, jet.rect.size))
+                if squadron > 1 and not jet.is_player:
+                    draw_health_bar(pos[0], pos[1] - 8, jet.health, jet.color, width=JET_SIZE[0], height=4)
+        draw_projectiles(screen, arena.projectiles, loop.alpha)
+        draw_health_bar(10, 10, player.health, BLUE)
+        draw_health_bar(WIDTH - 110, 10, sum(max(0, jet.health) for jet in enemies) // len(enemies), GREEN)
+        draw_text(f"Missiles: {player.missiles}", 10, 30)
+        draw_text("Gun: reloading" if player.gun.reloading else f"Gun: {player.gun.rounds}", 10, 55)
+        if squadron > 1:
+            draw_text(f"Enemies left: {sum(jet.alive for jet in enemies)}", WIDTH - 210, 30)
+
+        # Lock-on UI
+        target = arena.grid.nearest_enemy(player)
+        if target and player.distance_to(target) <= MISSILE_LOCK_RANGE:
+            draw_text("MISSILE LOCK!", WIDTH // 2 - 70, 30, RED)
+        profiler.draw_overlay(screen)
+
+    # Game over
+    if player.health <= 0:
+        try: jet_destroyed_sound.play()
+        except: pass
+        draw_text("YOU LOSE!", WIDTH // 2 - 100, HEIGHT // 2, RED)
+        pygame.display.update()
+        pygame.time.delay(2000)
+        break
+    elif not any(jet.alive for jet in enemies):
+        try: jet_destroyed_sound.play()
+        except: pass
+        draw_text("YOU WIN!", WIDTH // 2 - 100, HEIGHT // 2, GREEN)
+        pygame.display.update()
+        pygame.time.delay(2000)
+        break
+
+    with profiler.section("flip"):
+        pygame.display.update()
+    profiler.end_frame()
+
+profiler.close()
+pygame.quit()
@@ -1,6 +1,8 @@
 import pygame
 import random
 import os
+from frame_profiler import FrameProfiler
+from game_loop import FixedTimestep, PositionHistory
 
 # Initialize Pygame
 pygame.init()
@@ -9,6 +11,7 @@ pygame.init()
 WIDTH, HEIGHT = 800, 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Enhanced Rock Shooter")
+SIM_HZ = 60 # Simulation steps per second; all speeds below are pixels per step
 
 # Colors
 BLACK = (0, 0, 0)
@@ -131,84 +134,98 @@ def reset_game():
 # Game loop
 running = True
 game_over = False
-clock = pygame.time.Clock()
+loop = FixedTimestep(SIM_HZ)
+positions = PositionHistory() # Sprites are drawn between their last two simulated positions
+profiler = FrameProfiler("Rock Smash") # F3 shows frame timings
 reset_game()
 
 while running:
+    profiler.begin_frame()
     # Event Handling
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_SPACE and not game_over:
-                bullet = Bullet(rocket.rect.centerx, rocket.rect.top)
-                all_sprites.add(bullet)
-                bullets.add(bullet)
-                if shoot_sound:
-                    shoot_sound.play()
-            if event.key == pygame.K_r and game_over:
-                game_over = False
-                reset_game()
-            if event.key == pygame.K_q and game_over:
+    with profiler.section("events"):
+        for event in pygame.event.get():
+            profiler.handle_event(event)
+            if event.type == pygame.QUIT:
                 running = False
-        elif event.type == ROCK_EVENT and not game_over:
-            spawn_rate = max(1000 - level * 50, 200)
-            pygame.time.set_timer(ROCK_EVENT, spawn_rate)
-            rock = Rock(random.randint(2, 5 + level))
-            all_sprites.add(rock)
-            rocks.add(rock)
-        elif event.type == POWERUP_EVENT and not game_over:
-            effect_type = random.choice(["extra_life", "speed_boost"])
-            powerup = PowerUp(effect_type)
-            all_sprites.add(powerup)
-            powerups.add(powerup)
-
-    if not game_over:
-        all_sprites.update()
-
-        # Collision detection for rocket and rocks
-        if pygame.sprite.spritecollideany(rocket, rocks):
-            if explosion_sound:
-                explosion_sound.play()
-            rocket.lives -= 1
-            if rocket.lives <= 0:
-                game_over = True
-                if game_over_sound:
-                    game_over_sound.play()
-
-        # Collision detection for bullets and rocks
-        for bullet in bullets:
-            hits = pygame.sprite.spritecollide(bullet, rocks, True)
-            if hits:
-                score += 10
-                bullet.kill()
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE and not game_over:
+                    bullet = Bullet(rocket.rect.centerx, rocket.rect.top)
+                    all_sprites.add(bullet)
+                    bullets.add(bullet)
+                    if shoot_sound:
+                        shoot_sound.play()
+                if event.key == pygame.K_r and game_over:
+                    game_over = False
+                    reset_game()
+                if event.key == pygame.K_q and game_over:
+                    running = False
+            elif event.type == ROCK_EVENT and not game_over:
+                spawn_rate = max(1000 - level * 50, 200)
+                pygame.time.set_timer(ROCK_EVENT, spawn_rate)
+                rock = Rock(random.randint(2, 5 + level))
+                all_sprites.add(rock)
+                rocks.add(rock)
+            elif event.type == POWERUP_EVENT and not game_over:
+                effect_type = random.choice(["extra_life", "speed_boost"])
+                powerup = PowerUp(effect_type)
+                all_sprites.add(powerup)
+                powerups.add(powerup)
+
+    for _ in loop.steps():
+        positions.snapshot(all_sprites) # Also while frozen on game over, so the sprites are drawn standing still
+        if game_over:
+            continue
+        with profiler.section("update"):
+            all_sprites.update()
+
+        with profiler.section("collisions"):
+            # Collision detection for rocket and rocks
+            if pygame.sprite.spritecollideany(rocket, rocks):
                 if explosion_sound:
                     explosion_sound.play()
-                if score % 50 == 0:
-                    level += 1
-
-        # Power-up collection
-        for powerup in pygame.sprite.spritecollide(rocket, powerups, True):
-            if powerup.effect_type == "extra_life":
-                rocket.lives += 1
-            elif powerup.effect_type == "speed_boost":
-                rocket.speed += 2
+                rocket.lives -= 1
+                if rocket.lives <= 0:
+                    game_over = True
+                    if game_over_sound:
+                        game_over_sound.play()
+
+            # Collision detection for bullets and rocks
+            for bullet in bullets:
+                hits = pygame.sprite.spritecollide(bullet, rocks, True)
+                if hits:
+                    score += 10
+                    bullet.kill()
+                    if explosion_sound:
+                        explosion_sound.play()
+                    if score % 50 == 0:
+                        level += 1
+
+            # Power-up collection
+            for powerup in pygame.sprite.spritecollide(rocket, powerups, True):
+                if powerup.effect_type == "extra_life":
+                    rocket.lives += 1
+                elif powerup.effect_type == "speed_boost":
+                    rocket.speed += 2
 
     # Draw everything
-    screen.fill(BLACK)
-    all_sprites.draw(screen)
-    score_text = font.render(f"Score: {score}", True, WHITE)
-    lives_text = font.render(f"Lives: {rocket.lives}", True, WHITE)
-    level_text = font.render(f"Level: {level}", True, WHITE)
-    screen.blit(score_text, (10, 10))
-    screen.blit(lives_text, (10, 40))
-    screen.blit(level_text, (10, 70))
-
-    if game_over:
-        game_over_text = font.render("Game Over! Press 'R' to Restart or 'Q' to Quit", True, WHITE)
-        screen.blit(game_over_text, (WIDTH // 2 - 250, HEIGHT // 2))
-
-    pygame.display.flip()
-    clock.tick(60)
-
+    with profiler.section("draw"):
+        screen.fill(BLACK)
+        positions.draw(screen, all_sprites, loop.alpha)
+        score_text = font.render(f"Score: {score}", True, WHITE)
+        lives_text = font.render(f"Lives: {rocket.lives}", True, WHITE)
+        level_text = font.render(f"Level: {level}", True, WHITE)
+        screen.blit(score_text, (10, 10))
+        screen.blit(lives_text, (10, 40))
+        screen.blit(level_text, (10, 70))
+
+        if game_over:
+            game_over_text = font.render("Game Over! Press 'R' to Restart or 'Q' to Quit", True, WHITE)
+            screen.blit(game_over_text, (WIDTH // 2 - 250, HEIGHT // 2))
+        profiler.draw_overlay(screen)
+
+    with profiler.section("flip"):
+        pygame.display.flip()
+    profiler.end_frame()
+
+profiler.close()
 pygame.quit()
@@ -1,6 +1,8 @@
 import pygame
 import random
-import time
+from collections import deque
+from frame_profiler import FrameProfiler, OVERLAY_SIZE
+from game_loop import FixedTimestep
 
 # Initialize pygame
 pygame.init()
@@ -26,41 +28,99 @@ initial_snake_speed = 10
 font_style = pygame.font.SysFont("bahnschrift", 35)
 score_font = pygame.font.SysFont("comicsansms", 45)
 
+profiler = FrameProfiler("Snake") # F3 shows frame timings
+overlay_rect = pygame.Rect(screen_width - OVERLAY_SIZE[0] - 10, 40, *OVERLAY_SIZE)  # Where draw_overlay() puts it
+
 def display_score(score):
     value = score_font.render("Score: " + str(score), True, blue)
-    screen.blit(value, [0, 0])
-
-def draw_snake(snake_block, snake_list):
-    for x in snake_list:
-        pygame.draw.rect(screen, green, [x[0], x[1], snake_block, snake_block])
+    return screen.blit(value, [0, 0])
+
+class FreeCells:
+    """Board cells not taken by the snake or food, with O(1) take, give back and uniform sampling.
+    Cells live in a list plus a cell -> position dict; taking one moves the last cell into its slot."""
+    def __init__(self):
+        self.cells = [(x, y) for y in range(0, screen_height, snake_block) for x in range(0, screen_width, snake_block)]
+        self.index = {cell: i for i, cell in enumerate(self.cells)}
+
+    def take(self, cell):
+        i = self.index.pop(cell, None)
+        if i is None:  # Already taken, or off the board
+            return
+        last = self.cells.pop()
+        if last != cell:
+            self.cells[i] = last
+            self.index[last] = i
+
+    def give_back(self, cell):
+        if cell in self.index or not (0 <= cell[0] < screen_width and 0 <= cell[1] < screen_height):
+            return
+        self.index[cell] = len(self.cells)
+        self.cells.append(cell)
+
+    def sample(self):
+        """Returns a uniformly random free cell, or None if the board is full."""
+        return random.choice(self.cells) if self.cells else None
 
 def game_loop():
     game_over = False
     game_close = False
 
-    x1 = screen_width / 2
-    y1 = screen_height / 2
+    x1 = screen_width // 2
+    y1 = screen_height // 2
 
     x1_change = 0
     y1_change = 0
 
-    snake_list = []
+    # Body cells from tail to head, plus the same cells as a set for O(1) "is this cell snake?" tests
+    snake_body = deque([(x1, y1)])
+    occupied = {(x1, y1)}
     length_of_snake = 1
 
+    # Cells that are neither snake nor food, so food never lands on the snake
+    free_cells = FreeCells()
+    free_cells.take((x1, y1))
+    changed_cells = {(x1, y1)}  # Board cells to repaint on the next frame
+
+    def place_food():
+        """Puts food on a random free cell and returns it (None once the board is full)."""
+        cell = free_cells.sample()
+        if cell is not None:
+            free_cells.take(cell)
+            changed_cells.add(cell)
+        return cell
+
     # Food coordinates
-    food_x = round(random.randrange(0, screen_width - snake_block) / snake_block) * snake_block
-    food_y = round(random.randrange(0, screen_height - snake_block) / snake_block) * snake_block
+    food = place_food()
 
     # Bonus food settings
     bonus_food = None
     bonus_food_timer = 0
-    bonus_food_duration = 10  # seconds
+    bonus_food_duration = 10  # seconds of game time
     bonus_food_points = 5
 
     # Game settings
     score = 0
     snake_speed = initial_snake_speed
-    clock = pygame.time.Clock()
+    loop = FixedTimestep(snake_speed)
+
+    # The snake and food live on a board surface that is only repainted where cells change,
+    # so drawing a step costs the same however long the snake is
+    board = pygame.Surface((screen_width, screen_height)).convert()
+    board.fill(black)
+    hud_rects = []  # Score and F3 overlay drawn over the board last frame
+    full_redraw = True
+
+    def paint_cell(cell):
+        """Repaints one board cell from the game state and returns its rect."""
+        rect = pygame.draw.rect(board, black, [cell[0], cell[1], snake_block, snake_block])
+        center = (cell[0] + snake_block // 2, cell[1] + snake_block // 2)
+        if cell in occupied:
+            pygame.draw.rect(board, green, rect)
+        elif cell == food:
+            pygame.draw.circle(board, red, center, snake_block // 2)
+        elif cell == bonus_food:
+            pygame.draw.circle(board, yellow, center, snake_block // 2)
+        return rect
 
     while not game_over:
 
@@ -79,80 +139,108 @@ def game_loop():
                     if event.key == pygame.K_c:
                         game_loop()
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                game_over = True
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_LEFT:
-                    x1_change = -snake_block
-                    y1_change = 0
-                elif event.key == pygame.K_RIGHT:
-                    x1_change = snake_block
-                    y1_change = 0
-                elif event.key == pygame.K_UP:
-                    y1_change = -snake_block
-                    x1_change = 0
-                elif event.key == pygame.K_DOWN:
-                    y1_change = snake_block
-                    x1_change = 0
-
-        # Check for boundary collision
-        if x1 >= screen_width or x1 < 0 or y1 >= screen_height or y1 < 0:
-            game_close = True
-
-        x1 += x1_change
-        y1 += y1_change
-        screen.fill(black)
-
-        # Draw regular food as a circle
-        pygame.draw.circle(screen, red, (int(food_x + snake_block // 2), int(food_y + snake_block // 2)), snake_block // 2)
-        
-        # Draw bonus food if active
-        if bonus_food:
-            pygame.draw.circle(screen, yellow, (int(bonus_food[0] + snake_block // 2), int(bonus_food[1] + snake_block // 2)), snake_block // 2)
-            # Check if bonus food timer has expired
-            if time.time() - bonus_food_timer > bonus_food_duration:
-                bonus_food = None  # Remove bonus food after timer expires
-
-        # Snake head and body
-        snake_head = [x1, y1]
-        snake_list.append(snake_head)
-        if len(snake_list) > length_of_snake:
-            del snake_list[0]
-
-        # Check if snake collides with itself
-        for x in snake_list[:-1]:
-            if x == snake_head:
-                game_close = True
-
-        draw_snake(snake_block, snake_list)
-        display_score(score)
-
-        pygame.display.update()
-
-        # Check if snake eats regular food
-        if abs(x1 - food_x) < snake_block and abs(y1 - food_y) < snake_block:
-            food_x = round(random.randrange(0, screen_width - snake_block) / snake_block) * snake_block
-            food_y = round(random.randrange(0, screen_height - snake_block) / snake_block) * snake_block
-            length_of_snake += 1
-            score += 1
-            snake_speed += 1  # Gradually increase speed
-
-            # Occasionally spawn bonus food
-            if random.randint(0, 3) == 0:  # 25% chance to spawn bonus food
-                bonus_food = (round(random.randrange(0, screen_width - snake_block) / snake_block) * snake_block,
-                              round(random.randrange(0, screen_height - snake_block) / snake_block) * snake_block)
-                bonus_food_timer = time.time()
-
-        # Check if snake eats bonus food
-        if bonus_food and abs(x1 - bonus_food[0]) < snake_block and abs(y1 - bonus_food[1]) < snake_block:
-            length_of_snake += 2
-            score += bonus_food_points
-            bonus_food = None  # Remove bonus food after eating
-            snake_speed += 2  # Boost speed for bonus food
-
-        clock.tick(snake_speed)
-
+        profiler.begin_frame()
+        with profiler.section("events"):
+            for event in pygame.event.get():
+                profiler.handle_event(event)
+                if event.type == pygame.QUIT:
+                    game_over = True
+                elif event.type == pygame.WINDOWEXPOSED:  # The window contents were lost, repaint everything
+                    full_redraw = True
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_LEFT:
+                        x1_change = -snake_block
+                        y1_change = 0
+                    elif event.key == pygame.K_RIGHT:
+                        x1_change = snake_block
+                        y1_change = 0
+                    elif event.key == pygame.K_UP:
+                        y1_change = -snake_block
+                        x1_change = 0
+                    elif event.key == pygame.K_DOWN:
+                        y1_change = snake_block
+                        x1_change = 0
+
+        # Each simulation step moves the snake one block, so the step rate is the snake's speed
+        for _ in loop.steps():
+            with profiler.section("update"):
+                # Check for boundary collision
+                if x1 >= screen_width or x1 < 0 or y1 >= screen_height or y1 < 0:
+                    game_close = True
+
+                x1 += x1_change
+                y1 += y1_change
+
+                # Snake head and body. The tail moves off first, so the head may follow right behind it
+                snake_head = (x1, y1)
+                if len(snake_body) >= length_of_snake:
+                    tail = snake_body.popleft()
+                    occupied.discard(tail)
+                    free_cells.give_back(tail)
+                    changed_cells.add(tail)
+
+                # Remove bonus food once its timer expires (in game time, so slow frames don't shorten it)
+                if bonus_food and loop.time - bonus_food_timer > bonus_food_duration:
+                    free_cells.give_back(bonus_food)
+                    changed_cells.add(bonus_food)
+                    bonus_food = None
+
+            with profiler.section("collisions"):
+                # Check if snake collides with itself
+                if snake_head in occupied:
+                    game_close = True
+                snake_body.append(snake_head)
+                occupied.add(snake_head)
+                free_cells.take(snake_head)
+                changed_cells.add(snake_head)
+
+                # Check if snake eats regular food
+                if snake_head == food:
+                    food = place_food()
+                    length_of_snake += 1
+                    score += 1
+                    snake_speed += 1  # Gradually increase speed
+                    loop.set_rate(snake_speed)
+
+                    # Occasionally spawn bonus food
+                    if random.randint(0, 3) == 0:  # 25% chance to spawn bonus food
+                        if bonus_food:
+                            free_cells.give_back(bonus_food)
+                            changed_cells.add(bonus_food)
+                        bonus_food = place_food()
+                        bonus_food_timer = loop.time
+
+                # Check if snake eats bonus food
+                if snake_head == bonus_food:
+                    length_of_snake += 2
+                    score += bonus_food_points
+                    bonus_food = None  # Remove bonus food after eating
+                    snake_speed += 2  # Boost speed for bonus food
+                    loop.set_rate(snake_speed)
+            if game_close:
+                break
+
+        with profiler.section("draw"):
+            # Repaint the cells that changed (new head, old tail, food), then restore the board
+            # under last frame's score and overlay before drawing them again
+            dirty = [paint_cell(cell) for cell in changed_cells] + hud_rects
+            changed_cells.clear()
+            if full_redraw:
+                dirty = [screen.get_rect()]
+                full_redraw = False
+            for rect in dirty:
+                screen.blit(board, rect, rect)
+            hud_rects = [display_score(score)]
+            if profiler.overlay_visible:
+                profiler.draw_overlay(screen)
+                hud_rects.append(overlay_rect)
+            dirty += hud_rects
+
+        with profiler.section("flip"):
+            pygame.display.update(dirty)
+        profiler.end_frame()
+
+    profiler.close()
     pygame.quit()
     quit()
 
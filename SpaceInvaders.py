@@ -1,7 +1,42 @@
 import pygame
 import random
+import numpy as np
 import sys
 import os
+import time
+import argparse
+import struct
+import sqlite3
+import datetime
+import threading
+import queue
+from collections import OrderedDict
+from frame_profiler import FrameProfiler
+from game_loop import FixedTimestep, PositionHistory, MAX_INTERPOLATION_JUMP
+
+# --- Command line ---
+parser = argparse.ArgumentParser(description="Space Invaders")
+parser.add_argument("--headless", action="store_true",
+                    help="simulate the game without a window and report per-phase timings")
+parser.add_argument("--frames", type=int, default=5000, help="number of frames to simulate in headless mode")
+parser.add_argument("--draw-every", type=int, default=1,
+                    help="in headless mode, draw one frame out of every N (0 = never draw)")
+parser.add_argument("--seed", type=int, default=None, help="seed for the game's random number generators")
+parser.add_argument("--trace", default=None, help="write a Chrome trace of frame timings to this file on exit")
+parser.add_argument("--record", default=None, metavar="FILE",
+                    help="record each game's seed and inputs to FILE (a new game overwrites the previous one)")
+parser.add_argument("--replay", default=None, metavar="FILE", help="play back a replay recorded with --record")
+parser.add_argument("--replay-speed", type=float, default=1.0,
+                    help="playback rate for --replay (2 = double speed, 0 = as fast as possible without rendering)")
+ARGS = parser.parse_args()
+
+# No window or audio for headless runs and unlimited-speed replays
+NO_WINDOW = ARGS.headless or (ARGS.replay is not None and ARGS.replay_speed <= 0)
+
+if NO_WINDOW:
+    # Must be set before pygame.init() so no window or audio device is opened
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
 
 # Initialize Pygame
 pygame.init()
@@ -24,6 +59,7 @@ BASE_ENEMY_SPEED_Y = 25
 BASE_ENEMY_BULLET_SPEED = 6
 BASE_ENEMY_SHOOT_PROB = 0.001 # Reduced initial probability for enemy to shoot
 ENEMY_DESCENT_SPEED = 1.5 # Speed at which enemies fly down during spawn animation
+ENEMY_SIZE = (40, 30)
 
 # Difficulty scaling factors per level
 ENEMY_SPEED_X_INCREMENT = 0.1
@@ -61,7 +97,14 @@ MYSTERY_SHIP_POINTS = 200 # Points for shooting the UFO (increased for high valu
 
 # Shield parameters
 SHIELD_BLOCK_SIZE = 10
-SHIELD_HP = 4 # How many hits a single shield block can take (more for stronger shields)
+SHIELD_CELL_SIZE = 5 # Erosion resolution in pixels; each block is split into cells this size
+SHIELD_SHAPE = [ # One character per block, "#" is solid
+    "#####",
+    "#####",
+    "## ##",
+    "#   #",
+]
+SHIELD_HP = 4 # How many hits a single shield cell can take (more for stronger shields)
 SHIELD_BASE_Y = SCREEN_HEIGHT - 100 # Position of shields
 SHIELD_HP_COLORS = [
     (0, 100, 0), # HP 4 (Green)
@@ -80,19 +123,35 @@ SCORE_MULTIPLIER_DURATION = 10000 # milliseconds
 SCORE_MULTIPLIER_VALUE = 2 # e.g., 2x points
 PIERCING_SHOT_DURATION = 5000 # milliseconds
 
+# Explosion particle parameters
+PARTICLE_POOL_CAPACITY = 1024 # Initial size of the shared particle arrays (grows if exceeded)
+PARTICLE_SIZES = (2, 5) # Min/max particle radius in pixels
+PARTICLE_ALPHA_LEVELS = 16 # Fade steps pre-rendered per particle color and size
+
 # Floating Score parameters
 FLOATING_SCORE_DURATION = 1500 # milliseconds
 FLOATING_SCORE_SPEED = 0.5 # pixels per frame upwards
+FLOATING_SCORE_ALPHA_LEVELS = 16 # Pre-rendered fade steps per score value
 
 # Starfield parameters
 STAR_SPEED = 0.5 # Speed at which stars scroll downwards
+# Parallax layers as (star count, star radius, speed multiplier); far layers are small and slow
+STAR_LAYERS = [(110, 1, 0.5), (60, 2, 1.0), (30, 3, 1.5)]
+
+# Text cache parameters
+TEXT_CACHE_SIZE = 256 # Max rendered text surfaces kept by the LRU text cache
+
+# Collision grid parameters
+COLLISION_CELL_SIZE = 64 # Cell size (pixels) of the uniform spatial hash used for broad-phase collision
 
 # Screen Shake parameters
 SCREEN_SHAKE_DURATION = 300 # milliseconds
 SCREEN_SHAKE_INTENSITY = 5 # pixels
 
-# High Score file
-HIGH_SCORE_FILE = "highscore.txt"
+# High scores
+HIGH_SCORE_DB = "highscores.db" # SQLite leaderboard
+HIGH_SCORE_FILE = "highscore.txt" # Single score from older versions, imported into the leaderboard once
+LEADERBOARD_SIZE = 10 # Entries shown on the high scores screen
 
 # Colors
 WHITE = (255, 255, 255)
@@ -117,80 +176,529 @@ EXPLOSION_COLORS = [(255, 165, 0, 255), (255, 255, 0, 255)] # Orange, Yellow for
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Space Invaders")
 
-# Clock for controlling frame rate
-clock = pygame.time.Clock()
+# Simulation rate. The game always steps at this rate; drawing runs as often as the game loop allows
 FPS = 60
 
+class SimClock:
+    """Fixed-timestep game clock: game time advances by exactly one frame per simulated step."""
+    def __init__(self, fps):
+        self.frame_ms = 1000 / fps
+        self.frame = 0
+
+    def ticks(self):
+        """Game time in milliseconds; used everywhere in place of pygame.time.get_ticks()."""
+        return int(self.frame * self.frame_ms)
+
+    def step(self):
+        self.frame += 1
+
+sim_clock = SimClock(FPS)
+
+# Random number generators. All gameplay randomness goes through `rng` so a seed reproduces a run;
+# purely cosmetic randomness (stars, screen shake) uses `fx_rng` so drawing never shifts gameplay.
+game_seed = ARGS.seed if ARGS.seed is not None else random.randrange(2**32)
+rng = random.Random(game_seed)
+fx_rng = random.Random(game_seed + 1)
+round_seeds = random.Random(game_seed) # Every new game draws its own seed from here, which its replay stores
+
+INPUT_BITS = ("left", "right", "up", "down", "fire", "pause") # Bit order of a frame's input mask in replays
+
+class Controls:
+    """Player inputs for the current frame, filled from the keyboard or a headless driver."""
+    def __init__(self):
+        self.left = False
+        self.right = False
+        self.up = False
+        self.down = False
+        self.fire = False # Fire was pressed this frame
+        self.pause = False # Pause was toggled this frame
+
+    def to_mask(self):
+        mask = 0
+        for bit, name in enumerate(INPUT_BITS):
+            if getattr(self, name):
+                mask |= 1 << bit
+        return mask
+
+    def set_mask(self, mask):
+        for bit, name in enumerate(INPUT_BITS):
+            setattr(self, name, bool(mask & (1 << bit)))
+
+    def end_frame(self):
+        """Presses only count for the frame they happened in."""
+        self.fire = False
+        self.pause = False
+
+    def read_keyboard(self):
+        keys = pygame.key.get_pressed()
+        self.left = keys[pygame.K_LEFT]
+        self.right = keys[pygame.K_RIGHT]
+        self.up = keys[pygame.K_UP]
+        self.down = keys[pygame.K_DOWN]
+
+controls = Controls()
+
+class Autopilot:
+    """Scripted stand-in for the keyboard in headless mode: drifts left/right and keeps firing."""
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.direction = 0
+
+    def poll(self, controls):
+        if self.rng.random() < 0.05: # Occasionally pick a new direction
+            self.direction = self.rng.choice((-1, 0, 1))
+        controls.left = self.direction < 0
+        controls.right = self.direction > 0
+        controls.up = False
+        controls.down = False
+        controls.fire = True # Fire delay still limits the actual shot rate
+
+# --- Replays ---
+# A replay is a header followed by run-length encoded per-frame input masks:
+# the simulation is deterministic given the game's seed, so inputs are all that needs storing.
+REPLAY_MAGIC = b"SIRP"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct("<4sHHII") # magic, version, FPS, seed, frame count
+REPLAY_RUN = struct.Struct("<HB") # frames the mask is held for, input mask
+REPLAY_MAX_RUN = 0xFFFF
+
+class ReplayRecorder:
+    """Collects one game's seed and inputs and writes them to a replay file."""
+    def __init__(self, path):
+        self.path = path
+        self.recording = False
+        self.seed = 0
+        self.frames = 0
+        self.runs = [] # [frames, mask] pairs
+        self.saved_finished_game = False
+
+    def start(self, seed):
+        self.recording = True
+        self.seed = seed
+        self.frames = 0
+        self.runs = []
+
+    def record(self, mask):
+        if self.runs and self.runs[-1][1] == mask and self.runs[-1][0] < REPLAY_MAX_RUN:
+            self.runs[-1][0] += 1
+        else:
+            self.runs.append([1, mask])
+        self.frames += 1
+
+    def save(self, finished=True):
+        """Writes the replay and stops recording until the next start(). An unfinished game is only
+        written if no finished one has been, so quitting mid-game never replaces a finished replay."""
+        if not self.recording:
+            return
+        self.recording = False
+        if not finished and self.saved_finished_game:
+            print(f"Unfinished game not recorded: {self.path} keeps the last finished game")
+            return
+        self.saved_finished_game = self.saved_finished_game or finished
+        with open(self.path, "wb") as f:
+            f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, FPS, self.seed, self.frames))
+            f.write(b"".join(REPLAY_RUN.pack(count, mask) for count, mask in self.runs))
+        print(f"Saved replay of {self.frames} frames ({len(self.runs)} runs) to {self.path}")
+
+def load_replay(path):
+    """Reads a replay file. Returns (seed, frame count, list of (frames, mask) runs)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < REPLAY_HEADER.size:
+        raise ValueError(f"{path} is too short to be a replay")
+    magic, version, fps, seed, frames = REPLAY_HEADER.unpack_from(data)
+    if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+        raise ValueError(f"{path} is not a version {REPLAY_VERSION} SpaceInvaders replay")
+    if fps != FPS:
+        raise ValueError(f"{path} was recorded at {fps} FPS, but the game runs at {FPS}")
+    body = data[REPLAY_HEADER.size:]
+    runs = list(REPLAY_RUN.iter_unpack(body)) if len(body) % REPLAY_RUN.size == 0 else []
+    if sum(count for count, _ in runs) != frames:
+        raise ValueError(f"{path} is truncated or corrupt")
+    return seed, frames, runs
+
+replay_recorder = ReplayRecorder(ARGS.record) if ARGS.record else None
+
 # Fonts
 font_small = pygame.font.Font(None, 30)
 font_medium = pygame.font.Font(None, 40)
 font_large = pygame.font.Font(None, 74)
 font_huge = pygame.font.Font(None, 120)
 
+# --- Text Rendering Cache ---
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (font, text, color).
+
+    Returned surfaces are shared between callers, so copy one before changing its alpha.
+    """
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0 # Every miss is one real font.render call
+        self.frame_hits = 0
+        self.frame_misses = 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            self.frame_hits += 1
+            return surface
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False) # Evict the least recently used entry
+        self.misses += 1
+        self.frame_misses += 1
+        return surface
+
+    def begin_frame(self):
+        """Resets the per-frame counters shown on the debug line."""
+        self.frame_hits = 0
+        self.frame_misses = 0
+
+text_cache = TextCache()
+
+class HudText:
+    """A HUD label that only looks up a new surface when the value it shows changes."""
+    def __init__(self, font, color, template="{}"):
+        self.font = font
+        self.color = color
+        self.template = template
+        self.value = None
+        self.image = None
+
+    def render(self, value):
+        if self.image is None or value != self.value:
+            self.value = value
+            self.image = text_cache.render(self.font, self.template.format(value), self.color)
+        return self.image
+
+score_label = HudText(font_small, WHITE, "Score: {}")
+high_score_label = HudText(font_small, WHITE, "HIGH SCORE: {}")
+level_label = HudText(font_small, WHITE, "Level: {}")
+score_multiplier_label = HudText(font_small, POWERUP_COLORS["score_multiplier"], "SCORE x{}!")
+
+# Per-section frame timings; F3 shows its graph together with the text cache counters.
+# In headless mode it keeps every frame so the final report covers the whole run.
+profiler = FrameProfiler("SpaceInvaders", history=max(ARGS.frames, 1) if NO_WINDOW else 240,
+                         trace_path=ARGS.trace)
+
 # --- Sounds ---
-player_shoot_sound = None
-enemy_explosion_sound = None
-player_hit_sound = None # Player taking damage sound
-level_up_sound = None
-mystery_ship_sound = None
-mystery_ship_explode_sound = None
-powerup_collect_sound = None
-player_explode_sound = None # Player death sound
-main_menu_music = None # New music variable
-game_play_music = None # New music variable
-game_over_music = None # New music variable
-you_won_music = None # New music variable
-
-try:
-    script_dir = os.path.dirname(__file__)
-    # Add your .wav or .ogg files to the same directory as this script!
-    player_shoot_sound = pygame.mixer.Sound(os.path.join(script_dir, 'laser.wav'))
-    enemy_explosion_sound = pygame.mixer.Sound(os.path.join(script_dir, 'explosion.wav'))
-    player_hit_sound = pygame.mixer.Sound(os.path.join(script_dir, 'hit.wav'))
-    level_up_sound = pygame.mixer.Sound(os.path.join(script_dir, 'levelup.wav'))
-    mystery_ship_sound = pygame.mixer.Sound(os.path.join(script_dir, 'ufo_highpitch.wav'))
-    mystery_ship_explode_sound = pygame.mixer.Sound(os.path.join(script_dir, 'ufo_lowpitch.wav'))
-    powerup_collect_sound = pygame.mixer.Sound(os.path.join(script_dir, 'powerup.wav'))
-    player_explode_sound = pygame.mixer.Sound(os.path.join(script_dir, 'player_explode.wav'))
-
-    # Background music
-    main_menu_music = os.path.join(script_dir, 'main_menu.ogg')
-    game_play_music = os.path.join(script_dir, 'game_play.ogg')
-    game_over_music = os.path.join(script_dir, 'game_over.ogg')
-    you_won_music = os.path.join(script_dir, 'you_won.ogg')
-
-except (FileNotFoundError, pygame.error) as e:
-    print(f"Error loading sound or music files: {e}. Audio will be disabled.")
-    # Set music paths to None if files aren't found, so pygame.mixer.music doesn't try to load them
-    main_menu_music = None
-    game_play_music = None
-    game_over_music = None
-    you_won_music = None
-
-
-# --- Starfield background variables ---
-stars = []
-for _ in range(200):
-    x = random.randint(0, SCREEN_WIDTH)
-    y = random.randint(0, SCREEN_HEIGHT)
-    size = random.randint(1, 3)
-    stars.append({'x': x, 'y': y, 'size': size}) # Store as dict to update y
-
-# --- High Score Load/Save ---
-def load_high_score():
-    """Loads the high score from a file."""
-    try:
-        with open(HIGH_SCORE_FILE, "r") as f:
-            return int(f.read())
-    except (FileNotFoundError, ValueError):
-        return 0 # Return 0 if file not found or invalid content
+# Sound effects: name -> (file, category). They are loaded in the background and played through `audio`.
+SOUND_FILES = {
+    "player_shoot": ("laser.wav", "shots"),
+    "enemy_explosion": ("explosion.wav", "explosions"),
+    "player_hit": ("hit.wav", "player"), # Player taking damage sound
+    "level_up": ("levelup.wav", "ui"),
+    "mystery_ship": ("ufo_highpitch.wav", "ufo"), # Loops while a UFO is on screen
+    "mystery_ship_explode": ("ufo_lowpitch.wav", "explosions"),
+    "powerup_collect": ("powerup.wav", "ui"),
+    "player_explode": ("player_explode.wav", "player"), # Player death sound
+}
+# Mixer channels reserved per category, so rapid fire can never starve explosions or the UFO loop
+SOUND_CATEGORY_CHANNELS = {"shots": 3, "explosions": 4, "player": 2, "ui": 2, "ufo": 1}
+SOUND_RATE_LIMIT_MS = 40 # The same effect is not restarted more often than this
+
+class AudioManager:
+    """Lazily loaded, reference-counted sound effects played on reserved per-category channels."""
+    def __init__(self, directory, enabled=True, clock=pygame.time.get_ticks):
+        self.directory = directory
+        self.enabled = enabled and pygame.mixer.get_init() is not None
+        self.clock = clock # Milliseconds, used for rate limiting and picking which voice to steal
+        self.sounds = {} # name -> Sound (None if the file failed to load)
+        self.ref_counts = {}
+        self.lock = threading.Lock() # Guards sounds/ref_counts against the loader thread
+        self.load_queue = queue.Queue()
+        self.loader = None # Started on the first acquire()
+        self.last_played = {} # name -> time it last started
+        self.loops = {} # name -> channel it is looping on
+        self.channels = {} # category -> [Channel, ...]
+        self.channel_started = {} # Channel -> time its current sound started
+
+        if self.enabled:
+            total = sum(SOUND_CATEGORY_CHANNELS.values())
+            pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), total))
+            pygame.mixer.set_reserved(total) # Sound.play() elsewhere can't grab these channels
+            index = 0
+            for category, count in SOUND_CATEGORY_CHANNELS.items():
+                self.channels[category] = [pygame.mixer.Channel(index + i) for i in range(count)]
+                index += count
+
+    def acquire(self, *names):
+        """Takes a reference to each sound, queueing a background load for any not loaded yet."""
+        if not self.enabled:
+            return
+        with self.lock:
+            for name in names:
+                self.ref_counts[name] = self.ref_counts.get(name, 0) + 1
+                if self.ref_counts[name] == 1 and name not in self.sounds:
+                    self.load_queue.put(name)
+        if self.loader is None:
+            self.loader = threading.Thread(target=self._load_worker, name="sound-loader", daemon=True)
+            self.loader.start()
+
+    def release(self, *names):
+        """Drops a reference to each sound and unloads the ones nothing uses any more."""
+        if not self.enabled:
+            return
+        with self.lock:
+            for name in names:
+                self.ref_counts[name] = self.ref_counts.get(name, 0) - 1
+                if self.ref_counts[name] <= 0:
+                    del self.ref_counts[name]
+                    self.sounds.pop(name, None)
+                    self.stop_loop(name)
+
+    def _load_worker(self):
+        while True:
+            name = self.load_queue.get()
+            if name is None:
+                return
+            with self.lock:
+                if name in self.sounds or name not in self.ref_counts:
+                    continue # Already loaded, or released before we got to it
+            try:
+                sound = pygame.mixer.Sound(os.path.join(self.directory, SOUND_FILES[name][0]))
+            except (FileNotFoundError, pygame.error) as e:
+                print(f"Error loading sound '{name}': {e}. It will be silent.")
+                sound = None
+            with self.lock:
+                if name in self.ref_counts:
+                    self.sounds[name] = sound
+
+    def _free_channel(self, category):
+        """Returns an idle channel of the category, or steals the one that has played the longest."""
+        channels = self.channels[category]
+        for channel in channels:
+            if not channel.get_busy():
+                return channel
+        return min(channels, key=lambda channel: self.channel_started.get(channel, 0))
+
+    def play(self, name):
+        """Plays a one-shot effect, skipping it if it is still loading or played too recently."""
+        if not self.enabled:
+            return
+        sound = self.sounds.get(name)
+        if sound is None:
+            return
+        now = self.clock()
+        if now - self.last_played.get(name, -SOUND_RATE_LIMIT_MS) < SOUND_RATE_LIMIT_MS:
+            return
+        channel = self._free_channel(SOUND_FILES[name][1])
+        channel.play(sound)
+        self.channel_started[channel] = now
+        self.last_played[name] = now
+
+    def play_loop(self, name):
+        """Starts looping a sound unless it is already looping."""
+        if not self.enabled or name in self.loops:
+            return
+        sound = self.sounds.get(name)
+        if sound is None:
+            return
+        channel = self._free_channel(SOUND_FILES[name][1])
+        channel.play(sound, loops=-1)
+        self.channel_started[channel] = self.clock()
+        self.loops[name] = channel
+
+    def stop_loop(self, name):
+        channel = self.loops.pop(name, None)
+        if channel is not None:
+            channel.stop()
+
+    def clock_restarted(self):
+        """Forgets when effects last played; call whenever the clock goes back to 0, or old timestamps
+        ahead of the new time would keep those effects rate-limited (silent) until the clock catches up."""
+        self.last_played.clear()
+        self.channel_started.clear()
+
+    def set_looping(self, name, looping):
+        if looping:
+            self.play_loop(name)
+        else:
+            self.stop_loop(name)
+
+    def close(self):
+        """Stops every loop and the loader thread and unloads every sound, whoever still holds it."""
+        for name in list(self.loops):
+            self.stop_loop(name)
+        with self.lock:
+            self.ref_counts.clear()
+            self.sounds.clear()
+        if self.loader is not None:
+            self.load_queue.put(None)
+
+script_dir = os.path.dirname(__file__)
+# Add your .wav or .ogg files to the same directory as this script!
+audio = AudioManager(script_dir, enabled=not NO_WINDOW, clock=sim_clock.ticks) # No sound in headless runs
+game_sounds_held = False
+
+def hold_game_sounds(hold):
+    """Keeps the effects loaded while a game is on; back in the main menu they are released and unloaded."""
+    global game_sounds_held
+    if hold != game_sounds_held:
+        if hold:
+            audio.acquire(*SOUND_FILES) # Loads in the background; effects are silent until their file is ready
+        else:
+            audio.release(*SOUND_FILES)
+        game_sounds_held = hold
 
-def save_high_score(score):
-    """Saves the high score to a file."""
-    with open(HIGH_SCORE_FILE, "w") as f:
-        f.write(str(score))
+hold_game_sounds(True) # Preloaded while the first menu is up, so the first game starts with sound
 
-high_score = load_high_score()
+def music_path(filename):
+    """Returns the path of a music file, or None if it is missing (pygame.mixer.music can't load it)."""
+    path = os.path.join(script_dir, filename)
+    return path if os.path.exists(path) else None
+
+# Background music
+main_menu_music = music_path('main_menu.ogg')
+game_play_music = music_path('game_play.ogg')
+game_over_music = music_path('game_over.ogg')
+you_won_music = music_path('you_won.ogg')
+
+
+# --- Starfield background ---
+class Starfield:
+    """Parallax starfield made of pre-rendered, vertically tiled layers scrolled by blit offset."""
+    def __init__(self):
+        self.layers = [] # [surface, speed, offset] per layer, back to front
+        for count, size, speed_factor in STAR_LAYERS:
+            layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+            layer.fill(BLACK)
+            for _ in range(count):
+                x = fx_rng.randint(0, SCREEN_WIDTH)
+                y = fx_rng.randint(0, SCREEN_HEIGHT)
+                pygame.draw.circle(layer, WHITE, (x, y), size)
+            # RLE colorkey lets the blit skip the (mostly black) empty runs entirely
+            layer.set_colorkey(BLACK, pygame.RLEACCEL)
+            self.layers.append([layer, STAR_SPEED * speed_factor, 0.0])
+        self.frame = 0.0 # Sim frame the layers were last scrolled to
+
+    def scroll_to(self, frame):
+        """Moves every layer down by its own speed for each sim frame (or fraction) since the last call,
+        wrapping around the tile height."""
+        frames = max(0.0, frame - self.frame) # The sim clock restarts with every game
+        self.frame = frame
+        for layer in self.layers:
+            layer[2] = (layer[2] + layer[1] * frames) % SCREEN_HEIGHT
+
+    def draw(self, surface):
+        """Clears the surface to black and draws all layers, each as two blits of the same tile."""
+        surface.fill(BLACK)
+        for layer, _, offset in self.layers:
+            y = int(offset)
+            surface.blit(layer, (0, y))
+            surface.blit(layer, (0, y - SCREEN_HEIGHT))
+
+starfield = Starfield()
+
+# Full-screen target the game scene is composed on before being blitted with the shake offset.
+# Allocated once and cleared every frame instead of being recreated.
+render_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+sprite_positions = PositionHistory() # Lets the live game draw sprites between their last two sim frames
+
+# --- Leaderboard ---
+class Leaderboard:
+    """SQLite score table. Scores are written by a background thread so game over never waits on the disk."""
+    def __init__(self, path, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.write_queue = queue.Queue()
+        self.writer = None
+        self.reader = None # Main-thread connection, only used for the high-scores screen queries
+        if not enabled:
+            return
+        self.reader = self._connect()
+        with self.reader: # Each `with connection:` block is one transaction
+            self.reader.executescript("""
+                CREATE TABLE IF NOT EXISTS scores (
+                    id INTEGER PRIMARY KEY,
+                    score INTEGER NOT NULL,
+                    level INTEGER NOT NULL,
+                    played_on TEXT NOT NULL -- ISO date
+                );
+                CREATE INDEX IF NOT EXISTS scores_by_score ON scores (score DESC);
+                CREATE INDEX IF NOT EXISTS scores_by_level ON scores (level, score DESC);
+                CREATE INDEX IF NOT EXISTS scores_by_date ON scores (played_on, score DESC);
+            """)
+            empty = self.reader.execute("SELECT NOT EXISTS (SELECT 1 FROM scores)").fetchone()[0]
+            if empty:
+                self._import_legacy_high_score()
+        self.writer = threading.Thread(target=self._write_worker, name="leaderboard-writer", daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute("PRAGMA journal_mode=WAL") # Readers never block the writer and vice versa
+        return connection
+
+    def _import_legacy_high_score(self):
+        """Carries over the single score kept in HIGH_SCORE_FILE by older versions of the game."""
+        try:
+            with open(HIGH_SCORE_FILE, "r") as f:
+                legacy_score = int(f.read())
+        except (FileNotFoundError, ValueError):
+            return
+        played_on = datetime.date.fromtimestamp(os.path.getmtime(HIGH_SCORE_FILE)).isoformat()
+        self.reader.execute("INSERT INTO scores (score, level, played_on) VALUES (?, 0, ?)",
+                            (legacy_score, played_on))
+
+    def _write_worker(self):
+        connection = self._connect()
+        while True:
+            entry = self.write_queue.get()
+            if entry is None:
+                break
+            try:
+                with connection:
+                    connection.execute("INSERT INTO scores (score, level, played_on) VALUES (?, ?, ?)", entry)
+            except sqlite3.Error as e:
+                print(f"Error saving score to {self.path}: {e}")
+        connection.close()
+
+    def submit(self, score, level):
+        """Queues a finished game's score; returns immediately."""
+        if self.enabled:
+            self.write_queue.put((score, level, datetime.date.today().isoformat()))
+
+    def best(self):
+        if not self.enabled:
+            return 0
+        return self.reader.execute("SELECT COALESCE(MAX(score), 0) FROM scores").fetchone()[0]
+
+    def levels(self):
+        """Levels that have at least one score, lowest first."""
+        if not self.enabled:
+            return []
+        rows = self.reader.execute("SELECT DISTINCT level FROM scores WHERE level > 0 ORDER BY level")
+        return [row[0] for row in rows]
+
+    def top(self, limit=LEADERBOARD_SIZE, level=None, played_on=None):
+        """Returns up to `limit` (score, level, played_on) rows, best first, optionally for one level or date."""
+        if not self.enabled:
+            return []
+        query, params = "SELECT score, level, played_on FROM scores", []
+        if level is not None:
+            query, params = query + " WHERE level = ?", [level]
+        elif played_on is not None:
+            query, params = query + " WHERE played_on = ?", [played_on]
+        return self.reader.execute(query + " ORDER BY score DESC LIMIT ?", params + [limit]).fetchall()
+
+    def close(self):
+        """Waits for queued scores to be written, then closes the database."""
+        if self.writer is not None:
+            self.write_queue.put(None)
+            self.writer.join(timeout=5)
+        if self.reader is not None:
+            self.reader.close()
+
+# Headless soaks and replays don't put their scores on the real leaderboard
+leaderboard = Leaderboard(HIGH_SCORE_DB, enabled=not (NO_WINDOW or ARGS.replay))
+high_score = leaderboard.best()
 
 # --- Classes ---
 
@@ -212,14 +720,13 @@ class Player(pygame.sprite.Sprite):
     def update(self):
         # Handle movement only if visible (not during explosion/respawn)
         if self.visible:
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_LEFT]:
+            if controls.left:
                 self.rect.x -= PLAYER_SPEED
-            if keys[pygame.K_RIGHT]:
+            if controls.right:
                 self.rect.x += PLAYER_SPEED
-            if keys[pygame.K_UP]:
+            if controls.up:
                 self.rect.y -= PLAYER_SPEED
-            if keys[pygame.K_DOWN]:
+            if controls.down:
                 self.rect.y += PLAYER_SPEED
 
             # Keep player within screen bounds (X-axis)
@@ -238,19 +745,75 @@ class Player(pygame.sprite.Sprite):
         # Invincibility flicker logic
         if self.invincible:
             # Flicker effect: make sprite semi-transparent every few frames
-            alpha = 255 if pygame.time.get_ticks() // 100 % 2 == 0 else 100
+            alpha = 255 if sim_clock.ticks() // 100 % 2 == 0 else 100
             self.image.set_alpha(alpha)
-            if pygame.time.get_ticks() - self.last_hit_time > PLAYER_INVINCIBILITY_DURATION:
+            if sim_clock.ticks() - self.last_hit_time > PLAYER_INVINCIBILITY_DURATION:
                 self.invincible = False
                 self.image.set_alpha(255) # Restore full opacity
 
 
-class Bullet(pygame.sprite.Sprite):
-    """Represents a bullet fired by the player."""
-    def __init__(self, x, y, speed, piercing=False): # Added piercing argument
+# --- Sprite pooling ---
+class SpritePool:
+    """Recycles sprites of one class: kill() hands them back, get() resets a free one instead of allocating."""
+    def __init__(self, sprite_class):
+        self.sprite_class = sprite_class
+        self.sprites = [] # Every sprite this pool ever created
+        self.free = []
+        self.allocations = 0
+        self.reuses = 0
+        self.frame_allocations = 0 # Counters for the current frame, shown on the F3 debug line
+        self.frame_reuses = 0
+
+    def get(self, *args):
+        if self.free:
+            sprite = self.free.pop()
+            sprite.reset(*args)
+            self.reuses += 1
+            self.frame_reuses += 1
+        else:
+            sprite = self.sprite_class(*args)
+            sprite.pool = self
+            self.sprites.append(sprite)
+            self.allocations += 1
+            self.frame_allocations += 1
+        return sprite
+
+    def release(self, sprite):
+        self.free.append(sprite)
+
+    def reclaim(self):
+        """Rebuilds the free list from scratch; picks up sprites dropped by Group.empty(), which skips kill()."""
+        self.free = [sprite for sprite in self.sprites if not sprite.alive()]
+
+    def begin_frame(self):
+        self.frame_allocations = 0
+        self.frame_reuses = 0
+
+class PooledSprite(pygame.sprite.Sprite):
+    """Sprite that returns itself to its SpritePool when killed. Subclasses set up their state in reset()."""
+    pool = None
+
+    def __init__(self, *args):
         super().__init__()
-        self.image = pygame.Surface([5, 15])
-        self.image.fill(WHITE)
+        self.reset(*args)
+
+    def kill(self):
+        was_alive = self.alive()
+        super().kill()
+        if was_alive and self.pool is not None:
+            self.pool.release(self)
+
+# Bullets never change their look, so every bullet shares one surface
+bullet_image = pygame.Surface([5, 15])
+bullet_image.fill(WHITE)
+enemy_bullet_image = pygame.Surface([8, 8])
+enemy_bullet_image.fill(YELLOW)
+pygame.draw.circle(enemy_bullet_image, RED, (4,4), 4)
+
+class Bullet(PooledSprite):
+    """Represents a bullet fired by the player."""
+    def reset(self, x, y, speed, piercing=False): # Added piercing argument
+        self.image = bullet_image
         self.rect = self.image.get_rect()
         self.rect.centerx = x
         self.rect.bottom = y
@@ -262,13 +825,10 @@ class Bullet(pygame.sprite.Sprite):
         if self.rect.bottom < 0:
             self.kill()
 
-class EnemyBullet(pygame.sprite.Sprite):
+class EnemyBullet(PooledSprite):
     """Represents a bullet fired by an enemy."""
-    def __init__(self, x, y, speed):
-        super().__init__()
-        self.image = pygame.Surface([8, 8])
-        self.image.fill(YELLOW)
-        pygame.draw.circle(self.image, RED, (4,4), 4)
+    def reset(self, x, y, speed):
+        self.image = enemy_bullet_image
         self.rect = self.image.get_rect()
         self.rect.centerx = x
         self.rect.top = y
@@ -280,56 +840,164 @@ class EnemyBullet(pygame.sprite.Sprite):
             self.kill()
 
 class Enemy(pygame.sprite.Sprite):
-    """Represents an enemy alien."""
-    def __init__(self, x, y, speed_x, speed_y, initial_y_target, row_index):
+    """A single enemy materialized from the formation arrays when it is hit."""
+    def __init__(self, image, x, y, points):
         super().__init__()
-        self.row_index = row_index # Store row index
-        self.original_color = ENEMY_TIER_COLORS[min(row_index, len(ENEMY_TIER_COLORS) - 1)]
-        
-        self.image = pygame.Surface([40, 30], pygame.SRCALPHA)
-        pygame.draw.ellipse(self.image, self.original_color, (0, 0, 40, 30))
-        pygame.draw.rect(self.image, GREY, (10, 10, 20, 10))
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y # Start at initial y (potentially above screen)
-        self.direction = 1
+        self.image = image
+        self.rect = self.image.get_rect(topleft=(x, y))
+        self.points = points
+
+def make_enemy_image(color):
+    """Draws the enemy body in the given color."""
+    image = pygame.Surface(ENEMY_SIZE, pygame.SRCALPHA)
+    pygame.draw.ellipse(image, color, (0, 0, ENEMY_SIZE[0], ENEMY_SIZE[1]))
+    pygame.draw.rect(image, GREY, (10, 10, 20, 10))
+    return image
+
+class EnemyFormation:
+    """Structure-of-arrays store for the whole enemy wave, moved, shot and hit-tested in batches."""
+    FIELDS = ("x", "y", "prev_x", "prev_y", "target_y", "tier", "direction", "spawning", "urgent")
+
+    def __init__(self):
+        self.count = 0 # Enemies [0, count) are alive
+        self.x = np.zeros(0, dtype=np.float64)
+        self.y = np.zeros(0, dtype=np.float64)
+        self.prev_x = np.zeros(0, dtype=np.float64) # Positions as of the last snapshot(), for interpolated drawing
+        self.prev_y = np.zeros(0, dtype=np.float64)
+        self.target_y = np.zeros(0, dtype=np.float64) # Y each enemy flies down to during the spawn animation
+        self.tier = np.zeros(0, dtype=np.int32) # Row index from the bottom, picks color and points
+        self.direction = np.ones(0, dtype=np.float64) # Each enemy bounces off the edges on its own
+        self.spawning = np.zeros(0, dtype=bool)
+        self.urgent = np.zeros(0, dtype=bool)
+        self.speed_x = BASE_ENEMY_SPEED_X
+        self.speed_y = BASE_ENEMY_SPEED_Y # Drop per edge bounce
+        self.rng = np.random.default_rng(game_seed + 2) # Shot rolls for the whole wave at once
+
+        # One image per tier plus the urgent one, so drawing never redraws shapes
+        self.tier_images = [make_enemy_image(color) for color in ENEMY_TIER_COLORS]
+        self.urgent_image = make_enemy_image(ENEMY_URGENCY_COLOR)
+        self.tier_points = np.array(ENEMY_POINTS_TIERS, dtype=np.int32)
+
+    def __len__(self):
+        return self.count
+
+    def spawn(self, xs, target_ys, start_ys, tiers, speed_x, speed_y):
+        """Replaces the formation with a new wave that starts flying in from above the screen."""
+        self.count = len(xs)
+        self.x = np.array(xs, dtype=np.float64)
+        self.y = np.array(start_ys, dtype=np.float64)
+        self.prev_x, self.prev_y = self.x.copy(), self.y.copy()
+        self.target_y = np.array(target_ys, dtype=np.float64)
+        self.tier = np.minimum(np.array(tiers, dtype=np.int32), len(ENEMY_TIER_COLORS) - 1)
+        self.direction = np.ones(self.count, dtype=np.float64)
+        self.spawning = np.ones(self.count, dtype=bool)
+        self.urgent = np.zeros(self.count, dtype=bool)
         self.speed_x = speed_x
-        self.speed_y = speed_y # This is the "drop" speed for zig-zag
-        self.initial_y_target = initial_y_target # Target Y for spawn animation
-        self.spawning = True # Flag for spawn animation state
-        # Assign points based on row index (from bottom up)
-        self.points = ENEMY_POINTS_TIERS[min(row_index, len(ENEMY_POINTS_TIERS) - 1)]
+        self.speed_y = speed_y
+
+    def clear(self):
+        self.spawn([], [], [], [], self.speed_x, self.speed_y)
+
+    def snapshot(self):
+        """Call at the start of every sim frame, like PositionHistory.snapshot()."""
+        self.prev_x[:] = self.x
+        self.prev_y[:] = self.y
+
+    def any_spawning(self):
+        return bool(self.spawning.any())
 
     def update(self):
-        if self.spawning:
-            # Move down until it reaches its intended row position
-            if self.rect.y < self.initial_y_target:
-                self.rect.y += ENEMY_DESCENT_SPEED
-            else:
-                self.rect.y = self.initial_y_target # Snap to target
-                self.spawning = False # End spawning phase
-        else:
-            # Normal zig-zag movement
-            current_speed_x = self.speed_x
-            if self.rect.y > ENEMY_URGENCY_Y_THRESHOLD:
-                current_speed_x *= ENEMY_URGENCY_SPEED_FACTOR
-                # Change color to urgent color
-                pygame.draw.ellipse(self.image, ENEMY_URGENCY_COLOR, (0, 0, 40, 30))
-                pygame.draw.rect(self.image, GREY, (10, 10, 20, 10))
-            else:
-                # Restore original color if not urgent (important for color change)
-                pygame.draw.ellipse(self.image, self.original_color, (0, 0, 40, 30))
-                pygame.draw.rect(self.image, GREY, (10, 10, 20, 10))
-
-
-            self.rect.x += current_speed_x * self.direction
-            if self.rect.right >= SCREEN_WIDTH or self.rect.left <= 0:
-                self.direction *= -1
-                self.rect.y += self.speed_y
-                if self.rect.right >= SCREEN_WIDTH:
-                    self.rect.right = SCREEN_WIDTH - 1
-                if self.rect.left <= 0:
-                    self.rect.left = 1
+        """Moves every enemy one frame: spawn descent, urgency speed-up, zig-zag and edge bounce."""
+        if not self.count:
+            return
+        x, y, spawning = self.x, self.y, self.spawning
+        moving = ~spawning # Enemies that finish spawning this frame start moving next frame
+
+        # Fly down to the target row, then snap onto it
+        descending = spawning & (y < self.target_y)
+        y[descending] += ENEMY_DESCENT_SPEED
+        arrived = spawning & ~descending
+        y[arrived] = self.target_y[arrived]
+        spawning[arrived] = False
+
+        # Normal zig-zag movement, faster (and redder) once past the urgency line
+        self.urgent = moving & (y > ENEMY_URGENCY_Y_THRESHOLD)
+        speed = np.where(self.urgent, self.speed_x * ENEMY_URGENCY_SPEED_FACTOR, self.speed_x)
+        x[moving] += (speed * self.direction)[moving]
+
+        at_right = moving & (x + ENEMY_SIZE[0] >= SCREEN_WIDTH)
+        at_left = moving & (x <= 0)
+        bounced = at_right | at_left
+        self.direction[bounced] *= -1
+        y[bounced] += self.speed_y
+        x[at_right] = SCREEN_WIDTH - 1 - ENEMY_SIZE[0]
+        x[at_left] = 1
+
+    def roll_shots(self, probability):
+        """Returns the (x, y) muzzle positions of every settled enemy that fires this frame."""
+        if not self.count:
+            return []
+        fires = ~self.spawning & (self.rng.random(self.count) < probability)
+        shooters = np.flatnonzero(fires)
+        muzzle_x = (self.x[shooters] + ENEMY_SIZE[0] // 2).astype(int).tolist()
+        muzzle_y = (self.y[shooters] + ENEMY_SIZE[1]).astype(int).tolist()
+        return list(zip(muzzle_x, muzzle_y))
+
+    def reached_bottom(self):
+        return bool(self.count) and bool((self.y + ENEMY_SIZE[1] >= SCREEN_HEIGHT).any())
+
+    def overlaps(self, rects):
+        """Returns a (len(rects), count) boolean matrix of which rects overlap which enemies."""
+        bounds = np.array([(r.left, r.top, r.right, r.bottom) for r in rects], dtype=np.float64).reshape(-1, 4)
+        left, top = self.x, self.y
+        right, bottom = left + ENEMY_SIZE[0], top + ENEMY_SIZE[1]
+        return ((bounds[:, 0:1] < right) & (bounds[:, 2:3] > left) &
+                (bounds[:, 1:2] < bottom) & (bounds[:, 3:4] > top))
+
+    def collide_any(self, rect):
+        return bool(self.count) and bool(self.overlaps([rect]).any())
+
+    def collide_sprites(self, sprites):
+        """Like groupcollide(sprites, enemies, False, True): returns {sprite: [Enemy, ...]} and removes the hits."""
+        if not self.count or not sprites:
+            return {}
+        hit_matrix = self.overlaps([sprite.rect for sprite in sprites])
+        alive = np.ones(self.count, dtype=bool)
+        collisions = {}
+        for sprite, row in zip(sprites, hit_matrix):
+            hits = np.flatnonzero(row & alive) # An enemy can only be destroyed by one sprite
+            if len(hits):
+                alive[hits] = False
+                collisions[sprite] = [self.materialize(i) for i in hits]
+        if collisions:
+            for name in self.FIELDS:
+                setattr(self, name, getattr(self, name)[alive])
+            self.count = int(np.count_nonzero(alive))
+        return collisions
+
+    def materialize(self, i):
+        """Builds a sprite for enemy i, for code that wants its rect and points."""
+        image = self.urgent_image if self.urgent[i] else self.tier_images[self.tier[i]]
+        return Enemy(image, int(self.x[i]), int(self.y[i]), int(self.tier_points[self.tier[i]]))
+
+    def draw(self, surface, alpha=None):
+        """Draws the whole formation with one batched blit. With alpha, enemies are drawn that fraction
+        of a frame past their snapshot() positions, blending like PositionHistory does for sprites."""
+        if not self.count:
+            return
+        images, urgent_image = self.tier_images, self.urgent_image
+        x, y = self.x, self.y
+        if alpha is not None:
+            x, y = x.astype(int), y.astype(int)
+            prev_x, prev_y = self.prev_x.astype(int), self.prev_y.astype(int)
+            blend = np.abs(x - prev_x) + np.abs(y - prev_y) <= MAX_INTERPOLATION_JUMP
+            x = np.where(blend, np.rint(prev_x + (x - prev_x) * alpha), x)
+            y = np.where(blend, np.rint(prev_y + (y - prev_y) * alpha), y)
+        xs = x.astype(int).tolist()
+        ys = y.astype(int).tolist()
+        surface.blits([(urgent_image if urgent else images[tier], (x, y))
+                       for x, y, tier, urgent in zip(xs, ys, self.tier.tolist(), self.urgent.tolist())],
+                      doreturn=False)
 
 class MysteryShip(pygame.sprite.Sprite):
     """Represents the high-value mystery ship (UFO)."""
@@ -339,7 +1007,7 @@ class MysteryShip(pygame.sprite.Sprite):
         pygame.draw.ellipse(self.image, YELLOW, (0, 10, 60, 20))
         pygame.draw.ellipse(self.image, GREY, (10, 0, 40, 15))
         self.rect = self.image.get_rect()
-        if random.choice([True, False]):
+        if rng.choice([True, False]):
             self.rect.x = -self.rect.width
             self.direction = 1
         else:
@@ -348,65 +1016,86 @@ class MysteryShip(pygame.sprite.Sprite):
         self.rect.y = 20
         self.speed = speed
 
-        if mystery_ship_sound:
-            mystery_ship_sound.play(-1)
-
     def update(self):
         self.rect.x += self.speed * self.direction
         if (self.direction == 1 and self.rect.left > SCREEN_WIDTH) or \
            (self.direction == -1 and self.rect.right < 0):
             self.kill()
-            if mystery_ship_sound:
-                mystery_ship_sound.stop()
 
-class ShieldBlock(pygame.sprite.Sprite):
-    """Represents a single destructible block of a shield."""
+class Shield:
+    """One destructible shield: an HP grid of small cells drawn from a single cached surface."""
     def __init__(self, x, y):
-        super().__init__()
-        self.image = pygame.Surface([SHIELD_BLOCK_SIZE, SHIELD_BLOCK_SIZE])
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.hp = SHIELD_HP
-        self.update_image() # Initial image update based on HP
-
-    def update_image(self):
-        """Updates the shield block's image based on its current HP."""
-        # Use a color from the SHIELD_HP_COLORS list based on remaining HP
-        # Clamp index to avoid out-of-bounds if HP somehow exceeds SHIELD_HP
-        color_index = max(0, min(self.hp - 1, len(SHIELD_HP_COLORS) - 1))
-        self.image.fill(SHIELD_HP_COLORS[color_index])
-
-
-    def hit(self):
-        self.hp -= 1
-        if self.hp <= 0:
-            self.kill()
-        else:
-            self.update_image() # Update image to reflect new HP
-
+        # Upscale the block layout to cell resolution so erosion is finer than the original blocks
+        scale = SHIELD_BLOCK_SIZE // SHIELD_CELL_SIZE
+        shape = np.array([[cell == "#" for cell in row] for row in SHIELD_SHAPE])
+        self.hp = np.where(np.kron(shape, np.ones((scale, scale), dtype=bool)), SHIELD_HP, 0).astype(np.int8)
+        rows, cols = self.hp.shape
+        self.rect = pygame.Rect(x, y, cols * SHIELD_CELL_SIZE, rows * SHIELD_CELL_SIZE)
+        self.image = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.dirty = [tuple(cell) for cell in np.argwhere(self.hp > 0)] # Cells to repaint on the next draw
+
+    def hit(self, rect, dy):
+        """
+        Damages the first live cells a bullet reached while moving dy pixels this frame.
+        Returns True if the shield stopped the bullet.
+        """
+        swept = rect.union(rect.move(0, -dy)).clip(self.rect) # Covers the whole move, so fast bullets can't skip cells
+        if not swept:
+            return False
+        r0 = (swept.top - self.rect.top) // SHIELD_CELL_SIZE
+        r1 = (swept.bottom - 1 - self.rect.top) // SHIELD_CELL_SIZE + 1
+        c0 = (swept.left - self.rect.left) // SHIELD_CELL_SIZE
+        c1 = (swept.right - 1 - self.rect.left) // SHIELD_CELL_SIZE + 1
+        window = self.hp[r0:r1, c0:c1] # A view, so damage below writes straight into the grid
+        live_rows = np.flatnonzero(window.any(axis=1))
+        if not len(live_rows):
+            return False
+        row = live_rows[-1] if dy < 0 else live_rows[0] # Rising bullets meet the bottom edge first
+        cols = np.flatnonzero(window[row])
+        window[row, cols] -= 1
+        self.dirty.extend((r0 + row, c0 + col) for col in cols.tolist())
+        return True
 
-class PowerUp(pygame.sprite.Sprite):
+    def draw(self, surface):
+        """Repaints only the cells that changed since the last draw, then blits the cached surface."""
+        for row, col in self.dirty:
+            hp = int(self.hp[row, col])
+            # Use a color from the SHIELD_HP_COLORS list based on remaining HP (transparent once destroyed)
+            color = SHIELD_HP_COLORS[max(0, min(SHIELD_HP - hp, len(SHIELD_HP_COLORS) - 1))] if hp > 0 else (0, 0, 0, 0)
+            self.image.fill(color, (col * SHIELD_CELL_SIZE, row * SHIELD_CELL_SIZE, SHIELD_CELL_SIZE, SHIELD_CELL_SIZE))
+        self.dirty.clear()
+        surface.blit(self.image, self.rect)
+
+
+powerup_images = {} # Power-up type -> its shared icon, drawn the first time that type drops
+
+def powerup_image(p_type):
+    image = powerup_images.get(p_type)
+    if image is not None:
+        return image
+    image = pygame.Surface([20, 20], pygame.SRCALPHA)
+    pygame.draw.circle(image, POWERUP_COLORS.get(p_type, WHITE), (10, 10), 10)
+    # Add a symbol or different shape based on type for clearer visuals
+    if p_type == "rapid_fire":
+        pygame.draw.polygon(image, WHITE, [(5,15),(15,15),(10,5)]) # Up arrow
+    elif p_type == "extra_life":
+        pygame.draw.circle(image, WHITE, (10, 10), 4) # Small circle inside
+    elif p_type == "score_multiplier":
+        text_surf = text_cache.render(font_small, "x2", WHITE)
+        text_rect = text_surf.get_rect(center=(10,10))
+        image.blit(text_surf, text_rect)
+    elif p_type == "piercing_shot":
+        pygame.draw.line(image, WHITE, (5,5), (15,15), 2)
+        pygame.draw.line(image, WHITE, (5,15), (15,5), 2) # X symbol
+    powerup_images[p_type] = image
+    return image
+
+class PowerUp(PooledSprite):
     """Represents a collectible power-up."""
-    def __init__(self, x, y, p_type):
-        super().__init__()
+    def reset(self, x, y, p_type):
         self.type = p_type
-        self.image = pygame.Surface([20, 20], pygame.SRCALPHA)
         self.color = POWERUP_COLORS.get(self.type, WHITE)
-        pygame.draw.circle(self.image, self.color, (10, 10), 10)
-        # Add a symbol or different shape based on type for clearer visuals
-        if self.type == "rapid_fire":
-            pygame.draw.polygon(self.image, WHITE, [(5,15),(15,15),(10,5)]) # Up arrow
-        elif self.type == "extra_life":
-            pygame.draw.circle(self.image, WHITE, (10, 10), 4) # Small circle inside
-        elif self.type == "score_multiplier":
-            text_surf = font_small.render("x2", True, WHITE)
-            text_rect = text_surf.get_rect(center=(10,10))
-            self.image.blit(text_surf, text_rect)
-        elif self.type == "piercing_shot":
-            pygame.draw.line(self.image, WHITE, (5,5), (15,15), 2)
-            pygame.draw.line(self.image, WHITE, (5,15), (15,5), 2) # X symbol
-
+        self.image = powerup_image(p_type)
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
 
@@ -415,80 +1104,236 @@ class PowerUp(pygame.sprite.Sprite):
         if self.rect.top > SCREEN_HEIGHT:
             self.kill()
 
-class Explosion(pygame.sprite.Sprite):
-    """Represents a visual explosion effect with particles."""
-    def __init__(self, center):
-        super().__init__()
-        self.particles = []
-        for _ in range(random.randint(5, 10)): # Number of particles
-            angle = random.uniform(0, 2 * 3.14159)
-            speed = random.uniform(2, 5)
-            life = random.randint(10, 20) # Frames for particle to live
-            color = random.choice(EXPLOSION_COLORS)
-            self.particles.append({
-                'pos': list(center),
-                'velocity': [speed * pygame.math.Vector2(1,0).rotate_rad(angle).x, speed * pygame.math.Vector2(1,0).rotate_rad(angle).y],
-                'life': life,
-                'max_life': life,
-                'color': color,
-                'size': random.randint(2, 5)
-            })
-        self.image = pygame.Surface([1,1], pygame.SRCALPHA) # Dummy surface, will draw on screen directly
-        self.rect = pygame.Rect(0,0,1,1) # Dummy rect
-        self.done = False # Flag to indicate if explosion is finished
+class ParticlePool:
+    """Structure-of-arrays store for the particles of every active explosion."""
+    def __init__(self, capacity=PARTICLE_POOL_CAPACITY):
+        self.count = 0 # Particles [0, count) are alive; the rest of each array is free space
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.int32)
+        self.max_life = np.ones(capacity, dtype=np.int32)
+        self.sprite_base = np.zeros(capacity, dtype=np.int32) # Index of the particle's first fade sprite
+        self.size = np.zeros(capacity, dtype=np.int32)
+        self.rng = np.random.default_rng(game_seed)
+
+        # Pre-render every (color, size, alpha) combination once so drawing is a single blits() call
+        self.sprites = []
+        for color in EXPLOSION_COLORS:
+            for size in range(PARTICLE_SIZES[0], PARTICLE_SIZES[1] + 1):
+                for level in range(PARTICLE_ALPHA_LEVELS):
+                    alpha = int(255 * (level + 1) / PARTICLE_ALPHA_LEVELS)
+                    sprite = pygame.Surface([size * 2, size * 2], pygame.SRCALPHA)
+                    pygame.draw.circle(sprite, (color[0], color[1], color[2], alpha), (size, size), size)
+                    self.sprites.append(sprite)
+
+    def _grow(self, needed):
+        capacity = len(self.life)
+        while capacity < needed:
+            capacity *= 2
+        for name in ("pos", "velocity", "life", "max_life", "sprite_base", "size"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def emit(self, center):
+        """Spawns a burst of particles for one explosion at the given center."""
+        n = int(self.rng.integers(5, 11)) # Number of particles
+        start, end = self.count, self.count + n
+        if end > len(self.life):
+            self._grow(end)
+        angle = self.rng.uniform(0, 2 * np.pi, n)
+        speed = self.rng.uniform(2, 5, n)
+        life = self.rng.integers(10, 21, n) # Frames for particle to live
+        size = self.rng.integers(PARTICLE_SIZES[0], PARTICLE_SIZES[1] + 1, n)
+        color = self.rng.integers(0, len(EXPLOSION_COLORS), n)
+        sizes_per_color = PARTICLE_SIZES[1] - PARTICLE_SIZES[0] + 1
+
+        self.pos[start:end] = center
+        self.velocity[start:end, 0] = speed * np.cos(angle)
+        self.velocity[start:end, 1] = speed * np.sin(angle)
+        self.life[start:end] = life
+        self.max_life[start:end] = life
+        self.size[start:end] = size
+        self.sprite_base[start:end] = (color * sizes_per_color + size - PARTICLE_SIZES[0]) * PARTICLE_ALPHA_LEVELS
+        self.count = end
 
     def update(self):
-        if not self.particles:
-            self.done = True
-            self.kill() # Remove self if no particles left
-
-        for p in self.particles:
-            p['pos'][0] += p['velocity'][0]
-            p['pos'][1] += p['velocity'][1]
-            p['life'] -= 1
-            if p['life'] <= 0:
-                self.particles.remove(p)
-                break # Break to avoid modifying list while iterating
+        """Advances every particle one frame and compacts out the ones that died."""
+        n = self.count
+        if not n:
+            return
+        self.pos[:n] += self.velocity[:n]
+        self.life[:n] -= 1
+        alive = self.life[:n] > 0
+        survivors = int(np.count_nonzero(alive))
+        if survivors != n:
+            for arr in (self.pos, self.velocity, self.life, self.max_life, self.sprite_base, self.size):
+                arr[:survivors] = arr[:n][alive]
+            self.count = survivors
 
     def draw(self, surface):
-        """Draws the particles of the explosion."""
-        for p in self.particles:
-            alpha = int(255 * (p['life'] / p['max_life']))
-            color = (p['color'][0], p['color'][1], p['color'][2], alpha)
-            pygame.draw.circle(surface, color, (int(p['pos'][0]), int(p['pos'][1])), p['size'])
-
-
-class FloatingScore(pygame.sprite.Sprite):
+        """Draws all live particles with one batched blit."""
+        n = self.count
+        if not n:
+            return
+        # Same fade as before (alpha proportional to remaining life), quantized to the pre-rendered steps
+        level = np.minimum(self.life[:n] * PARTICLE_ALPHA_LEVELS // self.max_life[:n], PARTICLE_ALPHA_LEVELS - 1)
+        indices = (self.sprite_base[:n] + level).tolist()
+        top_left = (self.pos[:n].astype(np.int32) - self.size[:n, None]).tolist()
+        sprites = self.sprites
+        surface.blits([(sprites[i], pos) for i, pos in zip(indices, top_left)], doreturn=False)
+
+    def clear(self):
+        self.count = 0
+
+
+floating_score_fades = {} # Score value -> copies of its text at each fade step, most transparent first
+
+def floating_score_frames(value):
+    frames = floating_score_fades.get(value)
+    if frames is None:
+        text = text_cache.render(font_medium, str(value), WHITE)
+        frames = []
+        for level in range(FLOATING_SCORE_ALPHA_LEVELS):
+            # Copy the cached glyphs since set_alpha() would otherwise fade every user of them
+            frame = text.copy()
+            frame.set_alpha(int(255 * (level + 1) / FLOATING_SCORE_ALPHA_LEVELS))
+            frames.append(frame)
+        floating_score_fades[value] = frames
+    return frames
+
+class FloatingScore(PooledSprite):
     """Displays points earned briefly over a destroyed target."""
-    def __init__(self, center, score_value):
-        super().__init__()
+    def reset(self, center, score_value):
         self.value = score_value
-        self.font = font_medium
-        self.color = WHITE
-        self.image = self.font.render(str(self.value), True, self.color)
+        self.frames = floating_score_frames(score_value)
+        self.image = self.frames[-1]
         self.rect = self.image.get_rect(center=center)
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = sim_clock.ticks()
 
     def update(self):
         self.rect.y -= FLOATING_SCORE_SPEED
-        current_time = pygame.time.get_ticks()
+        current_time = sim_clock.ticks()
         if current_time - self.start_time > FLOATING_SCORE_DURATION:
             self.kill()
-        
+
         alpha = max(0, 255 - int(255 * ((current_time - self.start_time) / FLOATING_SCORE_DURATION)))
-        self.image.set_alpha(alpha)
+        # Same fade as before, quantized to the pre-rendered steps
+        self.image = self.frames[min(alpha * FLOATING_SCORE_ALPHA_LEVELS // 255, FLOATING_SCORE_ALPHA_LEVELS - 1)]
+
+bullet_pool = SpritePool(Bullet)
+enemy_bullet_pool = SpritePool(EnemyBullet)
+powerup_pool = SpritePool(PowerUp)
+floating_score_pool = SpritePool(FloatingScore)
+sprite_pools = [bullet_pool, enemy_bullet_pool, powerup_pool, floating_score_pool]
+
+def reclaim_sprite_pools():
+    for pool in sprite_pools:
+        pool.reclaim()
+
+
+# --- Collision Broad Phase ---
+
+class SpatialGridGroup(pygame.sprite.Group):
+    """Sprite group that also buckets its sprites into a uniform grid for broad-phase collision."""
+    def __init__(self, cell_size=COLLISION_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {} # (cell_x, cell_y) -> {sprite: None}; dicts keep hit order deterministic
+        self.sprite_spans = {} # sprite -> (x0, y0, x1, y1) range of cells it currently covers
+        super().__init__()
+
+    def cell_span(self, rect):
+        """Returns the inclusive range of grid cells covered by a rect."""
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                max(rect.left, rect.right - 1) // size, max(rect.top, rect.bottom - 1) // size)
+
+    def _link(self, sprite, span):
+        x0, y0, x1, y1 = span
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), {})[sprite] = None
+        self.sprite_spans[sprite] = span
+
+    def _unlink(self, sprite, span):
+        x0, y0, x1, y1 = span
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.pop(sprite, None)
+                    if not bucket:
+                        del self.cells[(cx, cy)]
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self._link(sprite, self.cell_span(sprite.rect))
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        span = self.sprite_spans.pop(sprite, None)
+        if span is not None:
+            self._unlink(sprite, span)
+
+    def refresh(self):
+        """Re-buckets only the sprites whose rect moved into a different set of cells."""
+        for sprite, span in list(self.sprite_spans.items()):
+            new_span = self.cell_span(sprite.rect)
+            if new_span != span:
+                self._unlink(sprite, span)
+                self._link(sprite, new_span)
+
+    def query(self, rect):
+        """Returns the sprites in this group whose rect overlaps the given rect."""
+        x0, y0, x1, y1 = self.cell_span(rect)
+        cells = self.cells
+        found = {}
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    for sprite in bucket:
+                        if sprite not in found and rect.colliderect(sprite.rect):
+                            found[sprite] = None
+        return list(found)
+
+
+def grid_spritecollide(sprite, grid_group, dokill):
+    """Grid-backed equivalent of pygame.sprite.spritecollide."""
+    hits = grid_group.query(sprite.rect)
+    if dokill:
+        for hit in hits:
+            hit.kill()
+    return hits
+
+def grid_groupcollide(group_a, grid_group_b, dokill_a, dokill_b):
+    """Grid-backed equivalent of pygame.sprite.groupcollide (group_b must be a SpatialGridGroup)."""
+    collisions = {}
+    for sprite in group_a.sprites():
+        hits = grid_group_b.query(sprite.rect)
+        if hits:
+            collisions[sprite] = hits
+            if dokill_b:
+                for hit in hits:
+                    hit.kill()
+            if dokill_a:
+                sprite.kill()
+    return collisions
 
 
 # --- Game Variables & Groups ---
 all_sprites = pygame.sprite.Group()
 player_bullets = pygame.sprite.Group()
-enemies = pygame.sprite.Group()
-enemy_bullets = pygame.sprite.Group()
-mystery_ships = pygame.sprite.Group()
-shields = pygame.sprite.Group()
-powerups = pygame.sprite.Group()
-# Explosions are handled a bit differently for drawing multiple particles
-# explosions = pygame.sprite.Group() 
+# The enemy wave is one block of arrays rather than a sprite group
+formation = EnemyFormation()
+# Groups that are collided against are spatially hashed so each query only scans nearby cells
+enemy_bullets = SpatialGridGroup()
+mystery_ships = SpatialGridGroup()
+powerups = SpatialGridGroup()
+collision_grids = [enemy_bullets, mystery_ships, powerups]
+shields = [] # Shield objects; each one does its own hit tests against its HP grid
+# Explosions are not sprites: their particles all live in one shared ParticlePool
 floating_scores = pygame.sprite.Group()
 
 # Player object is created in reset_game()
@@ -498,7 +1343,7 @@ lives = 3
 level = 1
 game_state = "MAIN_MENU" # Initial state is now MAIN_MENU
 level_clear_timer = 0
-last_shot_time = pygame.time.get_ticks()
+last_shot_time = sim_clock.ticks()
 
 # Power-up active states and timers
 rapid_fire_active = False
@@ -533,11 +1378,13 @@ menu_options = [
 ]
 selected_menu_option_index = 0
 
-# Store active Explosion objects separately for custom drawing
-active_explosions = []
+# Particles of every active explosion, updated and drawn in bulk
+particles = ParticlePool()
 
 def play_music(music_file):
     """Plays background music."""
+    if NO_WINDOW: # No music in headless runs
+        return
     if music_file: # Only try to play if a file path is provided (not None)
         if pygame.mixer.music.get_busy():
             pygame.mixer.music.stop() # Stop current music
@@ -563,24 +1410,38 @@ def calculate_difficulty_parameters(current_level):
     current_enemy_shoot_prob = BASE_ENEMY_SHOOT_PROB + (current_level - 1) * ENEMY_SHOOT_PROB_INCREMENT
     current_enemy_shoot_prob = min(current_enemy_shoot_prob, 0.015)
 
-def reset_game():
-    """Resets all game elements to their initial state for a new game."""
+def seed_game(seed):
+    """Reseeds every gameplay random number generator so a game can be reproduced from its seed."""
+    rng.seed(seed)
+    formation.rng = np.random.default_rng(seed + 2)
+    particles.rng = np.random.default_rng(seed)
+
+def reset_game(seed=None):
+    """Resets all game elements to their initial state for a new game (with a fresh seed unless given one)."""
     global score, lives, level, game_state, last_shot_time, \
            rapid_fire_active, rapid_fire_timer, current_player_fire_delay, \
            score_multiplier_active, score_multiplier_value, score_multiplier_timer, \
            player, high_score, player_is_dead, player_respawn_time, screen_shake_end_time, \
-           piercing_shot_active, piercing_shot_timer, active_explosions # Added piercing and explosions
+           piercing_shot_active, piercing_shot_timer # Added piercing
 
     # Update high score if current score is higher
-    if score > high_score:
-        high_score = score
-        save_high_score(high_score)
+    high_score = max(high_score, score)
+
+    # Every game starts at time zero with its own seed, so the seed plus the inputs reproduce it exactly
+    if seed is None:
+        seed = round_seeds.randrange(2**32)
+    seed_game(seed)
+    sim_clock.frame = 0
+    audio.clock_restarted()
+    hold_game_sounds(True)
+    if replay_recorder is not None:
+        replay_recorder.start(seed)
 
     score = 0
     lives = 3
     level = 1
     game_state = "LEVEL_STARTING" # New state for wave spawn animation
-    last_shot_time = pygame.time.get_ticks()
+    last_shot_time = sim_clock.ticks()
 
     rapid_fire_active = False
     rapid_fire_timer = 0
@@ -599,19 +1460,17 @@ def reset_game():
 
     calculate_difficulty_parameters(level)
     
-    # Clear all sprite groups and active explosions list
+    # Clear all sprite groups and explosion particles
     all_sprites.empty()
     player_bullets.empty()
-    enemies.empty() # Corrected indentation
+    formation.clear()
     enemy_bullets.empty()
     mystery_ships.empty()
-    shields.empty()
+    shields.clear()
     powerups.empty()
     floating_scores.empty()
-    active_explosions = [] # Clear the list of active explosions
-
-    if mystery_ship_sound: # Stop any looping UFO sound
-        mystery_ship_sound.stop()
+    particles.clear() # Clear any explosion particles still in flight
+    reclaim_sprite_pools() # The groups above were emptied without kill(), so take their sprites back
 
     # Re-add player and spawn new enemies/shields
     global player # Ensure we are re-assigning the global player object
@@ -626,63 +1485,59 @@ def spawn_enemies(rows, cols, x_offset=50, y_offset=50, x_padding=60, y_padding=
     Spawns a grid of enemies with current difficulty parameters.
     Enemies start above screen and fly down to initial_y_target.
     """
-    enemies.empty()
     enemy_bullets.empty()
     powerups.empty() # Clear any lingering power-ups
     floating_scores.empty() # Clear old floating scores
-    # active_explosions = [] # This should only be cleared in reset_game() or when a level starts fully
+    # Explosion particles should only be cleared in reset_game() or when a level starts fully
     # Removed from here to prevent clearing explosions from previous kills during spawn animation
 
     # Remove these from all_sprites as well (excluding player)
     for sprite in all_sprites:
-        if sprite != player and (isinstance(sprite, Enemy) or isinstance(sprite, EnemyBullet) or \
+        if sprite != player and (isinstance(sprite, EnemyBullet) or \
            isinstance(sprite, MysteryShip) or isinstance(sprite, PowerUp) or \
            isinstance(sprite, FloatingScore)):
             sprite.kill()
-    if mystery_ship_sound:
-        mystery_ship_sound.stop()
 
     actual_rows = min(rows + (level - 1) * ENEMY_ROWS_INCREMENT_PER_LEVEL, MAX_ENEMY_ROWS)
 
+    xs, target_ys, start_ys, tiers = [], [], [], []
     for row_idx in range(actual_rows): # Use row_idx for 0-based indexing
         for col in range(cols):
             # Calculate target y for this row
             target_y = y_offset + row_idx * y_padding
+            xs.append(x_offset + col * x_padding)
+            target_ys.append(target_y)
             # Start enemy much higher above the screen for longer descent
-            start_y = target_y - (actual_rows * y_padding) - 50 # Adjusted starting point
-            
-            enemy = Enemy(x_offset + col * x_padding, start_y,
-                          current_enemy_speed_x, current_enemy_speed_y,
-                          target_y, row_idx) # Pass target_y and row_index
-            all_sprites.add(enemy)
-            enemies.add(enemy)
+            start_ys.append(target_y - (actual_rows * y_padding) - 50) # Adjusted starting point
+            tiers.append(row_idx)
+    formation.spawn(xs, target_ys, start_ys, tiers, current_enemy_speed_x, current_enemy_speed_y)
 
 def create_shields(num_shields=4):
     """Creates a set of destructible shields."""
-    shield_width = SHIELD_BLOCK_SIZE * 5
+    shield_width = SHIELD_BLOCK_SIZE * len(SHIELD_SHAPE[0])
     gap_between_shields = (SCREEN_WIDTH - (num_shields * shield_width)) // (num_shields + 1)
-    
-    shields.empty()
-    for sprite in all_sprites:
-        if isinstance(sprite, ShieldBlock):
-            sprite.kill()
 
+    shields.clear()
     for i in range(num_shields):
         start_x = (i + 1) * gap_between_shields + i * shield_width
-        shield_structure = [
-            (0,0), (1,0), (2,0), (3,0), (4,0),
-            (0,1), (1,1), (2,1), (3,1), (4,1),
-            (0,2), (1,2), (3,2), (4,2),
-            (0,3), (4,3)
-        ]
-        for dx, dy in shield_structure:
-            block = ShieldBlock(start_x + dx * SHIELD_BLOCK_SIZE, SHIELD_BASE_Y + dy * SHIELD_BLOCK_SIZE)
-            all_sprites.add(block)
-            shields.add(block)
+        shields.append(Shield(start_x, SHIELD_BASE_Y))
+
+def hit_shields(bullets, direction):
+    """Kills every bullet a shield stops. direction is -1 for rising bullets, 1 for falling ones."""
+    band_top = SHIELD_BASE_Y
+    band_bottom = SHIELD_BASE_Y + SHIELD_BLOCK_SIZE * len(SHIELD_SHAPE)
+    for bullet in bullets.sprites():
+        dy = bullet.speed * direction
+        if bullet.rect.bottom + max(0, -dy) < band_top or bullet.rect.top - max(0, dy) > band_bottom:
+            continue # Nowhere near the shields this frame
+        for shield in shields:
+            if shield.hit(bullet.rect, dy):
+                bullet.kill()
+                break
 
 def draw_message_box(message, color, font_obj, y_offset_factor=0):
     """Draws a centered message box on the screen."""
-    text_surface = font_obj.render(message, True, color)
+    text_surface = text_cache.render(font_obj, message, color)
     text_rect = text_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + y_offset_factor))
 
     box_padding = 20
@@ -692,59 +1547,89 @@ def draw_message_box(message, color, font_obj, y_offset_factor=0):
 
     screen.blit(text_surface, text_rect)
 
+life_icon = pygame.Surface([25, 20], pygame.SRCALPHA)
+pygame.draw.polygon(life_icon, GREEN, [(0, 20), (25, 20), (12.5, 0)])
+
 def draw_lives(surface, x, y, lives_count):
     """Draws small player icons for each remaining life."""
     for i in range(lives_count):
-        life_icon = pygame.Surface([25, 20], pygame.SRCALPHA)
-        pygame.draw.polygon(life_icon, GREEN, [(0, 20), (25, 20), (12.5, 0)])
         surface.blit(life_icon, (x + i * 30, y))
 
 def draw_main_menu():
     """Draws the game's main menu."""
     global selected_menu_option_index
 
-    screen.fill(BLACK)
-    # Draw scrolling stars on menu too
-    for star in stars:
-        pygame.draw.circle(screen, WHITE, (int(star['x']), int(star['y'])), star['size'])
+    # Draw scrolling stars on menu too (the starfield also clears the screen)
+    starfield.draw(screen)
 
-    title_text = font_huge.render("SPACE INVADERS", True, WHITE)
+    title_text = text_cache.render(font_huge, "SPACE INVADERS", WHITE)
     title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4))
     screen.blit(title_text, title_rect)
 
     for i, (text, action) in enumerate(menu_options):
         color = YELLOW if i == selected_menu_option_index else LIGHT_BLUE
-        text_surface = font_large.render(text, True, color)
+        text_surface = text_cache.render(font_large, text, color)
         text_rect = text_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + i * 70))
         screen.blit(text_surface, text_rect)
 
-    pygame.display.flip()
+# High scores screen: (title, level, date) filters cycled with LEFT/RIGHT, and the rows of the current one
+high_score_views = []
+high_score_view_index = 0
+high_score_rows = []
+
+def open_high_scores(step=0):
+    """Queries the leaderboard for the current table; step moves to the previous/next table first."""
+    global high_score_views, high_score_view_index, high_score_rows
+    if step == 0:
+        high_score_views = [("All time", None, None), ("Today", None, datetime.date.today().isoformat())] + \
+                           [(f"Level {lvl}", lvl, None) for lvl in leaderboard.levels()]
+        high_score_view_index = 0
+    high_score_view_index = (high_score_view_index + step) % len(high_score_views)
+    _, view_level, view_date = high_score_views[high_score_view_index]
+    high_score_rows = leaderboard.top(LEADERBOARD_SIZE, level=view_level, played_on=view_date)
 
 def draw_high_scores_screen():
     """Draws the high scores screen."""
-    screen.fill(BLACK)
-    for star in stars:
-        pygame.draw.circle(screen, WHITE, (int(star['x']), int(star['y'])), star['size'])
+    starfield.draw(screen)
 
-    title_text = font_huge.render("HIGH SCORES", True, WHITE)
+    title_text = text_cache.render(font_huge, "HIGH SCORES", WHITE)
     title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4))
     screen.blit(title_text, title_rect)
 
-    score_display_text = font_large.render(f"1. {high_score}", True, YELLOW)
-    score_display_rect = score_display_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
-    screen.blit(score_display_text, score_display_rect)
-
-    back_text = font_medium.render("Press ESC to return to Menu", True, LIGHT_BLUE)
+    view_name = high_score_views[high_score_view_index][0] if high_score_views else "All time"
+    view_text = text_cache.render(font_medium, f"<  {view_name}  >", LIGHT_BLUE)
+    screen.blit(view_text, view_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4 + 80)))
+
+    if not high_score_rows:
+        empty_text = text_cache.render(font_medium, "No scores yet", WHITE)
+        screen.blit(empty_text, empty_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)))
+    row_y = SCREEN_HEIGHT // 4 + 140
+    for rank, (entry_score, entry_level, played_on) in enumerate(high_score_rows, 1):
+        color = YELLOW if rank == 1 else WHITE
+        # One surface per column so the numbers line up
+        columns = [(f"{rank}.", "topright", SCREEN_WIDTH // 2 - 190),
+                   (str(entry_score), "topright", SCREEN_WIDTH // 2 - 50),
+                   (f"Level {entry_level}" if entry_level else "-", "topleft", SCREEN_WIDTH // 2),
+                   (played_on, "topleft", SCREEN_WIDTH // 2 + 160)]
+        for text, anchor, x in columns:
+            column_text = text_cache.render(font_medium, text, color)
+            screen.blit(column_text, column_text.get_rect(**{anchor: (x, row_y)}))
+        row_y += 40
+
+    back_text = text_cache.render(font_medium, "LEFT/RIGHT to change table, ESC to return to Menu", LIGHT_BLUE)
     back_rect = back_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100))
     screen.blit(back_text, back_rect)
 
-    pygame.display.flip()
+def refresh_collision_grids():
+    """Brings every collision grid up to date with sprite positions after movement."""
+    for grid in collision_grids:
+        grid.refresh()
 
 # --- Screen Shake Logic ---
 def trigger_screen_shake(duration_ms, intensity):
     """Activates screen shake for a given duration and intensity."""
     global screen_shake_end_time, screen_shake_offset
-    screen_shake_end_time = pygame.time.get_ticks() + duration_ms
+    screen_shake_end_time = sim_clock.ticks() + duration_ms
     # Reset offset to 0 at the start of a shake
     screen_shake_offset = [0, 0]
 
@@ -753,10 +1638,9 @@ def trigger_screen_shake(duration_ms, intensity):
 running = True
 current_music_state = None # To track which music is playing
 
-while running:
-    current_time = pygame.time.get_ticks()
-
-    # Handle music transitions
+def handle_music_transitions():
+    """Switches background music when the game state changes."""
+    global current_music_state
     if game_state == "MAIN_MENU" and current_music_state != "MAIN_MENU":
         play_music(main_menu_music)
         current_music_state = "MAIN_MENU"
@@ -781,52 +1665,63 @@ while running:
             pygame.mixer.music.unpause()
         current_music_state = "GAME_PLAY"
 
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.K_q and game_state == "MAIN_MENU": # Quick quit from main menu
-            running = False
-        if event.type == pygame.KEYDOWN:
-            if game_state == "MAIN_MENU":
-                if event.key == pygame.K_UP:
-                    selected_menu_option_index = (selected_menu_option_index - 1) % len(menu_options)
-                elif event.key == pygame.K_DOWN:
-                    selected_menu_option_index = (selected_menu_option_index + 1) % len(menu_options)
-                elif event.key == pygame.K_RETURN or event.key == pygame.K_SPACE:
-                    chosen_action = menu_options[selected_menu_option_index][1]
-                    if chosen_action == "START_GAME":
-                        reset_game()
-                    elif chosen_action == "VIEW_HIGH_SCORES":
-                        game_state = "HIGH_SCORES_SCREEN"
-                    elif chosen_action == "QUIT_GAME":
-                        running = False
-            elif game_state == "HIGH_SCORES_SCREEN":
-                if event.key == pygame.K_ESCAPE or event.key == pygame.K_RETURN: # Esc or Enter to return
-                    game_state = "MAIN_MENU"
-                    # selected_menu_option_index is reset to 0 by default, which is fine
-            elif game_state == "RUNNING" or game_state == "LEVEL_STARTING":
-                if event.key == pygame.K_SPACE:
-                    # Only allow shooting if player is visible and enough time has passed
-                    if player.visible and current_time - last_shot_time > current_player_fire_delay:
-                        bullet = Bullet(player.rect.centerx, player.rect.top, current_bullet_speed, piercing_shot_active)
-                        all_sprites.add(bullet)
-                        player_bullets.add(bullet)
-                        if player_shoot_sound:
-                            player_shoot_sound.play()
-                        last_shot_time = current_time
-
-                # Toggle pause with 'P' or 'Escape'
-                if event.key == pygame.K_p or event.key == pygame.K_ESCAPE:
-                    game_state = "PAUSED"
-            elif game_state == "PAUSED":
-                if event.key == pygame.K_p or event.key == pygame.K_ESCAPE:
-                    game_state = "RUNNING"
-            elif game_state == "GAME_OVER" or game_state == "YOU_WON":
-                if event.key == pygame.K_r:
-                    game_state = "MAIN_MENU" # Go back to main menu after game over/win
-                    selected_menu_option_index = 0 # Reset to Start Game option
-
+def handle_event(event):
+    """Handles one pygame event (menus, pause, and recording fire presses)."""
+    global running, game_state, selected_menu_option_index
+    if event.type == pygame.QUIT:
+        running = False
+    if event.type == pygame.K_q and game_state == "MAIN_MENU": # Quick quit from main menu
+        running = False
+    if event.type == pygame.KEYDOWN:
+        profiler.handle_event(event) # F3 debug overlay toggle works in every state
+        if game_state == "MAIN_MENU":
+            if event.key == pygame.K_UP:
+                selected_menu_option_index = (selected_menu_option_index - 1) % len(menu_options)
+            elif event.key == pygame.K_DOWN:
+                selected_menu_option_index = (selected_menu_option_index + 1) % len(menu_options)
+            elif event.key == pygame.K_RETURN or event.key == pygame.K_SPACE:
+                chosen_action = menu_options[selected_menu_option_index][1]
+                if chosen_action == "START_GAME":
+                    reset_game()
+                elif chosen_action == "VIEW_HIGH_SCORES":
+                    open_high_scores()
+                    game_state = "HIGH_SCORES_SCREEN"
+                elif chosen_action == "QUIT_GAME":
+                    running = False
+        elif game_state == "HIGH_SCORES_SCREEN":
+            if event.key == pygame.K_ESCAPE or event.key == pygame.K_RETURN: # Esc or Enter to return
+                game_state = "MAIN_MENU"
+                # selected_menu_option_index is reset to 0 by default, which is fine
+            elif event.key == pygame.K_LEFT:
+                open_high_scores(-1)
+            elif event.key == pygame.K_RIGHT:
+                open_high_scores(1)
+        elif game_state == "RUNNING" or game_state == "LEVEL_STARTING":
+            if event.key == pygame.K_SPACE:
+                controls.fire = True # The shot itself is taken in update_game()
+
+            # Toggle pause with 'P' or 'Escape' (applied in update_game so replays capture it)
+            if event.key == pygame.K_p or event.key == pygame.K_ESCAPE:
+                controls.pause = True
+        elif game_state == "PAUSED":
+            if event.key == pygame.K_p or event.key == pygame.K_ESCAPE:
+                controls.pause = True
+        elif game_state == "GAME_OVER" or game_state == "YOU_WON":
+            if event.key == pygame.K_r:
+                game_state = "MAIN_MENU" # Go back to main menu after game over/win
+                selected_menu_option_index = 0 # Reset to Start Game option
+                hold_game_sounds(False)
+
+def update_game(current_time):
+    """Update phase: timers, shooting, sprite movement and spawning for one frame."""
+    global rapid_fire_active, current_player_fire_delay, score_multiplier_active, score_multiplier_value, \
+           piercing_shot_active, player_is_dead, last_shot_time, game_state, level
+
+    if controls.pause:
+        if game_state == "RUNNING" or game_state == "LEVEL_STARTING":
+            game_state = "PAUSED"
+        elif game_state == "PAUSED":
+            game_state = "RUNNING"
 
     # Game logic updates (only if game is running or in a specific state)
     if game_state == "RUNNING" or game_state == "LEVEL_STARTING":
@@ -852,205 +1747,48 @@ while running:
                 player.rect.centerx = SCREEN_WIDTH // 2 # Reset position
                 player.rect.bottom = SCREEN_HEIGHT - 30
                 all_sprites.add(player) # Re-add player to sprite group
-        
+
+        # Only allow shooting if player is visible and enough time has passed
+        if controls.fire and player.visible and current_time - last_shot_time > current_player_fire_delay:
+            bullet = bullet_pool.get(player.rect.centerx, player.rect.top, current_bullet_speed, piercing_shot_active)
+            all_sprites.add(bullet)
+            player_bullets.add(bullet)
+            audio.play("player_shoot")
+            last_shot_time = current_time
+
         # Update sprites. Player update is conditional on visible/dead.
-        # Explosions are updated via their own list.
+        # Explosion particles are updated by the shared particle pool.
         for sprite in all_sprites:
             if sprite == player: # Handle player update specially
                 if player.visible:
                     player.update()
             else: # Update other game sprites
                 sprite.update()
-        
-        # Update active explosions
-        for exp in list(active_explosions): # Iterate over a copy to allow removal
-            exp.update()
-            if exp.done:
-                active_explosions.remove(exp)
 
+        # Move the whole enemy wave and all explosion particles at once
+        formation.update()
+        particles.update()
+
+        # The wave has finished its spawn animation once no enemy is still flying in
+        if game_state == "LEVEL_STARTING" and not formation.any_spawning():
+            game_state = "RUNNING"
 
         # Mystery Ship spawn logic (only if player is visible and not during spawn animation)
         # Also ensure not in LEVEL_STARTING when enemies are flying in
         if not mystery_ships and not player_is_dead and game_state == "RUNNING" and \
-           random.random() < MYSTERY_SHIP_APPEAR_PROB:
+           rng.random() < MYSTERY_SHIP_APPEAR_PROB:
             ufo = MysteryShip(MYSTERY_SHIP_SPEED)
             all_sprites.add(ufo)
             mystery_ships.add(ufo)
 
         # Enemy shooting logic (only if player is visible and enemies are not spawning)
-        for enemy in enemies:
-            if not enemy.spawning and not player_is_dead and random.random() < current_enemy_shoot_prob:
-                enemy_bullet = EnemyBullet(enemy.rect.centerx, enemy.rect.bottom, current_enemy_bullet_speed)
+        if not player_is_dead:
+            for muzzle_x, muzzle_y in formation.roll_shots(current_enemy_shoot_prob):
+                enemy_bullet = enemy_bullet_pool.get(muzzle_x, muzzle_y, current_enemy_bullet_speed)
                 all_sprites.add(enemy_bullet)
                 enemy_bullets.add(enemy_bullet)
 
-        # --- Collision Detection ---
-        if not player_is_dead: # Only check player collisions if alive
-            # Player Bullet-Enemy collision
-            collisions = pygame.sprite.groupcollide(player_bullets, enemies, False, True) # Bullet NOT killed immediately
-            for bullet, enemy_list in collisions.items():
-                for enemy in enemy_list:
-                    points_earned = enemy.points * score_multiplier_value # Use enemy's specific points
-                    score += points_earned
-                    if enemy_explosion_sound:
-                        enemy_explosion_sound.play()
-                    
-                    # Add explosion for the enemy
-                    explosion = Explosion(enemy.rect.center)
-                    active_explosions.append(explosion)
-                    trigger_screen_shake(100, 2) # Light shake for enemy explosion
-
-                    floating_score = FloatingScore(enemy.rect.center, points_earned)
-                    all_sprites.add(floating_score)
-                    floating_scores.add(floating_score)
-
-                    if random.random() < POWERUP_DROP_PROB_ENEMY:
-                        powerup_type = random.choice(list(POWERUP_COLORS.keys())) # All types including piercing
-                        powerup = PowerUp(enemy.rect.centerx, enemy.rect.centery, powerup_type)
-                        all_sprites.add(powerup)
-                        powerups.add(powerup)
-                
-                if not bullet.piercing: # If not piercing, kill the bullet after first hit
-                    bullet.kill()
-
-
-            # Player Bullet-Mystery Ship collision
-            mystery_ship_hits = pygame.sprite.groupcollide(player_bullets, mystery_ships, True, True)
-            for bullet, ufo_list in mystery_ship_hits.items():
-                for ufo in ufo_list:
-                    points_earned = MYSTERY_SHIP_POINTS * score_multiplier_value
-                    score += points_earned
-                    if mystery_ship_explode_sound:
-                        mystery_ship_explode_sound.play()
-                    if mystery_ship_sound:
-                        mystery_ship_sound.stop()
-                    
-                    # Add explosion for the UFO
-                    explosion = Explosion(ufo.rect.center)
-                    active_explosions.append(explosion)
-                    trigger_screen_shake(200, 5) # Stronger shake for UFO
-
-                    floating_score = FloatingScore(ufo.rect.center, points_earned)
-                    all_sprites.add(floating_score)
-                    floating_scores.add(floating_score)
-
-                    if random.random() < POWERUP_DROP_PROB_UFO:
-                        powerup_type = random.choice(list(POWERUP_COLORS.keys())) # All types including piercing
-                        powerup = PowerUp(ufo.rect.centerx, ufo.rect.centery, powerup_type)
-                        all_sprites.add(powerup)
-                        powerups.add(powerup)
-
-
-            # Enemy Bullet-Player collision
-            if not player.invincible: # Only take damage if not invincible
-                player_hit_by_bullet = pygame.sprite.spritecollide(player, enemy_bullets, True)
-                if player_hit_by_bullet:
-                    lives -= 1
-                    player_is_dead = True # Player is now "dead" for a respawn sequence
-                    player.visible = False # Hide player
-                    player.kill() # Remove player from all_sprites temporarily
-                    player_respawn_time = current_time # Start respawn timer
-
-                    # Create explosion at player's position
-                    explosion = Explosion(player.rect.center)
-                    active_explosions.append(explosion)
-                    trigger_screen_shake(300, 7) # Strongest shake for player death
-
-                    if player_hit_sound: # Sound for taking hit
-                        player_hit_sound.play()
-                    if player_explode_sound: # Sound for player explosion
-                        player_explode_sound.play()
-
-                    if lives <= 0:
-                        game_state = "GAME_OVER"
-                        if score > high_score: # Update high score on game over
-                            high_score = score
-                            save_high_score(high_score)
-
-            # Player-Enemy collision (if enemies reach player or player moves into them)
-            if not player.invincible: # Only take damage if not invincible
-                if pygame.sprite.spritecollide(player, enemies, False):
-                    lives -=1
-                    player_is_dead = True
-                    player.visible = False
-                    player.kill()
-                    player_respawn_time = current_time
-
-                    explosion = Explosion(player.rect.center)
-                    active_explosions.append(explosion)
-                    trigger_screen_shake(300, 7) # Strongest shake for player death
-
-                    if player_hit_sound:
-                        player_hit_sound.play()
-                    if player_explode_sound:
-                        player_explode_sound.play()
-
-                    if lives <=0:
-                        game_state = "GAME_OVER"
-                        if score > high_score:
-                            high_score = score
-                            save_high_score(high_score)
-
-
-        # Check if any enemy reached the bottom of the screen
-        for enemy in enemies:
-            if enemy.rect.bottom >= SCREEN_HEIGHT:
-                game_state = "GAME_OVER"
-                if score > high_score: # Update high score on game over
-                    high_score = score
-                    save_high_score(high_score)
-                break
-
-        # Check if all enemies are defeated for current level
-        if not enemies:
-            game_state = "LEVEL_CLEARED"
-            level_clear_timer = current_time
-            if level_up_sound:
-                level_up_sound.play()
-            if mystery_ship_sound:
-                mystery_ship_sound.stop()
-
-
-        # --- Shield Collisions ---
-        # Player bullets hitting shields
-        # Piercing bullets should still be killed by shields
-        bullet_shield_collisions = pygame.sprite.groupcollide(player_bullets, shields, True, False)
-        for bullet, shield_blocks in bullet_shield_collisions.items():
-            for block in shield_blocks:
-                block.hit()
-
-        # Enemy bullets hitting shields
-        enemy_bullet_shield_collisions = pygame.sprite.groupcollide(enemy_bullets, shields, True, False)
-        for bullet, shield_blocks in enemy_bullet_shield_collisions.items():
-            for block in shield_blocks:
-                block.hit()
-
-        # --- Player collecting Power-ups ---
-        if player.visible: # Only allow collection if player is visible
-            player_powerup_collisions = pygame.sprite.spritecollide(player, powerups, True)
-            for powerup in player_powerup_collisions:
-                if powerup_collect_sound:
-                    powerup_collect_sound.play()
-                if powerup.type == "rapid_fire":
-                    rapid_fire_active = True
-                    rapid_fire_timer = current_time
-                    current_player_fire_delay = PLAYER_FIRE_DELAY_RAPID
-                elif powerup.type == "extra_life":
-                    lives += 1
-                elif powerup.type == "score_multiplier":
-                    score_multiplier_active = True
-                    score_multiplier_timer = current_time
-                    score_multiplier_value = SCORE_MULTIPLIER_VALUE
-                elif powerup.type == "piercing_shot": # New piercing shot power-up
-                    piercing_shot_active = True
-                    piercing_shot_timer = current_time
-
-
     elif game_state == "LEVEL_CLEARED":
-        draw_message_box(f"Level {level} Complete!", LIGHT_BLUE, font_large, y_offset_factor=-50)
-        draw_message_box("Preparing for next wave...", WHITE, font_medium, y_offset_factor=0)
-
-        current_time = pygame.time.get_ticks()
         if current_time - level_clear_timer > 3000:
             level += 1
             calculate_difficulty_parameters(level)
@@ -1058,51 +1796,202 @@ while running:
             create_shields() # Recreate shields for new level
             game_state = "LEVEL_STARTING" # Transition to spawn animation
 
-
     elif game_state == "PAUSED":
         # No sprite updates in paused state
         pass
 
-
-    # --- Drawing ---
-    screen.fill(BLACK)
-
-    # Draw scrolling starfield background
-    for star in stars:
-        star['y'] += STAR_SPEED
-        if star['y'] > SCREEN_HEIGHT: # Reset star when it goes off screen
-            star['y'] = 0
-            star['x'] = random.randint(0, SCREEN_WIDTH) # New x for new star
-        pygame.draw.circle(screen, WHITE, (int(star['x']), int(star['y'])), star['size'])
+def end_game():
+    """Switches to GAME_OVER and queues the score for the leaderboard (once per game)."""
+    global game_state, high_score
+    if game_state == "GAME_OVER":
+        return
+    game_state = "GAME_OVER"
+    high_score = max(high_score, score) # Update high score on game over
+    leaderboard.submit(score, level)
+
+def resolve_collisions(current_time):
+    """Collide phase: all hit tests and their consequences for one frame."""
+    global score, lives, high_score, game_state, level_clear_timer, player_is_dead, player_respawn_time, \
+           rapid_fire_active, rapid_fire_timer, current_player_fire_delay, \
+           score_multiplier_active, score_multiplier_timer, score_multiplier_value, \
+           piercing_shot_active, piercing_shot_timer
+
+    if game_state != "RUNNING" and game_state != "LEVEL_STARTING":
+        return
+
+    # Sprites moved this frame, so re-bucket them before any collision pass
+    refresh_collision_grids()
+
+    # --- Collision Detection ---
+    if not player_is_dead: # Only check player collisions if alive
+        # Player Bullet-Enemy collision
+        collisions = formation.collide_sprites(player_bullets.sprites()) # Bullet NOT killed immediately
+        for bullet, enemy_list in collisions.items():
+            for enemy in enemy_list:
+                points_earned = enemy.points * score_multiplier_value # Use enemy's specific points
+                score += points_earned
+                audio.play("enemy_explosion")
+
+                # Add explosion for the enemy
+                particles.emit(enemy.rect.center)
+                trigger_screen_shake(100, 2) # Light shake for enemy explosion
+
+                floating_score = floating_score_pool.get(enemy.rect.center, points_earned)
+                all_sprites.add(floating_score)
+                floating_scores.add(floating_score)
+
+                if rng.random() < POWERUP_DROP_PROB_ENEMY:
+                    powerup_type = rng.choice(list(POWERUP_COLORS.keys())) # All types including piercing
+                    powerup = powerup_pool.get(enemy.rect.centerx, enemy.rect.centery, powerup_type)
+                    all_sprites.add(powerup)
+                    powerups.add(powerup)
+
+            if not bullet.piercing: # If not piercing, kill the bullet after first hit
+                bullet.kill()
+
+
+        # Player Bullet-Mystery Ship collision
+        mystery_ship_hits = grid_groupcollide(player_bullets, mystery_ships, True, True)
+        for bullet, ufo_list in mystery_ship_hits.items():
+            for ufo in ufo_list:
+                points_earned = MYSTERY_SHIP_POINTS * score_multiplier_value
+                score += points_earned
+                audio.play("mystery_ship_explode")
+
+                # Add explosion for the UFO
+                particles.emit(ufo.rect.center)
+                trigger_screen_shake(200, 5) # Stronger shake for UFO
+
+                floating_score = floating_score_pool.get(ufo.rect.center, points_earned)
+                all_sprites.add(floating_score)
+                floating_scores.add(floating_score)
+
+                if rng.random() < POWERUP_DROP_PROB_UFO:
+                    powerup_type = rng.choice(list(POWERUP_COLORS.keys())) # All types including piercing
+                    powerup = powerup_pool.get(ufo.rect.centerx, ufo.rect.centery, powerup_type)
+                    all_sprites.add(powerup)
+                    powerups.add(powerup)
+
+
+        # Enemy Bullet-Player collision
+        if not player.invincible: # Only take damage if not invincible
+            player_hit_by_bullet = grid_spritecollide(player, enemy_bullets, True)
+            if player_hit_by_bullet:
+                lives -= 1
+                player_is_dead = True # Player is now "dead" for a respawn sequence
+                player.visible = False # Hide player
+                player.kill() # Remove player from all_sprites temporarily
+                player_respawn_time = current_time # Start respawn timer
+
+                # Create explosion at player's position
+                particles.emit(player.rect.center)
+                trigger_screen_shake(300, 7) # Strongest shake for player death
+
+                audio.play("player_hit") # Sound for taking hit
+                audio.play("player_explode") # Sound for player explosion
+
+                if lives <= 0:
+                    end_game()
+
+        # Player-Enemy collision (if enemies reach player or player moves into them)
+        if not player.invincible: # Only take damage if not invincible
+            if formation.collide_any(player.rect):
+                lives -=1
+                player_is_dead = True
+                player.visible = False
+                player.kill()
+                player_respawn_time = current_time
+
+                particles.emit(player.rect.center)
+                trigger_screen_shake(300, 7) # Strongest shake for player death
+
+                audio.play("player_hit")
+                audio.play("player_explode")
+
+                if lives <=0:
+                    end_game()
+
+
+    # Check if any enemy reached the bottom of the screen
+    if formation.reached_bottom():
+        end_game()
+
+    # Check if all enemies are defeated for current level
+    if not formation:
+        game_state = "LEVEL_CLEARED"
+        level_clear_timer = current_time
+        audio.play("level_up")
+
+
+    # --- Shield Collisions ---
+    # Player bullets hitting shields
+    # Piercing bullets should still be killed by shields
+    hit_shields(player_bullets, -1)
+
+    # Enemy bullets hitting shields
+    hit_shields(enemy_bullets, 1)
+
+    # --- Player collecting Power-ups ---
+    if player.visible: # Only allow collection if player is visible
+        player_powerup_collisions = grid_spritecollide(player, powerups, True)
+        for powerup in player_powerup_collisions:
+            audio.play("powerup_collect")
+            if powerup.type == "rapid_fire":
+                rapid_fire_active = True
+                rapid_fire_timer = current_time
+                current_player_fire_delay = PLAYER_FIRE_DELAY_RAPID
+            elif powerup.type == "extra_life":
+                lives += 1
+            elif powerup.type == "score_multiplier":
+                score_multiplier_active = True
+                score_multiplier_timer = current_time
+                score_multiplier_value = SCORE_MULTIPLIER_VALUE
+            elif powerup.type == "piercing_shot": # New piercing shot power-up
+                piercing_shot_active = True
+                piercing_shot_timer = current_time
+
+def draw_frame(current_time, alpha=None):
+    """Draw phase: renders the current state to the screen (the caller flips the display).
+    With alpha, sprites are drawn that fraction of a frame past their previous sim position."""
+    global screen_shake_offset
+
+    # Draw scrolling starfield background (this also clears the screen)
+    starfield.scroll_to(sim_clock.frame + (alpha or 0.0))
+    starfield.draw(screen)
 
     # Calculate screen shake offset
     screen_shake_offset = [0, 0] # Reset each frame
     if current_time < screen_shake_end_time:
-        screen_shake_offset[0] = random.randint(-SCREEN_SHAKE_INTENSITY, SCREEN_SHAKE_INTENSITY)
-        screen_shake_offset[1] = random.randint(-SCREEN_SHAKE_INTENSITY, SCREEN_SHAKE_INTENSITY)
+        screen_shake_offset[0] = fx_rng.randint(-SCREEN_SHAKE_INTENSITY, SCREEN_SHAKE_INTENSITY)
+        screen_shake_offset[1] = fx_rng.randint(-SCREEN_SHAKE_INTENSITY, SCREEN_SHAKE_INTENSITY)
 
-    # All game drawing (except menu screens) happens on a temporary surface with offset
+    # All game drawing (except menu screens) happens on the shared render surface with offset
     if game_state not in ["MAIN_MENU", "HIGH_SCORES_SCREEN"]:
-        render_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        render_surface.fill((0,0,0,0)) # Make sure it's transparent to draw on
-
-        all_sprites.draw(render_surface) # Draws all sprites including player if visible
+        render_surface.fill((0,0,0,0)) # Clear last frame's scene back to transparent
+
+        for shield in shields:
+            shield.draw(render_surface)
+        formation.draw(render_surface, alpha)
+        # Draws all sprites including player if visible
+        if alpha is None:
+            all_sprites.draw(render_surface)
+        else:
+            sprite_positions.draw(render_surface, all_sprites, alpha)
 
-        # Draw active explosions separately (since they're not in all_sprites)
-        for exp in active_explosions:
-            exp.draw(render_surface)
+        # Draw explosion particles separately (since they're not in all_sprites)
+        particles.draw(render_surface)
 
 
-        # Display score, lives, and level
-        score_text = font_small.render(f"Score: {score}", True, WHITE)
+        # Display score, lives, and level (labels only re-render when their value changes)
+        score_text = score_label.render(score)
         render_surface.blit(score_text, (10, 10))
 
-        high_score_text = font_small.render(f"HIGH SCORE: {high_score}", True, WHITE)
+        high_score_text = high_score_label.render(high_score)
         high_score_rect = high_score_text.get_rect(midtop=(SCREEN_WIDTH // 2, 10)) # Top center
         render_surface.blit(high_score_text, high_score_rect)
 
 
-        level_text = font_small.render(f"Level: {level}", True, WHITE)
+        level_text = level_label.render(level)
         level_text_rect = level_text.get_rect(midtop=(SCREEN_WIDTH // 2, high_score_rect.bottom + 5)) # Below high score
         render_surface.blit(level_text, level_text_rect)
 
@@ -1111,15 +2000,15 @@ while running:
         # Display power-up active indicators
         powerup_indicator_y = 40
         if rapid_fire_active:
-            rf_text = font_small.render("RAPID FIRE!", True, POWERUP_COLORS["rapid_fire"])
+            rf_text = text_cache.render(font_small, "RAPID FIRE!", POWERUP_COLORS["rapid_fire"])
             render_surface.blit(rf_text, (10, powerup_indicator_y))
             powerup_indicator_y += 20
         if score_multiplier_active:
-            sm_text = font_small.render(f"SCORE x{score_multiplier_value}!", True, POWERUP_COLORS["score_multiplier"])
+            sm_text = score_multiplier_label.render(score_multiplier_value)
             render_surface.blit(sm_text, (10, powerup_indicator_y))
             powerup_indicator_y += 20
         if piercing_shot_active:
-            ps_text = font_small.render("PIERCING SHOT!", True, POWERUP_COLORS["piercing_shot"])
+            ps_text = text_cache.render(font_small, "PIERCING SHOT!", POWERUP_COLORS["piercing_shot"])
             render_surface.blit(ps_text, (10, powerup_indicator_y))
 
 
@@ -1127,17 +2016,21 @@ while running:
         if game_state == "GAME_OVER":
             draw_message_box("GAME OVER!", RED, font_large, y_offset_factor=-50)
             draw_message_box(f"Final Score: {score}", WHITE, font_medium, y_offset_factor=0)
-            restart_text = font_medium.render("Press 'R' to return to Main Menu", True, BLUE)
+            restart_text = text_cache.render(font_medium, "Press 'R' to return to Main Menu", BLUE)
             restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 100))
             render_surface.blit(restart_text, restart_rect)
 
         elif game_state == "YOU_WON":
             draw_message_box("YOU WON!", GREEN, font_large, y_offset_factor=-50)
             draw_message_box(f"Final Score: {score}", WHITE, font_medium, y_offset_factor=0)
-            restart_text = font_medium.render("Press 'R' to return to Main Menu", True, BLUE)
+            restart_text = text_cache.render(font_medium, "Press 'R' to return to Main Menu", BLUE)
             restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 100))
             render_surface.blit(restart_text, restart_rect)
 
+        elif game_state == "LEVEL_CLEARED":
+            draw_message_box(f"Level {level} Complete!", LIGHT_BLUE, font_large, y_offset_factor=-50)
+            draw_message_box("Preparing for next wave...", WHITE, font_medium, y_offset_factor=0)
+
         elif game_state == "PAUSED":
             draw_message_box("PAUSED", YELLOW, font_large, y_offset_factor=-50)
             draw_message_box("Press 'P' or 'ESC' to Resume", WHITE, font_medium, y_offset_factor=0)
@@ -1151,12 +2044,172 @@ while running:
         elif game_state == "HIGH_SCORES_SCREEN":
             draw_high_scores_screen()
 
-
-    pygame.display.flip()
-
-    clock.tick(FPS)
-
+    if profiler.overlay_visible:
+        # Rendered directly (not cached) so the counters only measure the game's own text work
+        debug_text = font_small.render(
+            f"Text cache: {text_cache.hits} hits, {text_cache.misses} renders | "
+            f"this frame: {text_cache.frame_hits} hits, {text_cache.frame_misses} renders", True, YELLOW)
+        screen.blit(debug_text, (10, SCREEN_HEIGHT - 30))
+        pool_text = font_small.render(
+            f"Sprite pools: {sum(pool.allocations for pool in sprite_pools)} allocated, "
+            f"{sum(len(pool.free) for pool in sprite_pools)} free | this frame: "
+            f"{sum(pool.frame_allocations for pool in sprite_pools)} allocations, "
+            f"{sum(pool.frame_reuses for pool in sprite_pools)} reuses", True, YELLOW)
+        screen.blit(pool_text, (10, SCREEN_HEIGHT - 55))
+        profiler.draw_overlay(screen)
+    # Per-frame counters restart once per drawn frame, so they cover every sim step since the last one
+    text_cache.begin_frame()
+    for pool in sprite_pools:
+        pool.begin_frame()
+
+def end_sim_frame():
+    """Bookkeeping after every simulated frame: replay recording, one-frame presses and the clock."""
+    if replay_recorder is not None and replay_recorder.recording:
+        replay_recorder.record(controls.to_mask())
+        if game_state == "GAME_OVER":
+            replay_recorder.save()
+    controls.end_frame()
+    sim_clock.step()
+
+def print_phase_timings():
+    for phase, (mean, p50, p99) in profiler.summary().items():
+        print(f"  {phase:<10} mean {mean:7.3f} ms   p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+
+def run_game():
+    """Runs the interactive game until the window is closed."""
+    loop = FixedTimestep(FPS)
+    while running:
+        profiler.begin_frame()
+
+        with profiler.section("events"):
+            handle_music_transitions()
+            # The UFO hum is driven by game state instead of being stopped from every place a UFO can go away
+            audio.set_looping("mystery_ship", bool(mystery_ships) and game_state in ("RUNNING", "LEVEL_STARTING"))
+            for event in pygame.event.get():
+                handle_event(event)
+            controls.read_keyboard()
+
+        # As many sim frames as real time owes: none on a fast redraw, several after a slow frame
+        for _ in loop.steps():
+            current_time = sim_clock.ticks()
+            sprite_positions.snapshot(all_sprites)
+            formation.snapshot()
+            with profiler.section("update"):
+                update_game(current_time)
+            with profiler.section("collisions"):
+                resolve_collisions(current_time)
+            end_sim_frame()
+
+        with profiler.section("draw"):
+            draw_frame(sim_clock.ticks(), loop.alpha)
+        with profiler.section("flip"):
+            pygame.display.flip()
+        profiler.end_frame()
+
+def run_headless(frames, draw_every):
+    """Simulates frames as fast as possible with a scripted player and prints per-phase timings."""
+    autopilot = Autopilot(game_seed)
+    games_played = 1
+    reset_game()
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        current_time = sim_clock.ticks()
+        profiler.begin_frame()
+        pygame.event.pump() # Keep SDL's event queue from filling up
+        autopilot.poll(controls)
+
+        with profiler.section("update"):
+            update_game(current_time)
+        with profiler.section("collisions"):
+            resolve_collisions(current_time)
+        # Drawing only reads game state, so skipping it never changes the simulation
+        if draw_every and frame % draw_every == 0:
+            with profiler.section("draw"):
+                draw_frame(current_time)
+                pygame.display.flip()
+
+        profiler.end_frame()
+        end_sim_frame()
+        if game_state == "GAME_OVER": # Keep soaking: start a fresh game straight away
+            games_played += 1
+            reset_game()
+    elapsed = time.perf_counter() - start
+
+    print(f"Headless run: {frames} frames in {elapsed:.2f}s ({frames / elapsed:.0f} frames/s), seed {game_seed}")
+    print_phase_timings()
+    print(f"  final state: games {games_played}, level {level}, score {score}, lives {lives}, "
+          f"enemies {len(formation)}, sim time {sim_clock.ticks()} ms")
+    print("  sprite pools: " + ", ".join(f"{pool.sprite_class.__name__} {pool.allocations} allocated / "
+                                         f"{pool.reuses} reused" for pool in sprite_pools))
+
+def simulate_replay_frame(mask):
+    """Runs one recorded frame: the recorded inputs instead of the keyboard, then update and collisions."""
+    controls.set_mask(mask)
+    current_time = sim_clock.ticks()
+    with profiler.section("update"):
+        update_game(current_time)
+    with profiler.section("collisions"):
+        resolve_collisions(current_time)
+    end_sim_frame()
+
+def run_replay(path, speed):
+    """Plays back a replay: as fast as possible without rendering if speed <= 0, else drawn at speed x real time."""
+    try:
+        seed, frames, runs = load_replay(path)
+    except (OSError, ValueError) as e:
+        print(f"Can't play replay: {e}")
+        return
+    reset_game(seed)
+    masks = (mask for count, mask in runs for _ in range(count))
+
+    start = time.perf_counter()
+    if speed <= 0:
+        for mask in masks:
+            profiler.begin_frame()
+            simulate_replay_frame(mask)
+            profiler.end_frame()
+    else:
+        loop = FixedTimestep(FPS * speed) # Speeds below 1 hold frames on screen, speeds above 1 skip draws
+        playing = True
+        while playing:
+            profiler.begin_frame()
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    playing = False
+                elif event.type == pygame.KEYDOWN:
+                    profiler.handle_event(event)
+            for _ in loop.steps():
+                mask = next(masks, None) if playing else None
+                if mask is None: # End of the recording, or the window was closed
+                    playing = False
+                    break
+                simulate_replay_frame(mask)
+            with profiler.section("draw"):
+                draw_frame(sim_clock.ticks())
+                pygame.display.flip()
+            profiler.end_frame()
+    elapsed = time.perf_counter() - start
+
+    print(f"Replay of {path}: {sim_clock.frame} of {frames} frames in {elapsed:.2f}s "
+          f"({sim_clock.frame / max(elapsed, 1e-9):.0f} frames/s), seed {seed}")
+    print_phase_timings()
+    print(f"  final state: {game_state}, level {level}, score {score}, lives {lives}, "
+          f"enemies {len(formation)}, sim time {sim_clock.ticks()} ms")
+
+if ARGS.replay:
+    run_replay(ARGS.replay, ARGS.replay_speed)
+elif ARGS.headless:
+    run_headless(ARGS.frames, ARGS.draw_every)
+else:
+    run_game()
+
+if replay_recorder is not None: # Keep a game that was still in progress when the game closed
+    replay_recorder.save(finished=False)
 # Stop music before quitting
+profiler.close()
+audio.close()
+leaderboard.close() # Flushes any scores still queued
 stop_music()
 pygame.quit()
 sys.exit()
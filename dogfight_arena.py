@@ -0,0 +1,471 @@
+import argparse
+import contextlib
+import math
+import multiprocessing
+import os
+import random
+import time
+from functools import partial
+
+import numpy as np
+import pygame
+
+from frame_profiler import percentile
+
+# DogFight's rules without drawing or sound, shared by DogFight.py and headless bot-vs-bot matches.
+#
+# An Arena is one fight: its jets, their projectiles and the AI bookkeeping.
+#
+#     arena = Arena(seed=0, ai_budget_ms=None)
+#     arena.add_squadrons(3)
+#     while arena.winner() is None:
+#         arena.step()
+#
+# Run as a script to play many seeded AI-vs-AI matches across a process pool and report win rates
+# and per-match timings, e.g. to compare AI settings: python dogfight_arena.py --matches 2000 --squadron 3
+#
+# Only pygame.Rect is used, so nothing here needs a display or pygame.init().
+
+# Field and jets
+WIDTH, HEIGHT = 1000, 700
+SIM_HZ = 60 # Simulation steps per second; speeds are pixels per step
+JET_SIZE = (50, 40)
+JET_SPEED = 5
+MAX_HEALTH = 100
+BULLET_SPEED = 12
+MISSILE_SPEED = 8
+MAX_MISSILES = 3
+MISSILE_LOCK_RANGE = 300
+BULLET_SIZE = 5
+MISSILE_SIZE = 6
+BULLET_DAMAGE = 5
+MISSILE_DAMAGE = 20
+BULLET, MISSILE = 0, 1 # Projectile kinds
+BLUE_TEAM, GREEN_TEAM = 0, 1 # Blue fires right, green fires left
+SPATIAL_CELL_SIZE = 200 # Pixels per spatial grid cell for nearest-enemy lookups
+
+# Weapons; times are in simulation steps
+GUN_COOLDOWN = 6 # Holding SPACE fires 10 rounds a second
+GUN_MAGAZINE = 30
+GUN_RELOAD = 90 # An empty gun is reloaded after this long
+MISSILE_COOLDOWN = 30 # Holding M launches one missile every half second
+
+# AI; each jet can be given its own values (see Jet)
+AI_THINK_BUDGET_MS = 1.0 # AI target choice per step stops here (at least one jet always thinks); None thinks for all
+AI_CHASE_SPEED = 0.6 # Fraction of JET_SPEED an AI jet flies at towards its target
+AI_FIRE_ODDS = 80 # An AI jet chasing a target pulls the trigger with chance 1 in AI_FIRE_ODDS + 1 per step
+AI_USE_MISSILES = False # The game's AI only shoots; arena matches can let it launch at locked targets
+
+MAX_MATCH_STEPS = 60 * SIM_HZ # A headless match still undecided after a minute of game time is a draw
+
+
+class Projectiles:
+    """Every jet's bullets and missiles in shared NumPy arrays, moved, culled and hit-tested in batches.
+    Positions are the top-left corners of the projectiles' hit boxes; owner and target index into the jets."""
+    def __init__(self, capacity=256):
+        self.count = 0
+        self.x = np.zeros(capacity, np.int32)
+        self.y = np.zeros(capacity, np.int32)
+        self.vx = np.zeros(capacity, np.int32) # Bullets only; missiles steer towards their target
+        self.kind = np.zeros(capacity, np.int8)
+        self.owner = np.zeros(capacity, np.int32)
+        self.target = np.zeros(capacity, np.int32)
+        self.prev_x = np.zeros(capacity, np.int32) # Positions at the start of the step, for interpolated drawing
+        self.prev_y = np.zeros(capacity, np.int32)
+
+    def add(self, kind, x, y, vx, owner, target=-1):
+        if self.count == len(self.x):
+            for name in ("x", "y", "vx", "kind", "owner", "target", "prev_x", "prev_y"):
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+        i = self.count
+        self.x[i], self.y[i], self.vx[i] = x, y, vx
+        self.prev_x[i], self.prev_y[i] = x, y
+        self.kind[i], self.owner[i], self.target[i] = kind, owner, target
+        self.count += 1
+
+    def keep(self, mask):
+        """Drops every projectile whose entry in mask is False."""
+        n = self.count
+        kept = int(np.count_nonzero(mask))
+        for array in (self.x, self.y, self.vx, self.kind, self.owner, self.target, self.prev_x, self.prev_y):
+            array[:kept] = array[:n][mask]
+        self.count = kept
+
+    def snapshot(self):
+        """Remembers where every projectile is before a step moves it."""
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+
+    def sizes(self):
+        return np.where(self.kind[:self.count] == MISSILE, MISSILE_SIZE, BULLET_SIZE)
+
+    def update(self, jets):
+        """Moves bullets straight and steers missiles at their targets, then culls anything off screen."""
+        n = self.count
+        if n == 0:
+            return
+        x, y = self.x[:n], self.y[:n]
+        x += self.vx[:n]
+
+        missiles = np.flatnonzero(self.kind[:n] == MISSILE)
+        if len(missiles):
+            centers = np.array([jet.rect.center for jet in jets])
+            target = centers[self.target[missiles]]
+            dx = target[:, 0] - (x[missiles] + MISSILE_SIZE // 2)
+            dy = target[:, 1] - (y[missiles] + MISSILE_SIZE // 2)
+            dist = np.hypot(dx, dy)
+            dist[dist == 0] = np.inf # Already on target: don't move
+            x[missiles] += (dx / dist * MISSILE_SPEED).astype(np.int32) # Truncates toward zero like int()
+            y[missiles] += (dy / dist * MISSILE_SPEED).astype(np.int32)
+
+        # Missiles whose target was shot down fizzle out
+        target_alive = np.array([jet.health > 0 for jet in jets])[self.target[:n]]
+        size = self.sizes()
+        self.keep((x >= 0) & (y >= 0) & (x + size <= WIDTH) & (y + size <= HEIGHT) &
+                  ((self.kind[:n] != MISSILE) | target_alive))
+
+    def check_hits(self, jets):
+        """Damages every jet touched by an opposing team's projectile and removes those projectiles.
+        A player's bullets only count from behind the jet they hit, otherwise they fly on through it."""
+        n = self.count
+        if n == 0:
+            return
+        x, y, kind, owner = self.x[:n, None], self.y[:n, None], self.kind[:n, None], self.owner[:n]
+        size = self.sizes()[:, None]
+        # One row per jet: left, top, right, bottom, centerx, team, alive, is_player
+        table = np.array([(*jet.rect.topleft, *jet.rect.bottomright, jet.rect.centerx, jet.team, jet.health > 0,
+                           jet.is_player) for jet in jets]).T
+        left, top, right, bottom, centerx, team, alive, is_player = table
+        owner_x, owner_team, owner_is_player = centerx[owner, None], team[owner, None], is_player[owner, None] == 1
+
+        # touching[p, j]: projectile p hits jet j; a projectile that touches several jets hits the first
+        touching = (x < right) & (x + size > left) & (y < bottom) & (y + size > top) & \
+                   (owner_team != team) & (alive == 1)
+        # is_behind() for every shooter and jet at once
+        touching &= (kind == MISSILE) | ~owner_is_player | (owner_x < centerx - 20)
+        hit = touching.any(axis=1)
+        if not hit.any():
+            return
+        victims = touching[hit].argmax(axis=1)
+        damage = np.where(self.kind[:n][hit] == MISSILE, MISSILE_DAMAGE, BULLET_DAMAGE)
+        for j, total in enumerate(np.bincount(victims, weights=damage, minlength=len(jets)).tolist()):
+            if total:
+                jets[j].health -= int(total)
+        self.keep(~hit)
+
+
+class Weapon:
+    """A gun or missile launcher. It fires at most once per cooldown from a magazine of rounds; an empty
+    magazine is refilled reload steps later, or for good if reload is None."""
+    def __init__(self, cooldown, magazine, reload=None):
+        self.cooldown = cooldown
+        self.magazine = magazine
+        self.reload = reload
+        self.rounds = magazine
+        self.wait = 0 # Steps until the weapon can fire (or finishes reloading)
+
+    @property
+    def reloading(self):
+        return self.rounds == 0 and self.reload is not None
+
+    def tick(self):
+        """Call once per simulation step."""
+        if self.wait > 0:
+            self.wait -= 1
+            if self.wait == 0 and self.reloading:
+                self.rounds = self.magazine
+
+    def trigger(self):
+        """Uses up a round if the weapon is ready. Returns whether it fired."""
+        if self.wait > 0 or self.rounds == 0:
+            return False
+        self.rounds -= 1
+        self.wait = self.reload if self.reloading else self.cooldown
+        return True
+
+
+class Jet:
+    """One fighter in an arena. The AI settings only matter for jets that aren't the player;
+    color is carried for whoever draws the jet and ignored here."""
+    def __init__(self, arena, x, y, team, is_player=False, color=None,
+                 chase_speed=AI_CHASE_SPEED, fire_odds=AI_FIRE_ODDS, use_missiles=AI_USE_MISSILES):
+        self.arena = arena
+        self.rect = pygame.Rect(x, y, *JET_SIZE)
+        self.color = color
+        self.speed = JET_SPEED
+        self.health = MAX_HEALTH
+        self.gun = Weapon(GUN_COOLDOWN, GUN_MAGAZINE, GUN_RELOAD)
+        self.launcher = Weapon(MISSILE_COOLDOWN, MAX_MISSILES)
+        self.is_player = is_player
+        self.team = team
+        self.chase_speed = chase_speed
+        self.fire_odds = fire_odds
+        self.use_missiles = use_missiles
+        self.target = None # AI: the enemy being chased, picked in think()
+        self.heading = (0, 0) # AI: movement per step towards the target, as of the last think()
+        self.index = len(arena.jets) # Projectiles refer to jets by index
+
+    @property
+    def alive(self):
+        return self.health > 0
+
+    @property
+    def missiles(self):
+        return self.launcher.rounds
+
+    def update_weapons(self):
+        self.gun.tick()
+        self.launcher.tick()
+
+    def think(self, grid):
+        """AI: picks the nearest enemy and the heading towards it. Scheduled by AIScheduler, not every step."""
+        self.target = grid.nearest_enemy(self)
+        self.heading = (0, 0)
+        if self.target:
+            dx = self.target.rect.centerx - self.rect.centerx
+            dy = self.target.rect.centery - self.rect.centery
+            dist = math.hypot(dx, dy)
+            if dist != 0:
+                self.heading = (int(dx / dist * self.speed * self.chase_speed),
+                                int(dy / dist * self.speed * self.chase_speed))
+
+    def move(self, keys=None):
+        if self.is_player:
+            if keys[pygame.K_LEFT]: self.rect.x -= self.speed
+            if keys[pygame.K_RIGHT]: self.rect.x += self.speed
+            if keys[pygame.K_UP]: self.rect.y -= self.speed
+            if keys[pygame.K_DOWN]: self.rect.y += self.speed
+        else:
+            # Keeps flying the last heading between thinks
+            if self.target:
+                self.rect.x += self.heading[0]
+                self.rect.y += self.heading[1]
+                if self.arena.rng.randint(0, self.fire_odds) == 0:
+                    self.fire_bullet()
+                if self.use_missiles and self.target.alive:
+                    self.fire_missile(self.target)
+
+    def fire_bullet(self):
+        if not self.gun.trigger():
+            return
+        self.arena.projectiles.add(BULLET, self.rect.centerx, self.rect.centery,
+                                   BULLET_SPEED if self.team == BLUE_TEAM else -BULLET_SPEED, self.index)
+        self.arena.fired(self, BULLET)
+
+    def fire_missile(self, target):
+        if self.distance_to(target) <= MISSILE_LOCK_RANGE and self.launcher.trigger():
+            self.arena.projectiles.add(MISSILE, self.rect.centerx, self.rect.centery, 0, self.index, target.index)
+            self.arena.fired(self, MISSILE)
+
+    def distance_to(self, other):
+        return math.hypot(other.rect.centerx - self.rect.centerx, other.rect.centery - self.rect.centery)
+
+    def is_behind(self, enemy):
+        return self.rect.centerx < enemy.rect.centerx - 20
+
+
+class SpatialGrid:
+    """Live jets bucketed by screen cell, so a nearest-enemy lookup only visits cells near the jet."""
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.bounds = (0, 0, 0, 0) # Min and max cell x, y holding any jet
+
+    def rebuild(self, jets):
+        self.cells = {}
+        for jet in jets:
+            if jet.alive:
+                key = (jet.rect.centerx // self.cell_size, jet.rect.centery // self.cell_size)
+                self.cells.setdefault(key, []).append(jet)
+        if self.cells:
+            xs = [key[0] for key in self.cells]
+            ys = [key[1] for key in self.cells]
+            self.bounds = (min(xs), min(ys), max(xs), max(ys))
+
+    def nearest_enemy(self, jet):
+        """Returns the closest live jet on another team, or None. Searches rings of cells outwards and
+        stops once the next ring can't hold anything closer than the best found."""
+        cx, cy = jet.rect.centerx // self.cell_size, jet.rect.centery // self.cell_size
+        min_x, min_y, max_x, max_y = self.bounds
+        last_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+        best, best_key = None, None
+        for ring in range(last_ring + 1):
+            if best is not None and ((ring - 1) * self.cell_size) ** 2 > best_key[0]:
+                break
+            for gx in range(cx - ring, cx + ring + 1):
+                step = 1 if ring == 0 or gx in (cx - ring, cx + ring) else 2 * ring # Only the ring's edge cells
+                for gy in range(cy - ring, cy + ring + 1, step):
+                    for other in self.cells.get((gx, gy), ()):
+                        if other.team == jet.team:
+                            continue
+                        key = ((other.rect.centerx - jet.rect.centerx) ** 2 +
+                               (other.rect.centery - jet.rect.centery) ** 2, other.index)
+                        if best_key is None or key < best_key:
+                            best, best_key = other, key
+        return best
+
+
+class AIScheduler:
+    """Spreads AI thinking over steps: jets think in turn until the step's time budget is spent,
+    and the rest carry on with their last heading. AI cost per step stays flat as squadrons grow."""
+    def __init__(self, budget_ms=AI_THINK_BUDGET_MS):
+        self.budget = budget_ms / 1000 if budget_ms is not None else None
+        self.next = 0 # Position in the AI jet list to resume from
+
+    def run(self, ai_jets, grid):
+        if not ai_jets:
+            return
+        start = time.perf_counter()
+        count = len(ai_jets)
+        thought = 0
+        while thought < count:
+            ai_jets[(self.next + thought) % count].think(grid)
+            thought += 1
+            if self.budget is not None and time.perf_counter() - start > self.budget:
+                break
+        self.next = (self.next + thought) % count
+
+
+def squadron_y(i, count):
+    """Starting height of the i-th of count jets on one side, centered on the screen."""
+    spacing = min(80, (HEIGHT - 100) // count)
+    return HEIGHT // 2 + int((i - (count - 1) / 2) * spacing)
+
+
+_NULL_SECTION = contextlib.nullcontext() # Reusable, so untimed steps don't build a context manager per phase
+
+def no_section(name):
+    return _NULL_SECTION
+
+
+class Arena:
+    """One fight. Headless matches should pass ai_budget_ms=None: a time budget makes AI thinking,
+    and so the result, depend on machine speed, while with no budget a seed always plays out the same."""
+    def __init__(self, seed=None, ai_budget_ms=AI_THINK_BUDGET_MS):
+        self.rng = random.Random(seed) # The AI's trigger finger
+        self.jets = []
+        self.player = None
+        self.projectiles = Projectiles()
+        self.grid = SpatialGrid()
+        self.ai_scheduler = AIScheduler(ai_budget_ms)
+        self.step_count = 0
+        self.on_fire = None # Called with (jet, BULLET or MISSILE) after every shot, e.g. to play a sound
+
+    def add_jet(self, x, y, team, is_player=False, **settings):
+        jet = Jet(self, x, y, team, is_player, **settings)
+        self.jets.append(jet)
+        if is_player:
+            self.player = jet
+        return jet
+
+    def add_squadrons(self, count, with_player=False, blue_ai=None, green_ai=None):
+        """Lines up count jets per side, blue on the left and green on the right, and returns both lists.
+        With with_player the first blue jet is the player. blue_ai and green_ai are Jet AI settings."""
+        blue = [self.add_jet(100 + 60 * (i % 2), squadron_y(i, count), BLUE_TEAM, with_player and i == 0,
+                             **(blue_ai or {})) for i in range(count)]
+        green = [self.add_jet(WIDTH - 150, squadron_y(i, count), GREEN_TEAM, **(green_ai or {}))
+                 for i in range(count)]
+        return blue, green
+
+    def fired(self, jet, kind):
+        if self.on_fire is not None:
+            self.on_fire(jet, kind)
+
+    def live_jets(self):
+        return [jet for jet in self.jets if jet.alive]
+
+    def winner(self):
+        """The team still flying once the other is wiped out, or None while both are (or neither is)."""
+        teams = {jet.team for jet in self.jets if jet.alive}
+        return teams.pop() if len(teams) == 1 else None
+
+    def step(self, keys=None, section=no_section):
+        """Advances the fight by one step. keys are the player's held keys, as from pygame.key.get_pressed().
+        section names each phase for timing and defaults to none; pass a FrameProfiler's section."""
+        live_jets = self.live_jets()
+        player = self.player
+        self.projectiles.snapshot()
+        with section("update"):
+            for jet in live_jets:
+                jet.update_weapons()
+            if player is not None:
+                player.move(keys)
+            self.grid.rebuild(live_jets)
+            if player is not None:
+                if keys[pygame.K_SPACE]:
+                    player.fire_bullet()
+                if keys[pygame.K_m]:
+                    target = self.grid.nearest_enemy(player)
+                    if target:
+                        player.fire_missile(target)
+
+        # AI: a budgeted share of the jets pick targets, then every AI jet flies its heading
+        ai_jets = [jet for jet in live_jets if not jet.is_player]
+        with section("ai"):
+            self.ai_scheduler.run(ai_jets, self.grid)
+        with section("update"):
+            for jet in ai_jets:
+                jet.move()
+            self.projectiles.update(self.jets)
+
+        with section("collisions"):
+            self.projectiles.check_hits(self.jets)
+        self.step_count += 1
+
+
+def play_match(seed, squadron=1, max_steps=MAX_MATCH_STEPS, blue_ai=None, green_ai=None):
+    """Plays one seeded AI-vs-AI match to the end. Returns (seed, winning team or None for a draw,
+    steps played, seconds taken)."""
+    start = time.perf_counter()
+    arena = Arena(seed, ai_budget_ms=None)
+    arena.add_squadrons(squadron, blue_ai=blue_ai, green_ai=green_ai)
+    winner = None
+    while arena.step_count < max_steps:
+        arena.step()
+        winner = arena.winner()
+        if winner is not None:
+            break
+    return seed, winner, arena.step_count, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play seeded AI-vs-AI DogFight matches in parallel")
+    parser.add_argument("--matches", type=int, default=1000)
+    parser.add_argument("--squadron", type=int, default=1, metavar="N", help="jets per side")
+    parser.add_argument("--seed", type=int, default=0, help="first match seed; match i uses seed + i")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes in the pool")
+    parser.add_argument("--max-steps", type=int, default=MAX_MATCH_STEPS, help="steps before a match is a draw")
+    for team in ("blue", "green"):
+        parser.add_argument(f"--{team}-chase", type=float, default=AI_CHASE_SPEED,
+                            help=f"{team} AI speed as a fraction of the jet speed")
+        parser.add_argument(f"--{team}-fire-odds", type=int, default=AI_FIRE_ODDS,
+                            help=f"{team} AI fires with chance 1 in N+1 per step")
+        parser.add_argument(f"--{team}-missiles", action="store_true", help=f"{team} AI launches at locked targets")
+    args = parser.parse_args()
+
+    blue_ai = dict(chase_speed=args.blue_chase, fire_odds=args.blue_fire_odds, use_missiles=args.blue_missiles)
+    green_ai = dict(chase_speed=args.green_chase, fire_odds=args.green_fire_odds, use_missiles=args.green_missiles)
+    match = partial(play_match, squadron=max(1, args.squadron), max_steps=args.max_steps,
+                    blue_ai=blue_ai, green_ai=green_ai)
+    seeds = range(args.seed, args.seed + args.matches)
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        results = list(pool.imap_unordered(match, seeds, chunksize=max(1, args.matches // (args.workers * 8))))
+    elapsed = time.perf_counter() - start
+
+    wins = {BLUE_TEAM: 0, GREEN_TEAM: 0, None: 0}
+    for _, winner, _, _ in results:
+        wins[winner] += 1
+    steps = sorted(result[2] for result in results)
+    times = sorted(result[3] * 1000 for result in results)
+    print(f"{args.matches} matches, {args.squadron} v {args.squadron}, {args.workers} workers")
+    print(f"blue {wins[BLUE_TEAM] / args.matches:.1%}  green {wins[GREEN_TEAM] / args.matches:.1%}  "
+          f"draw {wins[None] / args.matches:.1%}")
+    print(f"steps per match: mean {sum(steps) / len(steps):.0f}  p50 {percentile(steps, 0.5)}  "
+          f"p99 {percentile(steps, 0.99)}")
+    print(f"ms per match: mean {sum(times) / len(times):.2f}  p50 {percentile(times, 0.5):.2f}  "
+          f"p99 {percentile(times, 0.99):.2f}")
+    print(f"{args.matches / elapsed:.0f} matches/s, {sum(steps) / elapsed:.0f} steps/s in {elapsed:.2f} s")
@@ -1,230 +1,613 @@
-import pygame
-import random
-
-# Initialize Pygame
-pygame.init()
-
-# Constants
-SCREEN_WIDTH = 1420
-SCREEN_HEIGHT = 900
-PADDLE_WIDTH = 300
-PADDLE_HEIGHT = 30
-BALL_SIZE = 30
-BRICK_WIDTH = 116
-BRICK_HEIGHT = 45
-ROWS = 5
-COLS = 12
-BULLET_WIDTH = 10
-BULLET_HEIGHT = 20
-
-# Colors
-WHITE = (255, 255, 255)
-BACKGROUND = (0, 0, 0)
-BALL = (162, 210, 223)
-PADDLE = (254, 249, 217)
-POWERUP_COLORS = {
-    "increase_paddle": (255, 100, 100),
-    "decrease_paddle": (100, 255, 100),
-    "increase_speed": (100, 100, 255),
-    "multi_ball": (255, 223, 0),
-    "fire_paddle": (255, 165, 0)  # New color for firing power-up
-}
-BRICK_COLORS = [
-    (253, 139, 81),  # #FD8B51
-    (242, 229, 191), # #F2E5BF
-    (37, 113, 128),  # #257180
-    (98, 149, 132),  # #629584
-    (211, 238, 152), # #D3EE98
-]
-
-# Power-up Types
-POWERUP_TYPES = ["increase_paddle", "decrease_paddle", "increase_speed", "multi_ball", "fire_paddle"]
-
-# Screen Setup
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption('DX Ball Game with Power-ups')
-
-# Paddle class
-class Paddle:
-    def __init__(self):
-        self.width = PADDLE_WIDTH
-        self.rect = pygame.Rect((SCREEN_WIDTH - self.width) // 2, SCREEN_HEIGHT - PADDLE_HEIGHT - 10, self.width, PADDLE_HEIGHT)
-        self.can_fire = False  # Indicates if the paddle can fire bullets
-        self.bullets = []  # Store active bullets
-
-    def move(self, dx):
-        self.rect.x += dx
-        if self.rect.x < 0:
-            self.rect.x = 0
-        if self.rect.x > SCREEN_WIDTH - self.width:
-            self.rect.x = SCREEN_WIDTH - self.width
-
-    def resize(self, new_width):
-        self.width = new_width
-        self.rect.width = self.width
-
-    def enable_fire(self):
-        self.can_fire = True
-
-    def shoot(self):
-        if self.can_fire:
-            bullet = pygame.Rect(self.rect.centerx, self.rect.y, BULLET_WIDTH, BULLET_HEIGHT)
-            self.bullets.append(bullet)
-
-    def draw(self):
-        pygame.draw.rect(screen, PADDLE, self.rect)
-        for bullet in self.bullets:
-            pygame.draw.rect(screen, WHITE, bullet)
-
-# Ball class
-class Ball:
-    def __init__(self, x=SCREEN_WIDTH // 2, y=SCREEN_HEIGHT // 2, dx=None, dy=None):
-        self.rect = pygame.Rect(x, y, BALL_SIZE, BALL_SIZE)
-        self.dx = dx if dx is not None else random.choice([-4, 4])
-        self.dy = dy if dy is not None else -4
-
-    def move(self):
-        self.rect.x += self.dx
-        self.rect.y += self.dy
-
-        if self.rect.x <= 0 or self.rect.x >= SCREEN_WIDTH - BALL_SIZE:
-            self.dx *= -1
-        if self.rect.y <= 0:
-            self.dy *= -1
-
-    def reset(self):
-        self.rect.x = SCREEN_WIDTH // 2
-        self.rect.y = SCREEN_HEIGHT // 2
-        self.dx = random.choice([-4, 4])
-        self.dy = -4
-
-    def draw(self):
-        pygame.draw.ellipse(screen, BALL, self.rect)
-
-# Brick class
-class Brick:
-    def __init__(self, x, y):
-        self.rect = pygame.Rect(x, y, BRICK_WIDTH, BRICK_HEIGHT)
-        self.alive = True
-        self.color = random.choice(BRICK_COLORS)
-
-    def draw(self):
-        if self.alive:
-            pygame.draw.rect(screen, self.color, self.rect)
-
-# Power-up class
-class PowerUp:
-    def __init__(self, x, y, type):
-        self.rect = pygame.Rect(x, y, 30, 30)
-        self.type = type
-        self.dy = 2  # Speed of falling power-up
-
-    def move(self):
-        self.rect.y += self.dy
-
-    def draw(self):
-        pygame.draw.rect(screen, POWERUP_COLORS[self.type], self.rect)
-
-# Main game loop
-def main():
-    clock = pygame.time.Clock()
-    paddle = Paddle()
-    ball = Ball()
-    balls = [ball]
-    bricks = [Brick(x * BRICK_WIDTH + 10, y * BRICK_HEIGHT + 10) for y in range(ROWS) for x in range(COLS)]
-    powerups = []
-    score = 0
-
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_LEFT]:
-            paddle.move(-10)
-        if keys[pygame.K_RIGHT]:
-            paddle.move(10)
-        if keys[pygame.K_SPACE] and paddle.can_fire:
-            paddle.shoot()
-
-        for b in balls:
-            b.move()
-
-            # Check for collision with paddle
-            if b.rect.colliderect(paddle.rect):
-                b.dy *= -1
-                b.rect.y = paddle.rect.y - BALL_SIZE
-
-            # Check if ball falls below screen
-            if b.rect.y > SCREEN_HEIGHT:
-                balls.remove(b)
-                if not balls:
-                    b.reset()
-                    balls.append(b)
-
-        # Power-ups falling
-        for powerup in powerups[:]:
-            powerup.move()
-            if powerup.rect.colliderect(paddle.rect):
-                apply_powerup(powerup.type, paddle, balls)
-                powerups.remove(powerup)
-            elif powerup.rect.y > SCREEN_HEIGHT:
-                powerups.remove(powerup)
-
-        # Brick collisions, power-up generation, and bullet handling
-        for brick in bricks:
-            if brick.alive:
-                # Ball collisions with bricks
-                if ball.rect.colliderect(brick.rect):
-                    ball.dy *= -1
-                    brick.alive = False
-                    score += 10
-                    if random.random() < 0.2:
-                        powerup_type = random.choice(POWERUP_TYPES)
-                        powerups.append(PowerUp(brick.rect.x + BRICK_WIDTH // 2, brick.rect.y, powerup_type))
-
-                # Bullet collisions with bricks
-                for bullet in paddle.bullets:
-                    if bullet.colliderect(brick.rect):
-                        brick.alive = False
-                        paddle.bullets.remove(bullet)
-
-        # Update bullets
-        for bullet in paddle.bullets[:]:
-            bullet.y -= 10
-            if bullet.y < 0:
-                paddle.bullets.remove(bullet)
-
-        # Draw everything
-        screen.fill(BACKGROUND)
-        paddle.draw()
-        for b in balls:
-            b.draw()
-        for brick in bricks:
-            brick.draw()
-        for powerup in powerups:
-            powerup.draw()
-
-        pygame.display.flip()
-        clock.tick(60)
-
-    pygame.quit()
-
-def apply_powerup(type, paddle, balls):
-    if type == "increase_paddle":
-        paddle.resize(PADDLE_WIDTH + 100)
-    elif type == "decrease_paddle":
-        paddle.resize(PADDLE_WIDTH - 50)
-    elif type == "increase_speed":
-        for b in balls:
-            b.dy *= 1.5
-    elif type == "multi_ball":
-        for _ in range(2):
-            balls.append(Ball())
-    elif type == "fire_paddle":
-        paddle.enable_fire()
-
-if __name__ == "__main__":
-    main()
+import pygame
+import random
+import os
+import glob
+import threading
+from frame_profiler import FrameProfiler, OVERLAY_SIZE
+from game_loop import FixedTimestep, PositionHistory
+
+# Initialize Pygame
+pygame.init()
+
+# Constants
+SCREEN_WIDTH = 1420
+SCREEN_HEIGHT = 900
+PADDLE_WIDTH = 300
+PADDLE_HEIGHT = 30
+BALL_SIZE = 30
+BRICK_HEIGHT = 45
+ROWS = 5
+COLS = 12
+BULLET_WIDTH = 10
+BULLET_HEIGHT = 20
+# Speeds are in pixels per second, so movement is the same at any frame rate
+BALL_SPEED = 240
+PADDLE_SPEED = 600
+BULLET_SPEED = 600
+POWERUP_SPEED = 120
+PHYSICS_HZ = 60  # Simulation steps per second; can be lowered on slow machines, ball sweeps stay exact
+MAX_BALL_CONTACTS = 8  # Bounces resolved per ball per frame; any time left after that is dropped
+BRICK_ORIGIN = (10, 10)  # Top-left corner of the brick grid
+MAX_BRICK_HP = 9
+POWERUP_CHANCE = 0.2  # Chance a normal brick drops a power-up; "powerup" bricks always do
+LEVEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dxball_levels")
+
+# Level files (LEVEL_DIR/*.txt, played in file name order, then from the start again):
+#   name <title>
+#   palette <RRGGBB> <RRGGBB> ...    Brick colors, referenced by index 0-9 then a-z
+#   grid                             Every line after this is one row of cells
+#   n10 n21 u10 ... p13              Cell = kind letter + HP digit + color index; "..." leaves the cell empty
+# Kinds: n normal, u unbreakable (HP ignored), p normal but always drops a power-up. Lines starting with # are comments.
+BRICK_KINDS = {"n": "normal", "u": "unbreakable", "p": "powerup"}
+LEVEL_COLOR_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+DIRTY_RECT_RENDERING = True  # False redraws and flips the whole screen every frame
+
+# Colors
+WHITE = (255, 255, 255)
+BACKGROUND = (0, 0, 0)
+BALL = (162, 210, 223)
+PADDLE = (254, 249, 217)
+UNBREAKABLE_COLOR = (120, 120, 130)
+POWERUP_COLORS = {
+    "increase_paddle": (255, 100, 100),
+    "decrease_paddle": (100, 255, 100),
+    "increase_speed": (100, 100, 255),
+    "multi_ball": (255, 223, 0),
+    "fire_paddle": (255, 165, 0)  # New color for firing power-up
+}
+BRICK_COLORS = [
+    (253, 139, 81),  # #FD8B51
+    (242, 229, 191), # #F2E5BF
+    (37, 113, 128),  # #257180
+    (98, 149, 132),  # #629584
+    (211, 238, 152), # #D3EE98
+]
+
+# Power-up Types
+POWERUP_TYPES = ["increase_paddle", "decrease_paddle", "increase_speed", "multi_ball", "fire_paddle"]
+
+# Screen Setup
+screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+pygame.display.set_caption('DX Ball Game with Power-ups')
+
+# Paddle class
+class Paddle:
+    def __init__(self):
+        self.width = PADDLE_WIDTH
+        self.rect = pygame.Rect((SCREEN_WIDTH - self.width) // 2, SCREEN_HEIGHT - PADDLE_HEIGHT - 10, self.width, PADDLE_HEIGHT)
+        self.can_fire = False  # Indicates if the paddle can fire bullets
+        self.bullets = []  # Store active bullets
+
+    def move(self, dx):
+        self.rect.x += dx
+        if self.rect.x < 0:
+            self.rect.x = 0
+        if self.rect.x > SCREEN_WIDTH - self.width:
+            self.rect.x = SCREEN_WIDTH - self.width
+
+    def resize(self, new_width):
+        self.width = new_width
+        self.rect.width = self.width
+
+    def enable_fire(self):
+        self.can_fire = True
+
+    def shoot(self):
+        if self.can_fire:
+            bullet = pygame.Rect(self.rect.centerx, self.rect.y, BULLET_WIDTH, BULLET_HEIGHT)
+            self.bullets.append(bullet)
+
+    def draw(self, rect=None):
+        pygame.draw.rect(screen, PADDLE, self.rect if rect is None else rect)
+        for bullet in self.bullets:
+            pygame.draw.rect(screen, WHITE, bullet)
+
+def sweep_box(x, y, size, dx, dy, target):
+    """Returns (t, normal) for when a size x size box at (x, y) moving by (dx, dy) first touches
+    the target rect, with t in [0, 1], or None if it doesn't within this move."""
+    if dx > 0:
+        x_entry, x_exit = (target.left - (x + size)) / dx, (target.right - x) / dx
+    elif dx < 0:
+        x_entry, x_exit = (target.right - x) / dx, (target.left - (x + size)) / dx
+    elif target.left < x + size and x < target.right:
+        x_entry, x_exit = float("-inf"), float("inf")
+    else:
+        return None
+    if dy > 0:
+        y_entry, y_exit = (target.top - (y + size)) / dy, (target.bottom - y) / dy
+    elif dy < 0:
+        y_entry, y_exit = (target.bottom - y) / dy, (target.top - (y + size)) / dy
+    elif target.top < y + size and y < target.bottom:
+        y_entry, y_exit = float("-inf"), float("inf")
+    else:
+        return None
+
+    entry, exit = max(x_entry, y_entry), min(x_exit, y_exit)
+    # Already overlapping (entry < 0) doesn't count, so a ball never sticks inside what it just left
+    if entry > exit or entry < 0 or entry > 1:
+        return None
+    if x_entry > y_entry:
+        return entry, (-1 if dx > 0 else 1, 0)
+    return entry, (0, -1 if dy > 0 else 1)
+
+# Ball class
+class Ball:
+    def __init__(self, x=SCREEN_WIDTH // 2, y=SCREEN_HEIGHT // 2, vx=None, vy=None):
+        self.rect = pygame.Rect(x, y, BALL_SIZE, BALL_SIZE)
+        self.x, self.y = float(x), float(y)  # Exact position; rect is the rounded copy used for drawing
+        self.vx = vx if vx is not None else random.choice([-BALL_SPEED, BALL_SPEED])
+        self.vy = vy if vy is not None else -BALL_SPEED
+
+    def move(self, dt, paddle, brick_grid, hit_brick):
+        """Moves the ball dt seconds, bouncing off walls, the paddle and bricks at the moment it
+        touches them, so a fast ball can't skip through anything between two frames."""
+        # The paddle itself can move into the ball; lift the ball out of it like a paddle hit
+        if self.vy > 0 and self.rect.colliderect(paddle.rect):
+            self.vy = -self.vy
+            self.y = paddle.rect.y - BALL_SIZE
+
+        remaining = dt
+        for _ in range(MAX_BALL_CONTACTS):
+            dx, dy = self.vx * remaining, self.vy * remaining
+            contact = self.first_contact(dx, dy, paddle, brick_grid)
+            if contact is None:
+                self.x += dx
+                self.y += dy
+                break
+            t, (nx, ny), bricks = contact
+            self.x += dx * t
+            self.y += dy * t
+            if nx:
+                self.vx = abs(self.vx) * nx
+            if ny:
+                self.vy = abs(self.vy) * ny
+            for brick in bricks:
+                hit_brick(brick)
+            remaining *= 1 - t
+        self.rect.x, self.rect.y = round(self.x), round(self.y)
+
+    def first_contact(self, dx, dy, paddle, brick_grid):
+        """Returns (t, normal, bricks hit) for the first thing the ball touches moving by (dx, dy), or None."""
+        contacts = []
+        # Walls: left, right and top; the bottom is open
+        if dx < 0 and self.x + dx < 0:
+            contacts.append((max(0.0, -self.x / dx), (1, 0), None))
+        elif dx > 0 and self.x + dx > SCREEN_WIDTH - BALL_SIZE:
+            contacts.append((max(0.0, (SCREEN_WIDTH - BALL_SIZE - self.x) / dx), (-1, 0), None))
+        if dy < 0 and self.y + dy < 0:
+            contacts.append((max(0.0, -self.y / dy), (0, 1), None))
+
+        hit = sweep_box(self.x, self.y, BALL_SIZE, dx, dy, paddle.rect)
+        if hit:
+            contacts.append(hit + (None,))
+
+        # Only bricks in the cells the whole move covers can be reached
+        path = pygame.Rect(int(min(self.x, self.x + dx)), int(min(self.y, self.y + dy)),
+                           int(abs(dx)) + BALL_SIZE + 2, int(abs(dy)) + BALL_SIZE + 2)
+        for brick in brick_grid.overlapping(path):
+            hit = sweep_box(self.x, self.y, BALL_SIZE, dx, dy, brick.rect)
+            if hit:
+                contacts.append(hit + (brick,))
+        if not contacts:
+            return None
+
+        t, normal, _ = min(contacts, key=lambda contact: contact[0])
+        # Bricks touched at the same moment on the same side are all hit, with a single bounce
+        bricks = [brick for ct, n, brick in contacts if brick is not None and n == normal and ct - t < 1e-9]
+        return t, normal, bricks
+
+    def reset(self):
+        self.x, self.y = float(SCREEN_WIDTH // 2), float(SCREEN_HEIGHT // 2)
+        self.rect.x, self.rect.y = SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2
+        self.vx = random.choice([-BALL_SPEED, BALL_SPEED])
+        self.vy = -BALL_SPEED
+
+    def draw(self, rect=None):
+        pygame.draw.ellipse(screen, BALL, self.rect if rect is None else rect)
+
+# Brick class
+class Brick:
+    def __init__(self, rect, kind="normal", hp=1, color_index=0):
+        self.rect = rect
+        self.kind = kind
+        self.hp = hp
+        self.color_index = color_index  # Index into the level's palette
+        self.alive = True
+
+    def hit(self):
+        """Takes one hit. Returns True if that destroyed the brick."""
+        if self.kind == "unbreakable":
+            return False
+        self.hp -= 1
+        if self.hp <= 0:
+            self.alive = False
+        return not self.alive
+
+    def draw(self, surface, atlas):
+        if self.alive:
+            surface.blit(atlas.surface, self.rect, atlas.area(self))
+
+# Every brick look of a level (palette color x HP, power-up marker, unbreakable) pre-drawn on one surface
+class BrickAtlas:
+    def __init__(self, palette, width, height):
+        self.width = width
+        self.height = height
+        # Column 0 is the unbreakable look, column n the look at n HP; two rows per color (plain, power-up)
+        self.surface = pygame.Surface((width * (MAX_BRICK_HP + 1), height * len(palette) * 2))
+        for color_index, color in enumerate(palette):
+            darker = tuple(channel // 2 for channel in color)
+            for marked in (0, 1):
+                y = (color_index * 2 + marked) * height
+                for hp in range(MAX_BRICK_HP + 1):
+                    cell = pygame.Rect(hp * width, y, width, height)
+                    if hp == 0:
+                        self.surface.fill(UNBREAKABLE_COLOR, cell)
+                        pygame.draw.rect(self.surface, darker, cell, 3)
+                        continue
+                    self.surface.fill(color, cell)
+                    for ring in range(1, hp):  # One inner ring per extra hit point
+                        inner = cell.inflate(-8 * ring, -8 * ring)
+                        if inner.width > 0 and inner.height > 0:
+                            pygame.draw.rect(self.surface, darker, inner, 2)
+                    if marked:
+                        pygame.draw.circle(self.surface, WHITE, cell.center, max(2, height // 6))
+
+    def area(self, brick):
+        col = 0 if brick.kind == "unbreakable" else min(brick.hp, MAX_BRICK_HP)
+        row = brick.color_index * 2 + (brick.kind == "powerup")
+        return pygame.Rect(col * self.width, row * self.height, self.width, self.height)
+
+# A parsed level: brick cells plus the atlas to draw them with
+class Level:
+    def __init__(self, name, palette, cells, rows, cols):
+        self.name = name
+        self.palette = palette
+        self.cells = cells  # (row, col, kind, hp, color_index) for every brick
+        self.rows = rows
+        self.cols = cols
+        # Wider layouts get narrower bricks; tall ones get shorter bricks that end a ball's height above
+        # the ball's spawn point in the middle of the screen
+        self.brick_width = (SCREEN_WIDTH - 2 * BRICK_ORIGIN[0]) // cols
+        self.brick_height = min(BRICK_HEIGHT, (SCREEN_HEIGHT // 2 - BRICK_ORIGIN[1] - BALL_SIZE) // rows)
+        # A ball spawned inside a brick would pass through it, since sweeps ignore contacts that start overlapped
+        spawn = pygame.Rect(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2, BALL_SIZE, BALL_SIZE)
+        grid_area = pygame.Rect(BRICK_ORIGIN, (cols * self.brick_width, rows * self.brick_height))
+        if self.brick_height < 1 or grid_area.colliderect(spawn):
+            raise ValueError(f"{name}: {rows} rows of bricks don't fit above the ball's spawn point")
+        self.atlas = BrickAtlas(palette, self.brick_width, self.brick_height)
+
+def parse_level(path):
+    """Reads a level file (see the format above). Raises ValueError on malformed files."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    palette = list(BRICK_COLORS)
+    grid_lines = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if grid_lines or line == "grid":
+                grid_lines.append((line_no, line.split()))
+                continue
+            key, _, value = line.partition(" ")
+            if key == "name":
+                name = value.strip()
+            elif key == "palette":
+                try:
+                    palette = [tuple(int(code[i:i + 2], 16) for i in (0, 2, 4)) for code in value.split()]
+                except ValueError:
+                    raise ValueError(f"{path}:{line_no}: palette entries must be RRGGBB hex colors")
+            else:
+                raise ValueError(f"{path}:{line_no}: unknown setting '{key}'")
+    grid_lines = grid_lines[1:]  # Drop the "grid" line itself
+    if not grid_lines:
+        raise ValueError(f"{path}: no grid rows")
+
+    color_digits = LEVEL_COLOR_DIGITS[:len(palette)]
+    cells = []
+    for row, (line_no, tokens) in enumerate(grid_lines):
+        for col, token in enumerate(tokens):
+            if token == "...":
+                continue
+            if len(token) != 3 or token[0] not in BRICK_KINDS or token[1] not in "123456789" \
+               or token[2] not in color_digits:
+                raise ValueError(f"{path}:{line_no}: bad cell '{token}'")
+            cells.append((row, col, BRICK_KINDS[token[0]], int(token[1]), color_digits.index(token[2])))
+    return Level(name, palette, cells, len(grid_lines), max(len(tokens) for _, tokens in grid_lines))
+
+def random_level():
+    """The original layout: ROWS x COLS one-hit bricks in random colors. Used when there are no level files."""
+    cells = [(row, col, "normal", 1, random.randrange(len(BRICK_COLORS))) for row in range(ROWS) for col in range(COLS)]
+    return Level("Classic", list(BRICK_COLORS), cells, ROWS, COLS)
+
+# Loads level files on demand; the next level is parsed on a background thread while the current one plays
+class LevelLoader:
+    def __init__(self, directory):
+        self.paths = sorted(glob.glob(os.path.join(directory, "*.txt")))
+        self.loaded = {}  # index -> Level, or the error loading it raised
+        self.threads = {}  # index -> prefetch thread still running or not yet collected
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return max(1, len(self.paths))  # Without level files there is a single random level
+
+    def _load(self, index):
+        try:
+            level = parse_level(self.paths[index])
+        except (OSError, ValueError) as e:
+            level = e
+        with self.lock:
+            self.loaded[index] = level
+
+    def prefetch(self, index):
+        if not self.paths:
+            return
+        index %= len(self.paths)
+        with self.lock:
+            if index in self.loaded or index in self.threads:
+                return
+        thread = threading.Thread(target=self._load, args=(index,), name="level-prefetch", daemon=True)
+        self.threads[index] = thread
+        thread.start()
+
+    def get(self, index):
+        """Returns level `index`, waiting for its prefetch if one is running (or loading it now if not)."""
+        if not self.paths:
+            return random_level()
+        index %= len(self.paths)
+        thread = self.threads.pop(index, None)
+        if thread is not None:
+            thread.join()
+        with self.lock:
+            level = self.loaded.pop(index, None)
+        if level is None:
+            self._load(index)
+            level = self.loaded.pop(index)
+        if isinstance(level, Exception):
+            print(f"Error loading level: {level}. Using a random layout instead.")
+            return random_level()
+        return level
+
+# Bricks indexed by row and column, so a ball or bullet only looks at the cells it overlaps
+class BrickGrid:
+    def __init__(self, level):
+        self.rows = level.rows
+        self.cols = level.cols
+        self.cell_width = level.brick_width
+        self.cell_height = level.brick_height
+        self.cells = [[None] * self.cols for _ in range(self.rows)]
+        self.remaining = 0  # Breakable bricks left; the level is cleared at zero
+        for row, col, kind, hp, color_index in level.cells:
+            self.add(row, col, Brick(self.cell_rect(row, col), kind, hp, color_index))
+
+    def cell_rect(self, row, col):
+        return pygame.Rect(BRICK_ORIGIN[0] + col * self.cell_width, BRICK_ORIGIN[1] + row * self.cell_height,
+                           self.cell_width, self.cell_height)
+
+    def add(self, row, col, brick):
+        brick.cell = (row, col)
+        self.cells[row][col] = brick
+        if brick.kind != "unbreakable":
+            self.remaining += 1
+
+    def remove(self, brick):
+        row, col = brick.cell
+        if self.cells[row][col] is brick:
+            self.cells[row][col] = None
+            if brick.kind != "unbreakable":
+                self.remaining -= 1
+
+    def bricks(self):
+        return [brick for row in self.cells for brick in row if brick is not None]
+
+    def overlapping(self, rect):
+        """Returns the live bricks overlapping rect, checking only the cells it covers."""
+        col0 = max(0, (rect.left - BRICK_ORIGIN[0]) // self.cell_width)
+        col1 = min(self.cols - 1, (rect.right - 1 - BRICK_ORIGIN[0]) // self.cell_width)
+        row0 = max(0, (rect.top - BRICK_ORIGIN[1]) // self.cell_height)
+        row1 = min(self.rows - 1, (rect.bottom - 1 - BRICK_ORIGIN[1]) // self.cell_height)
+        hits = []
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                brick = self.cells[row][col]
+                if brick is not None and brick.rect.colliderect(rect):
+                    hits.append(brick)
+        return hits
+
+# Power-up class
+class PowerUp:
+    def __init__(self, x, y, type):
+        self.rect = pygame.Rect(x, y, 30, 30)
+        self.type = type
+        self.y = float(y)
+
+    def move(self, dt):
+        self.y += POWERUP_SPEED * dt
+        self.rect.y = round(self.y)
+
+    def draw(self):
+        pygame.draw.rect(screen, POWERUP_COLORS[self.type], self.rect)
+
+# Renderer that only repaints and presents the parts of the screen that changed
+class DirtyRectRenderer:
+    def __init__(self, bricks, atlas):
+        # Bricks only change when one is hit, so they live on a cached background
+        self.atlas = atlas
+        self.background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        self.background.fill(BACKGROUND)
+        for brick in bricks:
+            brick.draw(self.background, atlas)
+        self.previous = []  # Areas drawn over last frame, erased back to the background this frame
+        self.changed = []  # Background areas that changed since the last frame
+        self.full_redraw = True
+
+    def update_brick(self, brick):
+        """Repaints a brick that was damaged or destroyed."""
+        self.background.fill(BACKGROUND, brick.rect)
+        brick.draw(self.background, self.atlas)
+        self.changed.append(brick.rect.copy())
+
+    def erase(self):
+        if self.full_redraw or not DIRTY_RECT_RENDERING:
+            screen.blit(self.background, (0, 0))
+            return
+        for rect in self.previous + self.changed:
+            screen.blit(self.background, rect, rect)
+
+    def present(self, drawn):
+        """Pushes this frame to the display. `drawn` is every rect drawn on top of the background."""
+        if self.full_redraw or not DIRTY_RECT_RENDERING:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.previous + self.changed + drawn)
+        self.previous = drawn
+        self.changed = []
+
+# Main game loop
+def main():
+    loop = FixedTimestep(PHYSICS_HZ)
+    positions = PositionHistory()  # The paddle and balls are drawn between their last two physics steps
+    paddle = Paddle()
+    balls = []
+    powerups = []
+    score = 0
+    profiler = FrameProfiler("DX Ball") # F3 shows frame timings
+    overlay_rect = pygame.Rect(SCREEN_WIDTH - OVERLAY_SIZE[0] - 10, 40, *OVERLAY_SIZE)  # Where draw_overlay() puts it
+    levels = LevelLoader(LEVEL_DIR)
+    level_index = 0
+    brick_grid = renderer = None
+
+    def start_level(index):
+        nonlocal level_index, brick_grid, renderer
+        level_index = index % len(levels)
+        level = levels.get(level_index)
+        level.atlas.surface = level.atlas.surface.convert()  # Needs the display, so done here, not in the loader
+        brick_grid = BrickGrid(level)
+        renderer = DirtyRectRenderer(brick_grid.bricks(), level.atlas)
+        balls[:] = [Ball()]
+        powerups.clear()
+        paddle.bullets.clear()
+        levels.prefetch(level_index + 1)  # Parse the next level while this one is played
+        pygame.display.set_caption(f'DX Ball Game with Power-ups - Level {level_index + 1}: {level.name}')
+
+    def hit_brick(brick):
+        """Damages a brick and repaints it. Returns True if the hit destroyed it."""
+        destroyed = brick.hit()
+        if destroyed:
+            brick_grid.remove(brick)
+        if brick.kind != "unbreakable":
+            renderer.update_brick(brick)
+        return destroyed
+
+    def break_brick(brick):
+        nonlocal score
+        if hit_brick(brick):
+            score += 10
+            if brick.kind == "powerup" or random.random() < POWERUP_CHANCE:
+                powerup_type = random.choice(POWERUP_TYPES)
+                powerups.append(PowerUp(brick.rect.centerx, brick.rect.y, powerup_type))
+
+    start_level(0)
+
+    running = True
+    while running:
+        profiler.begin_frame()
+        with profiler.section("events"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                if event.type == pygame.WINDOWEXPOSED:  # The window contents were lost, repaint everything
+                    renderer.full_redraw = True
+                profiler.handle_event(event)
+
+            keys = pygame.key.get_pressed()
+
+        for dt in loop.steps():
+            positions.snapshot([paddle] + balls)
+            with profiler.section("update"):
+                if keys[pygame.K_LEFT]:
+                    paddle.move(-round(PADDLE_SPEED * dt))
+                if keys[pygame.K_RIGHT]:
+                    paddle.move(round(PADDLE_SPEED * dt))
+                if keys[pygame.K_SPACE] and paddle.can_fire:
+                    paddle.shoot()
+
+                # Power-ups falling
+                for powerup in powerups[:]:
+                    powerup.move(dt)
+                    if powerup.rect.colliderect(paddle.rect):
+                        apply_powerup(powerup.type, paddle, balls)
+                        powerups.remove(powerup)
+                    elif powerup.rect.y > SCREEN_HEIGHT:
+                        powerups.remove(powerup)
+
+            with profiler.section("collisions"):
+                # Balls move and collide together, resolving every wall, paddle and brick contact in order
+                for b in balls[:]:  # Copy, since lost balls are removed while looping
+                    b.move(dt, paddle, brick_grid, break_brick)
+
+                    # Check if ball falls below screen
+                    if b.rect.y > SCREEN_HEIGHT:
+                        balls.remove(b)
+                        if not balls:
+                            b.reset()
+                            balls.append(b)
+
+                # Bullets hit the nearest bricks along the whole path they covered this step
+                step = round(BULLET_SPEED * dt)
+                for bullet in paddle.bullets[:]:
+                    path = bullet.union(bullet.move(0, -step))
+                    bullet.y -= step
+                    hits = brick_grid.overlapping(path)
+                    if hits:
+                        nearest = max(brick.rect.bottom for brick in hits)
+                        for brick in hits:
+                            if brick.rect.bottom == nearest:
+                                hit_brick(brick)
+                        paddle.bullets.remove(bullet)
+                    elif bullet.y < 0:
+                        paddle.bullets.remove(bullet)
+
+                if brick_grid.remaining == 0:  # Level cleared
+                    start_level(level_index + 1)
+
+        with profiler.section("draw"):
+            # Erase last frame's moving objects, then draw them at their new positions
+            renderer.erase()
+            paddle_rect = pygame.Rect(positions.position(paddle, loop.alpha), paddle.rect.size)
+            ball_rects = [pygame.Rect(positions.position(b, loop.alpha), b.rect.size) for b in balls]
+            paddle.draw(paddle_rect)
+            for b, rect in zip(balls, ball_rects):
+                b.draw(rect)
+            for powerup in powerups:
+                powerup.draw()
+            profiler.draw_overlay(screen)
+            drawn = [paddle_rect] + [bullet.copy() for bullet in paddle.bullets] + \
+                    ball_rects + [powerup.rect.copy() for powerup in powerups]
+            if profiler.overlay_visible:
+                drawn.append(overlay_rect)
+
+        with profiler.section("flip"):
+            renderer.present(drawn)
+        profiler.end_frame()
+
+    profiler.close()
+    pygame.quit()
+
+def apply_powerup(type, paddle, balls):
+    if type == "increase_paddle":
+        paddle.resize(PADDLE_WIDTH + 100)
+    elif type == "decrease_paddle":
+        paddle.resize(PADDLE_WIDTH - 50)
+    elif type == "increase_speed":
+        for b in balls:
+            b.vy *= 1.5
+    elif type == "multi_ball":
+        for _ in range(2):
+            balls.append(Ball())
+    elif type == "fire_paddle":
+        paddle.enable_fire()
+
+if __name__ == "__main__":
+    main()
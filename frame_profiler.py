@@ -0,0 +1,177 @@
+import json
+import os
+import time
+from collections import deque
+
+import pygame
+
+# Shared frame-time instrumentation for the pygame games in this folder.
+#
+# Wrap each part of a main loop in `with profiler.section("update"):` between
+# begin_frame() and end_frame(). Press F3 in game to show a rolling frame-time
+# graph with p50/p99, and set GAME_TRACE=some_file.json to get a Chrome trace
+# (open it in chrome://tracing or https://ui.perfetto.dev) when the game exits.
+
+TRACE_ENV_VAR = "GAME_TRACE" # File path to write a Chrome trace to on exit
+OVERLAY_TOGGLE_KEY = pygame.K_F3
+DEFAULT_HISTORY = 240 # Frames kept for the graph and percentiles (4 seconds at 60 FPS)
+FRAME_BUDGET_MS = 1000 / 60 # Frames above this line are drawn red on the graph
+MAX_TRACE_EVENTS = 500000 # Oldest trace events are dropped past this, so long sessions stay bounded
+
+OVERLAY_SIZE = (300, 130)
+OVERLAY_GOOD = (0, 220, 0)
+OVERLAY_BAD = (255, 60, 60)
+OVERLAY_TEXT = (255, 255, 255)
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value at the given fraction (0-1) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class _Section:
+    """Reusable context manager that times one named section of a frame."""
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class FrameProfiler:
+    """Records per-section frame timings, draws a frame-time graph and exports Chrome traces."""
+    def __init__(self, game_name, history=DEFAULT_HISTORY, trace_path=None):
+        self.game_name = game_name
+        self.history = history
+        self.frame_times = deque(maxlen=history) # Seconds of work per frame
+        self.section_times = {} # name -> deque of seconds spent per frame
+        self.frame_sections = {} # name -> seconds spent so far in the current frame
+        self.frame_start = None
+        self.frame_count = 0
+        self._sections = {}
+
+        self.trace_path = trace_path or os.environ.get(TRACE_ENV_VAR)
+        self.trace_events = deque(maxlen=MAX_TRACE_EVENTS) if self.trace_path else None
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+        self.overlay_visible = False
+        self.overlay = None # Created on first draw so the profiler works before set_mode()
+        self.font = None
+
+    def section(self, name):
+        """Returns a context manager that adds its elapsed time to `name` for this frame."""
+        section = self._sections.get(name)
+        if section is None:
+            section = self._sections[name] = _Section(self, name)
+        return section
+
+    def record(self, name, start, end):
+        self.frame_sections[name] = self.frame_sections.get(name, 0.0) + (end - start)
+        if self.trace_events is not None:
+            self._trace(name, "section", start, end)
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+        self.frame_sections = {}
+
+    def end_frame(self):
+        if self.frame_start is None:
+            return
+        end = time.perf_counter()
+        self.frame_times.append(end - self.frame_start)
+        for name, seconds in self.frame_sections.items():
+            times = self.section_times.get(name)
+            if times is None:
+                times = self.section_times[name] = deque(maxlen=self.history)
+            times.append(seconds)
+        if self.trace_events is not None:
+            self._trace(f"frame {self.frame_count}", "frame", self.frame_start, end)
+        self.frame_count += 1
+        self.frame_start = None
+
+    def _trace(self, name, category, start, end):
+        self.trace_events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X", # Complete event: start timestamp plus duration
+            "ts": (start - self.origin) * 1e6, # Chrome traces use microseconds
+            "dur": (end - start) * 1e6,
+            "pid": self.pid,
+            "tid": 0,
+        })
+
+    def summary(self):
+        """Returns {name: (mean_ms, p50_ms, p99_ms)} for whole frames ("frame") and every section."""
+        stats = {}
+        for name, times in [("frame", self.frame_times)] + list(self.section_times.items()):
+            if not times:
+                continue
+            ordered = sorted(times)
+            stats[name] = (sum(ordered) / len(ordered) * 1000,
+                           percentile(ordered, 0.50) * 1000,
+                           percentile(ordered, 0.99) * 1000)
+        return stats
+
+    def handle_event(self, event):
+        """Toggles the overlay on F3. Returns True if the event was consumed."""
+        if event.type == pygame.KEYDOWN and event.key == OVERLAY_TOGGLE_KEY:
+            self.overlay_visible = not self.overlay_visible
+            return True
+        return False
+
+    def draw_overlay(self, surface, pos=None):
+        """Draws the rolling frame-time graph and stats if the overlay is visible."""
+        if not self.overlay_visible:
+            return
+        width, height = OVERLAY_SIZE
+        if self.overlay is None:
+            self.overlay = pygame.Surface(OVERLAY_SIZE, pygame.SRCALPHA)
+            self.font = pygame.font.Font(None, 20)
+        if pos is None:
+            pos = (surface.get_width() - width - 10, 40) # Top right, below most HUDs
+        overlay = self.overlay
+        overlay.fill((0, 0, 0, 170))
+
+        # Graph: one point per frame, scaled so the 60 FPS budget sits at half height
+        graph_top, graph_height = 40, height - 45
+        scale = graph_height / (FRAME_BUDGET_MS * 2)
+        budget_y = graph_top + graph_height - int(FRAME_BUDGET_MS * scale)
+        pygame.draw.line(overlay, OVERLAY_BAD, (0, budget_y), (width, budget_y))
+        times = list(self.frame_times)
+        if len(times) > 1:
+            step = width / (self.history - 1)
+            points = [(i * step, graph_top + graph_height - min(graph_height, t * 1000 * scale))
+                      for i, t in enumerate(times)]
+            color = OVERLAY_BAD if times[-1] * 1000 > FRAME_BUDGET_MS else OVERLAY_GOOD
+            pygame.draw.lines(overlay, color, False, points)
+
+        stats = self.summary()
+        mean, p50, p99 = stats.get("frame", (0.0, 0.0, 0.0))
+        header = f"{self.game_name}  frame p50 {p50:.2f} ms  p99 {p99:.2f} ms"
+        breakdown = "  ".join(f"{name} {values[0]:.2f}" for name, values in stats.items() if name != "frame")
+        overlay.blit(self.font.render(header, True, OVERLAY_TEXT), (5, 5))
+        overlay.blit(self.font.render(breakdown, True, OVERLAY_TEXT), (5, 22))
+        surface.blit(overlay, pos)
+
+    def close(self):
+        """Writes the Chrome trace (if one was requested). Call once when the game exits."""
+        if self.trace_events is None:
+            return
+        events = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": self.game_name}}]
+        events.extend(self.trace_events)
+        with open(self.trace_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"Wrote frame trace to {self.trace_path}")
+        self.trace_events = None
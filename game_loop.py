@@ -0,0 +1,79 @@
+import pygame
+
+# Fixed-timestep game loop shared by the pygame games in this folder.
+#
+# The simulation always advances in steps of exactly 1/sim_hz seconds, however long frames take:
+# a slow frame runs several steps to catch up, a fast one may run none and just draw again.
+#
+#     loop = FixedTimestep(60)
+#     while running:
+#         handle_events()
+#         for dt in loop.steps():
+#             update(dt)
+#         draw(loop.alpha)
+#
+# alpha (0-1) is how far real time has got from the last step towards the next, so drawing can
+# place moving things between their previous and current positions (see PositionHistory).
+
+MAX_FRAME_TIME = 0.25 # Longer frames only owe this much time, so a stall slows the game instead of freezing it in catch-up
+MAX_RENDER_FPS = 240 # Frames are drawn at most this often; 0 leaves drawing uncapped
+MAX_INTERPOLATION_JUMP = 64 # Pixels; bigger moves in one step (spawns, wraparound, reused sprites) are drawn without blending
+
+
+def lerp_position(previous, current, alpha):
+    """Returns the point alpha of the way from previous to current, rounded to whole pixels."""
+    return (round(previous[0] + (current[0] - previous[0]) * alpha),
+            round(previous[1] + (current[1] - previous[1]) * alpha))
+
+
+class FixedTimestep:
+    """Accumulates real frame time and hands it out as fixed simulation steps."""
+    def __init__(self, sim_hz, max_render_fps=MAX_RENDER_FPS, max_frame_time=MAX_FRAME_TIME):
+        self.dt = 1 / sim_hz
+        self.max_render_fps = max_render_fps
+        self.max_frame_time = max_frame_time
+        self.clock = pygame.time.Clock()
+        self.accumulator = 0.0 # Real time not yet simulated, always less than one step between frames
+        self.time = 0.0 # Simulated seconds so far
+        self.step_count = 0
+
+    def set_rate(self, sim_hz):
+        """Changes the step length. Time already owed is kept, so the change applies from the next step."""
+        self.dt = 1 / sim_hz
+
+    def steps(self):
+        """Waits for the render frame cap, then yields dt once per simulation step due this frame."""
+        frame_time = self.clock.tick(self.max_render_fps) / 1000
+        self.accumulator += min(frame_time, self.max_frame_time)
+        while self.accumulator >= self.dt:
+            yield self.dt
+            self.accumulator -= self.dt
+            self.time += self.dt
+            self.step_count += 1
+
+    @property
+    def alpha(self):
+        """Fraction of a step between the last simulated state and the next one, for interpolated drawing."""
+        return min(1.0, self.accumulator / self.dt)
+
+
+class PositionHistory:
+    """Remembers where objects with a rect were before the latest step, to draw them in between."""
+    def __init__(self):
+        self.previous = {}
+
+    def snapshot(self, objects):
+        """Call at the start of every simulation step with everything that will be drawn interpolated."""
+        self.previous = {obj: obj.rect.topleft for obj in objects}
+
+    def position(self, obj, alpha):
+        """Returns the top-left corner to draw obj at for this alpha."""
+        current = obj.rect.topleft
+        previous = self.previous.get(obj)
+        if previous is None or abs(current[0] - previous[0]) + abs(current[1] - previous[1]) > MAX_INTERPOLATION_JUMP:
+            return current
+        return lerp_position(previous, current, alpha)
+
+    def draw(self, surface, sprites, alpha):
+        """Blits sprites like Group.draw(), but at their interpolated positions."""
+        surface.blits([(sprite.image, self.position(sprite, alpha)) for sprite in sprites], False)
@@ -0,0 +1,323 @@
+import argparse
+import random
+import time
+from collections import deque
+
+import numpy as np
+
+# Snake's rules without pygame, for bots, tests and reinforcement learning.
+#
+# SnakeEnv is one board with a gym-style API:
+#
+#     env = SnakeEnv(seed=0)
+#     obs, info = env.reset()
+#     obs, reward, terminated, truncated, info = env.step(RIGHT)
+#
+# VectorSnakeEnv steps thousands of boards at once as NumPy arrays. It takes one action per board
+# and resets finished boards by itself, like gym's vector environments.
+#
+# The rules follow Snake.py on its 1200x1000 board of 20px cells:
+# - food grows the snake by one, scores 1 and raises the speed by 1;
+# - eating food has a BONUS_CHANCE of spawning bonus food worth BONUS_POINTS;
+# - bonus food grows the snake by 2, raises the speed by 2 and disappears after BONUS_DURATION seconds of game time;
+# - a step lasts 1 / speed seconds;
+# - hitting a wall or the body ends the game, and so does reversing into the neck.
+# Unlike the game, the snake is always moving: every step takes an action.
+# Observations are (height, width) int8 grids using the cell codes below.
+
+BOARD_WIDTH = 60 # Cells; Snake.py's screen_width / snake_block
+BOARD_HEIGHT = 50
+INITIAL_SPEED = 10 # Steps per second, as initial_snake_speed
+BONUS_CHANCE = 0.25
+BONUS_DURATION = 10 # Seconds of game time
+BONUS_POINTS = 5
+BONUS_GROWTH = 2
+DEATH_REWARD = -1.0
+SAMPLE_TRIES = 16 # Random draws per board when placing food before falling back to listing the free cells
+
+# Actions: absolute directions, like the arrow keys
+UP, RIGHT, DOWN, LEFT = 0, 1, 2, 3
+ACTION_DX = np.array([0, 1, 0, -1])
+ACTION_DY = np.array([-1, 0, 1, 0])
+
+# Observation cell codes
+EMPTY, BODY, HEAD, FOOD, BONUS_FOOD = 0, 1, 2, 3, 4
+
+
+class SnakeEnv:
+    """One Snake board with reset() / step(action), O(1) work per step however long the snake is."""
+    def __init__(self, width=BOARD_WIDTH, height=BOARD_HEIGHT, seed=None, max_steps=None):
+        self.width = width
+        self.height = height
+        self.max_steps = max_steps # Episodes are truncated after this many steps (None for no limit)
+        self.rng = random.Random(seed)
+        self.grid = np.zeros((height, width), np.int8)
+        self.reset()
+
+    def reset(self, seed=None):
+        """Starts a new game with the snake in the middle. Returns (observation, info)."""
+        if seed is not None:
+            self.rng.seed(seed)
+        self.grid.fill(EMPTY)
+        self.head = (self.width // 2, self.height // 2)
+        self.body = deque([self.head])
+        self.length = 1
+        self.score = 0
+        self.speed = INITIAL_SPEED
+        self.time = 0.0
+        self.steps = 0
+        self.terminated = False
+        # Free cells in a list plus cell -> position dict, so food is placed uniformly in O(1)
+        self.free = [(x, y) for y in range(self.height) for x in range(self.width)]
+        self.free_index = {cell: i for i, cell in enumerate(self.free)}
+        self._set(self.head, HEAD)
+        self.food = self._place_food(FOOD)
+        self.bonus_food = None
+        self.bonus_time = 0.0
+        return self.grid.copy(), self._info()
+
+    def _set(self, cell, code):
+        """Writes a cell's code and keeps the free-cell index in step with it."""
+        self.grid[cell[1], cell[0]] = code
+        if code == EMPTY:
+            self.free_index[cell] = len(self.free)
+            self.free.append(cell)
+        elif cell in self.free_index:
+            i = self.free_index.pop(cell)
+            last = self.free.pop()
+            if last != cell:
+                self.free[i] = last
+                self.free_index[last] = i
+
+    def _place_food(self, code):
+        if not self.free:
+            return None
+        cell = self.rng.choice(self.free)
+        self._set(cell, code)
+        return cell
+
+    def _info(self):
+        return {"score": self.score, "length": self.length, "speed": self.speed, "time": self.time}
+
+    def step(self, action):
+        """Moves the snake one cell. Returns (observation, reward, terminated, truncated, info)."""
+        if self.terminated:
+            raise RuntimeError("step() called on a finished game; call reset() first")
+        x, y = self.head[0] + ACTION_DX[action], self.head[1] + ACTION_DY[action]
+        head = (int(x), int(y))
+        reward = 0.0
+
+        # Bonus food expires in game time
+        if self.bonus_food and self.time - self.bonus_time > BONUS_DURATION:
+            self._set(self.bonus_food, EMPTY)
+            self.bonus_food = None
+
+        # The tail moves off first, so the head may follow right behind it
+        if len(self.body) >= self.length:
+            self._set(self.body.popleft(), EMPTY)
+
+        if not (0 <= x < self.width and 0 <= y < self.height) or self.grid[head[1], head[0]] in (BODY, HEAD):
+            self.terminated = True
+            reward = DEATH_REWARD
+        else:
+            if self.body: # A length 1 snake's tail was its head, and that cell is already empty
+                self._set(self.head, BODY)
+            self._set(head, HEAD)
+            self.body.append(head)
+            self.head = head
+            self.time += 1 / self.speed
+            if head == self.food:
+                self.length += 1
+                self.score += 1
+                self.speed += 1
+                reward += 1
+                self.food = self._place_food(FOOD)
+                if self.rng.random() < BONUS_CHANCE:
+                    if self.bonus_food:
+                        self._set(self.bonus_food, EMPTY)
+                    self.bonus_food = self._place_food(BONUS_FOOD)
+                    self.bonus_time = self.time
+            elif head == self.bonus_food:
+                self.length += BONUS_GROWTH
+                self.score += BONUS_POINTS
+                self.speed += BONUS_GROWTH
+                reward += BONUS_POINTS
+                self.bonus_food = None
+
+        self.steps += 1
+        truncated = not self.terminated and self.max_steps is not None and self.steps >= self.max_steps
+        return self.grid.copy(), reward, self.terminated, truncated, self._info()
+
+
+class VectorSnakeEnv:
+    """num_envs Snake boards stepped together with NumPy. Finished boards restart automatically."""
+    def __init__(self, num_envs, width=BOARD_WIDTH, height=BOARD_HEIGHT, seed=None, max_steps=None):
+        self.num_envs = num_envs
+        self.width = width
+        self.height = height
+        self.cells = width * height
+        self.max_steps = max_steps
+        self.rng = np.random.default_rng(seed)
+        self.rows = np.arange(num_envs)
+
+        # Each body is a ring buffer of cell indices (y * width + x); body[i, head_ptr[i]] is the head
+        self.body = np.zeros((num_envs, self.cells), np.int32)
+        self.head_ptr = np.zeros(num_envs, np.int32)
+        self.body_len = np.zeros(num_envs, np.int32) # Cells in the buffer
+        self.length = np.zeros(num_envs, np.int32) # Length the snake grows to
+        self.occupied = np.zeros((num_envs, self.cells), bool)
+        self.head = np.zeros(num_envs, np.int32)
+        self.food = np.zeros(num_envs, np.int32) # -1 when a board is full
+        self.bonus_food = np.zeros(num_envs, np.int32) # -1 when there is none
+        self.bonus_time = np.zeros(num_envs)
+        self.time = np.zeros(num_envs)
+        self.speed = np.zeros(num_envs, np.int32)
+        self.score = np.zeros(num_envs, np.int32)
+        self.steps = np.zeros(num_envs, np.int32)
+        self.reset()
+
+    def reset(self, seed=None):
+        """Restarts every board. Returns (observations, info)."""
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self._reset_boards(self.rows)
+        return self.observe(), {}
+
+    def _reset_boards(self, idx):
+        start = (self.height // 2) * self.width + self.width // 2
+        self.occupied[idx] = False
+        self.occupied[idx, start] = True
+        self.body[idx, 0] = start
+        self.head_ptr[idx] = 0
+        self.body_len[idx] = 1
+        self.length[idx] = 1
+        self.head[idx] = start
+        self.bonus_food[idx] = -1
+        self.food[idx] = -1
+        self.food[idx] = self._sample_free(idx)
+        self.bonus_time[idx] = 0.0
+        self.time[idx] = 0.0
+        self.speed[idx] = INITIAL_SPEED
+        self.score[idx] = 0
+        self.steps[idx] = 0
+
+    def _sample_free(self, idx):
+        """Returns a uniformly random free cell for each board in idx (-1 for a full board).
+        Takes the first free cell among SAMPLE_TRIES random draws; crowded boards list their free cells."""
+        if len(idx) == 0:
+            return np.zeros(0, np.int32)
+        draws = self.rng.integers(0, self.cells, size=(len(idx), SAMPLE_TRIES), dtype=np.int32)
+        free = ~self.occupied[idx[:, None], draws]
+        free &= draws != self.food[idx, None]
+        free &= draws != self.bonus_food[idx, None]
+        first = free.argmax(axis=1)
+        found = free[np.arange(len(idx)), first]
+        cells = np.where(found, draws[np.arange(len(idx)), first], -1)
+        for j in np.flatnonzero(~found):
+            i = idx[j]
+            taken = self.occupied[i].copy()
+            taken[[c for c in (self.food[i], self.bonus_food[i]) if c >= 0]] = True
+            candidates = np.flatnonzero(~taken)
+            if len(candidates):
+                cells[j] = self.rng.choice(candidates)
+        return cells
+
+    def observe(self):
+        """Returns the boards as an (num_envs, height, width) int8 array of cell codes."""
+        obs = self.occupied.astype(np.int8)
+        obs[self.rows, self.head] = HEAD
+        has_food = self.food >= 0
+        obs[self.rows[has_food], self.food[has_food]] = FOOD
+        has_bonus = self.bonus_food >= 0
+        obs[self.rows[has_bonus], self.bonus_food[has_bonus]] = BONUS_FOOD
+        return obs.reshape(self.num_envs, self.height, self.width)
+
+    def step(self, actions):
+        """Moves every snake one cell. Returns (observations, rewards, terminated, truncated, info);
+        info["final_score"] holds the score of each board that just finished (0 elsewhere)."""
+        actions = np.asarray(actions)
+        rows = self.rows
+        rewards = np.zeros(self.num_envs, np.float32)
+
+        x = self.head % self.width + ACTION_DX[actions]
+        y = self.head // self.width + ACTION_DY[actions]
+        off_board = (x < 0) | (x >= self.width) | (y < 0) | (y >= self.height)
+        new_head = np.where(off_board, 0, y * self.width + x)
+
+        # Bonus food expires in game time
+        expired = (self.bonus_food >= 0) & (self.time - self.bonus_time > BONUS_DURATION)
+        self.bonus_food[expired] = -1
+
+        # The tail moves off first, so the head may follow right behind it
+        shrink = self.body_len >= self.length
+        tail_ptr = (self.head_ptr - self.body_len + 1) % self.cells
+        self.occupied[rows[shrink], self.body[rows[shrink], tail_ptr[shrink]]] = False
+        self.body_len -= shrink
+
+        terminated = off_board | self.occupied[rows, new_head]
+        alive = rows[~terminated]
+        rewards[terminated] = DEATH_REWARD
+
+        self.head_ptr[alive] = (self.head_ptr[alive] + 1) % self.cells
+        self.body[alive, self.head_ptr[alive]] = new_head[alive]
+        self.occupied[alive, new_head[alive]] = True
+        self.body_len[alive] += 1
+        self.head[alive] = new_head[alive]
+        self.time[alive] += 1 / self.speed[alive]
+
+        ate = alive[new_head[alive] == self.food[alive]]
+        self.length[ate] += 1
+        self.score[ate] += 1
+        self.speed[ate] += 1
+        rewards[ate] += 1
+        self.food[ate] = -1
+        self.food[ate] = self._sample_free(ate)
+        spawn = ate[self.rng.random(len(ate)) < BONUS_CHANCE]
+        self.bonus_food[spawn] = -1
+        self.bonus_food[spawn] = self._sample_free(spawn)
+        self.bonus_time[spawn] = self.time[spawn]
+
+        ate_bonus = alive[(new_head[alive] == self.bonus_food[alive]) & (self.bonus_food[alive] >= 0)]
+        self.length[ate_bonus] += BONUS_GROWTH
+        self.score[ate_bonus] += BONUS_POINTS
+        self.speed[ate_bonus] += BONUS_GROWTH
+        rewards[ate_bonus] += BONUS_POINTS
+        self.bonus_food[ate_bonus] = -1
+
+        self.steps += 1
+        truncated = ~terminated & (self.max_steps is not None and self.steps >= self.max_steps)
+        done = terminated | truncated
+        final_score = np.where(done, self.score, 0)
+        self._reset_boards(rows[done])
+        return self.observe(), rewards, terminated, truncated, {"final_score": final_score}
+
+
+if __name__ == "__main__":
+    # Throughput check with random actions: python snake_env.py --envs 4096 --steps 500
+    parser = argparse.ArgumentParser(description="Benchmark the Snake environments with random actions")
+    parser.add_argument("--envs", type=int, default=1024, help="boards stepped together by the vector env")
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    env = SnakeEnv(seed=args.seed)
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    games = 0
+    for _ in range(args.steps):
+        _, _, terminated, truncated, _ = env.step(rng.randrange(4))
+        if terminated or truncated:
+            games += 1
+            env.reset()
+    elapsed = time.perf_counter() - start
+    print(f"SnakeEnv: {args.steps / elapsed:.0f} steps/s, {games} games")
+
+    vec = VectorSnakeEnv(args.envs, seed=args.seed)
+    actions_rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    games = 0
+    for _ in range(args.steps):
+        _, _, terminated, truncated, _ = vec.step(actions_rng.integers(0, 4, args.envs))
+        games += int(np.count_nonzero(terminated | truncated))
+    elapsed = time.perf_counter() - start
+    print(f"VectorSnakeEnv x{args.envs}: {args.envs * args.steps / elapsed:.0f} board steps/s, {games} games")